@@ -4,3 +4,12 @@ from django.apps import AppConfig
 class AccountsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'accounts'
+
+    def ready(self):
+        from django.db.models.signals import post_delete, post_save
+
+        from . import hashers  # noqa: F401  (registers the hashing profile check)
+        from .authentication import forget_cached_user
+
+        post_save.connect(forget_cached_user, sender="accounts.User")
+        post_delete.connect(forget_cached_user, sender="accounts.User")
@@ -1,6 +1,8 @@
 from django.contrib.auth.backends import ModelBackend
 from django.contrib.auth import get_user_model
 
+from .hashing_pool import get_pool
+
 class EmailBackend(ModelBackend):
     """
     Custom authentication backend that allows users to log in using their email address.
@@ -15,9 +17,32 @@ class EmailBackend(ModelBackend):
         if email is None or password is None:
             return None
         try:
-            user=User.objects.filter(email__iexact=email).first()
+            # Exact match on LOWER(email), served by the unique expression index.
+            user = User.objects.get_by_email(email)
         except User.DoesNotExist:
             return None
-        if user and user.check_password(password):
-                return user
-        return None
\ No newline at end of file
+        if user.check_password(password):
+            return user
+        return None
+
+    async def aauthenticate(self, request, email=None, password=None, **kwargs):
+        """Async variant: the lookup uses the async ORM and hashing runs in the pool.
+
+        May raise :class:`accounts.hashing_pool.PoolSaturated` under overload.
+        """
+        User = get_user_model()
+        if email is None:
+            email = kwargs.get("username")
+        if email is None or password is None:
+            return None
+        user = await User.objects.filter_by_email(email).afirst()
+        if user is None:
+            return None
+        is_correct, upgraded = await get_pool().verify(password, user.password)
+        if not is_correct:
+            return None
+        if upgraded is not None:
+            # Same transparent re-hash as check_password(), computed off-loop.
+            user.password = upgraded
+            await user.asave(update_fields=["password"])
+        return user
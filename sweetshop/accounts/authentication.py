@@ -0,0 +1,125 @@
+"""JWT authentication that trusts signed role claims on read-only requests."""
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.functional import cached_property
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.models import TokenUser
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from .models import User
+
+ROLE_CLAIMS = ("role", "is_staff", "is_superuser")
+
+
+def tokens_for_user(user):
+	"""Mint a refresh token whose access tokens carry the user's role claims."""
+	refresh = RoleRefreshToken.for_user(user)
+	refresh.user = user
+	return refresh
+
+
+class RoleRefreshToken(RefreshToken):
+	"""Refresh token that stamps role claims on each access token, never on itself.
+
+	The claims are read from ``user`` when the pair is minted, and from the
+	database when the refresh endpoint mints a new access token, so a role
+	change reaches the next refreshed token instead of lasting as long as the
+	refresh token.
+	"""
+
+	# Refresh tokens issued with role claims on them must not pass stale ones on.
+	no_copy_claims = (*RefreshToken.no_copy_claims, *ROLE_CLAIMS)
+	user = None
+
+	@property
+	def access_token(self):
+		access = super().access_token
+		user = self.user
+		if user is None:
+			user = User.objects.filter(pk=self.payload.get(api_settings.USER_ID_CLAIM)).only(*ROLE_CLAIMS).first()
+			self.user = user
+		if user is not None:
+			for claim in ROLE_CLAIMS:
+				access[claim] = getattr(user, claim)
+		return access
+
+
+class ClaimsTokenUser(TokenUser):
+	"""Token-backed user exposing the same role check as ``accounts.User``."""
+
+	@cached_property
+	def role(self) -> str:
+		return self.token.get("role", User.Role.CUSTOMER)
+
+	def is_admin(self) -> bool:
+		return self.role == User.Role.ADMIN or self.is_staff or self.is_superuser
+
+
+class ClaimsJWTAuthentication(JWTAuthentication):
+	"""Resolve GET/HEAD/OPTIONS callers from token claims without touching the DB.
+
+	Mutating requests (and tokens minted before role claims existed) still get
+	a real ``User``: loaded from the database, or from a short-lived cache
+	entry when ``ACCOUNTS_USER_CACHE_TIMEOUT`` is set. Role changes therefore
+	reach read-only endpoints once the caller's access token is reissued, by
+	login or by the refresh endpoint (which re-reads the role).
+	"""
+
+	def authenticate(self, request):
+		validated_token = self.get_request_token(request)
+		if validated_token is None:
+			return None
+		if self.trusts_claims(request, validated_token):
+			return ClaimsTokenUser(validated_token), validated_token
+		return self.get_cached_user(validated_token), validated_token
+
+	async def aauthenticate(self, request):
+		"""``authenticate`` for async views; only the DB fallback leaves the event loop."""
+		validated_token = self.get_request_token(request)
+		if validated_token is None:
+			return None
+		if self.trusts_claims(request, validated_token):
+			return ClaimsTokenUser(validated_token), validated_token
+		return await sync_to_async(self.get_cached_user)(validated_token), validated_token
+
+	def get_request_token(self, request):
+		header = self.get_header(request)
+		if header is None:
+			return None
+		raw_token = self.get_raw_token(header)
+		if raw_token is None:
+			return None
+		return self.get_validated_token(raw_token)
+
+	@staticmethod
+	def trusts_claims(request, validated_token) -> bool:
+		return request.method in SAFE_METHODS and all(claim in validated_token for claim in ROLE_CLAIMS)
+
+	def get_cached_user(self, validated_token):
+		timeout = getattr(settings, "ACCOUNTS_USER_CACHE_TIMEOUT", 0)
+		if not timeout:
+			return self.get_user(validated_token)
+		cache = caches[getattr(settings, "ACCOUNTS_USER_CACHE_ALIAS", "default")]
+		key = user_cache_key(validated_token.get(api_settings.USER_ID_CLAIM))
+		user = cache.get(key)
+		if user is None:
+			user = self.get_user(validated_token)
+			cache.set(key, user, timeout)
+		return user
+
+
+def user_cache_key(user_id) -> str:
+	return f"accounts:user:{user_id}"
+
+
+def forget_cached_user(sender, instance, **kwargs):
+	"""``post_save``/``post_delete`` hook so deactivations and role changes apply at once."""
+	timeout = getattr(settings, "ACCOUNTS_USER_CACHE_TIMEOUT", 0)
+	if timeout:
+		caches[getattr(settings, "ACCOUNTS_USER_CACHE_ALIAS", "default")].delete(
+			user_cache_key(instance.pk)
+		)
@@ -0,0 +1,81 @@
+"""Password hashers whose cost comes from ``PASSWORD_HASHING_COSTS``.
+
+``PASSWORD_HASHING_PROFILE`` (see settings) puts one of these first in
+``PASSWORD_HASHERS``; the rest stay listed so existing hashes keep verifying.
+Django re-hashes with the preferred hasher, or at its current cost, on the
+next successful ``check_password``, so changing profile upgrades users at login.
+"""
+
+from django.conf import settings
+from django.contrib.auth.hashers import (
+    Argon2PasswordHasher,
+    PBKDF2PasswordHasher,
+    ScryptPasswordHasher,
+)
+from django.core import checks
+
+
+def _cost(profile, name, default):
+    return getattr(settings, "PASSWORD_HASHING_COSTS", {}).get(profile, {}).get(name, default)
+
+
+class TunedScryptPasswordHasher(ScryptPasswordHasher):
+    """scrypt with ``PASSWORD_HASHING_COSTS["scrypt"]`` work factor, block size and parallelism."""
+
+    @property
+    def work_factor(self):
+        return _cost("scrypt", "work_factor", 2**16)
+
+    @property
+    def block_size(self):
+        return _cost("scrypt", "block_size", 8)
+
+    @property
+    def parallelism(self):
+        return _cost("scrypt", "parallelism", 1)
+
+    @property
+    def maxmem(self):
+        # scrypt needs 128 * n * r bytes; hashlib refuses more than 32 MiB by default.
+        return 2 * 128 * self.work_factor * self.block_size * self.parallelism
+
+
+class TunedArgon2PasswordHasher(Argon2PasswordHasher):
+    """argon2id with ``PASSWORD_HASHING_COSTS["argon2"]`` time/memory cost (needs ``argon2-cffi``)."""
+
+    @property
+    def time_cost(self):
+        return _cost("argon2", "time_cost", 2)
+
+    @property
+    def memory_cost(self):
+        return _cost("argon2", "memory_cost", 19 * 1024)
+
+    @property
+    def parallelism(self):
+        return _cost("argon2", "parallelism", 1)
+
+
+class TunedPBKDF2PasswordHasher(PBKDF2PasswordHasher):
+    """PBKDF2-SHA256 with ``PASSWORD_HASHING_COSTS["pbkdf2"]["iterations"]``."""
+
+    @property
+    def iterations(self):
+        return _cost("pbkdf2", "iterations", PBKDF2PasswordHasher.iterations)
+
+
+@checks.register(checks.Tags.security)
+def check_hashing_profile(app_configs, **kwargs):
+    profile = getattr(settings, "PASSWORD_HASHING_PROFILE", None)
+    if profile == "argon2":
+        try:
+            import argon2  # noqa: F401
+        except ImportError:
+            return [
+                checks.Error(
+                    "PASSWORD_HASHING_PROFILE is 'argon2' but argon2-cffi is not installed.",
+                    hint="pip install argon2-cffi, or pick the 'scrypt' profile.",
+                    id="accounts.E001",
+                )
+            ]
+    return []
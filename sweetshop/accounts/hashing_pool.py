@@ -0,0 +1,115 @@
+"""Bounded worker pool that keeps password hashing off the ASGI event loop.
+
+scrypt, PBKDF2 and argon2 all release the GIL, so a thread pool hashes on as
+many cores as it has workers; ``"process"`` is available for hashers that do
+not. Work beyond ``ACCOUNTS_HASHING_POOL_MAX_QUEUE`` waiting jobs is rejected
+with :class:`PoolSaturated` instead of queueing without bound.
+"""
+
+import asyncio
+import multiprocessing
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import django
+from django.conf import settings
+from django.contrib.auth.hashers import make_password, verify_password
+
+
+class PoolSaturated(Exception):
+    """Raised when too many hashing jobs are already waiting."""
+
+
+def _verify(password, encoded):
+    # Runs in a worker: verify, and re-hash right away when the stored hash
+    # uses an outdated hasher or cost so the caller only has to save it.
+    is_correct, must_update = verify_password(password, encoded)
+    return is_correct, make_password(password) if is_correct and must_update else None
+
+
+class HashingPool:
+    def __init__(self, size, max_queue, kind="thread"):
+        self.size = size
+        self.max_queue = max_queue
+        self.kind = kind
+        self._executor = None
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._stats = {"completed": 0, "rejected": 0, "max_queued": 0, "seconds": 0.0}
+
+    @property
+    def executor(self):
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = self._build_executor()
+        return self._executor
+
+    def _build_executor(self):
+        if self.kind == "process":
+            # Spawned workers configure Django from DJANGO_SETTINGS_MODULE.
+            return ProcessPoolExecutor(
+                max_workers=self.size,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=django.setup,
+            )
+        return ThreadPoolExecutor(max_workers=self.size, thread_name_prefix="hashing")
+
+    async def make_password(self, password):
+        return await self.run(make_password, password)
+
+    async def verify(self, password, encoded):
+        """Return ``(is_correct, new_encoded_or_None)``."""
+        return await self.run(_verify, password, encoded)
+
+    async def run(self, func, *args):
+        with self._lock:
+            # FIFO executor: anything beyond ``size`` in-flight jobs is queued.
+            queued = max(0, self._in_flight + 1 - self.size)
+            if queued > self.max_queue:
+                self._stats["rejected"] += 1
+                raise PoolSaturated
+            self._in_flight += 1
+            self._stats["max_queued"] = max(self._stats["max_queued"], queued)
+        started = time.perf_counter()
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self.executor, func, *args)
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+                self._stats["completed"] += 1
+                self._stats["seconds"] += time.perf_counter() - started
+
+    def stats(self) -> dict:
+        with self._lock:
+            in_flight, completed = self._in_flight, self._stats["completed"]
+            return {
+                "kind": self.kind,
+                "size": self.size,
+                "max_queue": self.max_queue,
+                "running": min(in_flight, self.size),
+                "queued": max(0, in_flight - self.size),
+                "max_queued": self._stats["max_queued"],
+                "completed": completed,
+                "rejected": self._stats["rejected"],
+                # Includes time spent waiting in the queue.
+                "avg_job_seconds": round(self._stats["seconds"] / completed, 4) if completed else 0.0,
+            }
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> HashingPool:
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = HashingPool(
+                    size=getattr(settings, "ACCOUNTS_HASHING_POOL_SIZE", 4),
+                    max_queue=getattr(settings, "ACCOUNTS_HASHING_POOL_MAX_QUEUE", 64),
+                    kind=getattr(settings, "ACCOUNTS_HASHING_POOL_KIND", "thread"),
+                )
+    return _pool
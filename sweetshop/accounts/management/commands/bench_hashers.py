@@ -0,0 +1,66 @@
+"""Measure password hashing throughput per core for each hashing profile."""
+
+import os
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils.module_loading import import_string
+
+
+class Command(BaseCommand):
+    help = (
+        "Hash and verify a password repeatedly with each PASSWORD_HASHING_PROFILES "
+        "hasher on one core and report hashes per second, to size the auth tier."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--profiles", nargs="+", help="Profiles to measure (default: all configured)."
+        )
+        parser.add_argument("--seconds", type=float, default=2.0, help="Time budget per measurement.")
+
+    def handle(self, *args, profiles, seconds, **options):
+        configured = settings.PASSWORD_HASHING_PROFILES
+        active = settings.PASSWORD_HASHING_PROFILE
+        cores = os.cpu_count() or 1
+        self.stdout.write(
+            f"{'profile':<10} {'cost':<42} {'hash/s/core':>12} {'verify/s/core':>14} {'ms/login':>9}"
+        )
+        for profile in profiles or configured:
+            hasher = import_string(configured[profile])()
+            try:
+                encoded = hasher.encode("bench-password", hasher.salt())
+            except ValueError as exc:  # e.g. argon2-cffi not installed
+                self.stdout.write(f"{profile:<10} skipped: {exc}")
+                continue
+            hashes = self._rate(lambda: hasher.encode("bench-password", hasher.salt()), seconds)
+            verifies = self._rate(lambda: hasher.verify("bench-password", encoded), seconds)
+            marker = " *" if profile == active else ""
+            self.stdout.write(
+                f"{profile:<10} {self._cost(hasher, encoded):<42} {hashes:>12.1f} "
+                f"{verifies:>14.1f} {1000 / verifies:>9.1f}{marker}"
+            )
+        self.stdout.write(
+            f"\n* active profile. Logins/s per host ~= verify/s/core x {cores} core(s) "
+            "while hashing dominates the request."
+        )
+
+    @staticmethod
+    def _rate(operation, seconds):
+        count, started = 0, time.perf_counter()
+        while True:
+            operation()
+            count += 1
+            elapsed = time.perf_counter() - started
+            if elapsed >= seconds:
+                return count / elapsed
+
+    @staticmethod
+    def _cost(hasher, encoded):
+        summary = hasher.safe_summary(encoded)
+        return ", ".join(
+            f"{key}={value}"
+            for key, value in summary.items()
+            if key not in {"algorithm", "salt", "hash"}
+        )
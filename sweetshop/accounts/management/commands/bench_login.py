@@ -0,0 +1,77 @@
+"""Benchmark the login email lookup: ``email__iexact`` scan vs the LOWER(email) index."""
+
+import random
+import statistics
+import time
+
+from django.contrib.auth import authenticate, get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+
+class Command(BaseCommand):
+    help = (
+        "Insert synthetic users and compare login lookup latency of email__iexact "
+        "against the indexed lookup used by EmailBackend. All rows are rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=1_000_000)
+        parser.add_argument("--lookups", type=int, default=200, help="Lookups per strategy.")
+        parser.add_argument(
+            "--logins", type=int, default=5, help="Full authenticate() calls (includes hashing)."
+        )
+        parser.add_argument("--seed", type=int, default=7)
+
+    def handle(self, *args, users, lookups, logins, seed, **options):
+        User = get_user_model()
+        rng = random.Random(seed)
+        # Hash once: the benchmark is about finding the row, not hashing.
+        password = make_password("bench-password")
+
+        with transaction.atomic():
+            started = time.perf_counter()
+            offset = User.objects.count()
+            for start in range(0, users, 10_000):
+                User.objects.bulk_create(
+                    User(
+                        username=f"bench-login-{offset + index}",
+                        email=f"bench.login.{offset + index}@example.com",
+                        password=password,
+                    )
+                    for index in range(start, min(start + 10_000, users))
+                )
+            self.stdout.write(f"{users:,} users (filled in {time.perf_counter() - started:.1f}s)")
+
+            # Mixed-case input, as typed by real users.
+            emails = [
+                f"Bench.Login.{offset + rng.randrange(users)}@Example.com" for _ in range(lookups)
+            ]
+            strategies = [
+                ("email__iexact", lambda email: User.objects.filter(email__iexact=email).first()),
+                ("LOWER(email) index", lambda email: User.objects.filter_by_email(email).first()),
+            ]
+            for label, lookup in strategies:
+                timings = []
+                for email in emails:
+                    began = time.perf_counter()
+                    assert lookup(email) is not None
+                    timings.append((time.perf_counter() - began) * 1000)
+                self._report(label, timings)
+
+            timings = []
+            for email in emails[:logins]:
+                began = time.perf_counter()
+                assert authenticate(email=email, password="bench-password") is not None
+                timings.append((time.perf_counter() - began) * 1000)
+            if timings:
+                self._report("authenticate()", timings)
+            transaction.set_rollback(True)
+
+    def _report(self, label, timings):
+        timings.sort()
+        p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+        self.stdout.write(
+            f"  {label:<20} p50 {statistics.median(timings):8.2f} ms   p95 {p95:8.2f} ms"
+        )
@@ -0,0 +1,104 @@
+"""Concurrent signup load test for users who all share the same display name."""
+
+import threading
+import time
+import uuid
+from contextlib import nullcontext
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connection
+from django.test.utils import override_settings
+
+from accounts.serializers import UserRegistrationSerializer
+
+
+class Command(BaseCommand):
+    help = (
+        "Register many users with one shared name from several threads, check that "
+        "every generated username is unique, and report signups/s and queries per "
+        "signup. Created users are deleted afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=2000)
+        parser.add_argument("--threads", type=int, default=4)
+        parser.add_argument("--name", default="John Smith")
+        parser.add_argument(
+            "--real-hasher",
+            action="store_true",
+            help="Hash with the configured hasher instead of a fast one (measures hashing too).",
+        )
+
+    def handle(self, *args, users, threads, name, real_hasher, **options):
+        run = uuid.uuid4().hex[:8]
+        created = []
+        query_counts = []
+        lock = threading.Lock()
+        barrier = threading.Barrier(threads)
+
+        def register(index):
+            serializer = UserRegistrationSerializer(
+                data={
+                    "name": name,
+                    "email": f"load-{run}-{index}@example.com",
+                    "password": "load-test-password",
+                }
+            )
+            serializer.is_valid(raise_exception=True)
+            return serializer.save()
+
+        def worker(indexes):
+            queries = 0
+
+            def count(execute, sql, params, many, context):
+                nonlocal queries
+                queries += 1
+                return execute(sql, params, many, context)
+
+            barrier.wait()
+            try:
+                with connection.execute_wrapper(count):
+                    for index in indexes:
+                        while True:
+                            try:
+                                user = register(index)
+                            except OperationalError:
+                                # SQLite surfaces lock contention as an error; retry.
+                                continue
+                            break
+                        with lock:
+                            created.append((user.pk, user.username))
+            finally:
+                connection.close()
+                with lock:
+                    query_counts.append(queries)
+
+        hashers = None if real_hasher else ["django.contrib.auth.hashers.MD5PasswordHasher"]
+        workers = [
+            threading.Thread(target=worker, args=(range(offset, users, threads),))
+            for offset in range(threads)
+        ]
+        with override_settings(PASSWORD_HASHERS=hashers) if hashers else nullcontext():
+            started = time.perf_counter()
+            for thread in workers:
+                thread.start()
+            for thread in workers:
+                thread.join()
+            elapsed = time.perf_counter() - started
+
+        try:
+            usernames = [username for _pk, username in created]
+            self.stdout.write(
+                f"{len(created)} signups in {elapsed:.2f}s ({len(created) / elapsed:.0f}/s), "
+                f"{sum(query_counts) / max(len(created), 1):.1f} queries per signup"
+            )
+            if len(created) != users or len(set(usernames)) != len(usernames):
+                raise CommandError(
+                    f"Expected {users} unique usernames, got {len(set(usernames))} of {len(created)}."
+                )
+            self.stdout.write(self.style.SUCCESS("All generated usernames are unique."))
+        finally:
+            pks = [pk for pk, _username in created]
+            for start in range(0, len(pks), 500):
+                get_user_model().objects.filter(pk__in=pks[start : start + 500]).delete()
@@ -0,0 +1,50 @@
+import accounts.models
+import django.db.models.functions.text
+from django.db import migrations, models
+
+
+def normalize_emails(apps, schema_editor):
+    """Lowercase stored emails; refuse to continue on case-insensitive duplicates."""
+    User = apps.get_model("accounts", "User")
+    db = schema_editor.connection.alias
+    rows = User.objects.using(db).exclude(email="").order_by("pk").values_list("pk", "email")
+
+    seen, duplicates, to_fix = set(), set(), []
+    for pk, email in rows.iterator(chunk_size=2000):
+        normalized = email.strip().lower()
+        if normalized in seen:
+            duplicates.add(normalized)
+        seen.add(normalized)
+        if normalized != email:
+            to_fix.append(User(pk=pk, email=normalized))
+    if duplicates:
+        raise RuntimeError(
+            "Cannot add the case-insensitive email constraint; these addresses belong "
+            f"to several accounts and must be merged first: {', '.join(sorted(duplicates))}"
+        )
+    User.objects.using(db).bulk_update(to_fix, ["email"], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("accounts", "0002_user_name"),
+    ]
+
+    operations = [
+        migrations.AlterModelManagers(
+            name="user",
+            managers=[
+                ("objects", accounts.models.UserManager()),
+            ],
+        ),
+        migrations.RunPython(normalize_emails, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name="user",
+            constraint=models.UniqueConstraint(
+                django.db.models.functions.text.Lower("email"),
+                condition=models.Q(("email", ""), _negated=True),
+                name="accounts_user_email_ci_unique",
+            ),
+        ),
+    ]
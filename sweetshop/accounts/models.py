@@ -1,10 +1,43 @@
 """Accounts domain models for authentication and authorization helpers."""
 
 from django.contrib.auth.models import AbstractUser
+from django.contrib.auth.models import UserManager as DjangoUserManager
 from django.db import models
+from django.db.models.functions import Lower
 from django.utils.translation import gettext_lazy as _
 
 
+class UserManager(DjangoUserManager):
+	"""Default manager plus an indexed case-insensitive email lookup."""
+
+	def filter_by_email(self, email):
+		"""Exact match on ``LOWER(email)`` so the unique expression index is used.
+
+		``email__iexact`` compiles to ``LIKE``/``UPPER()``, which no index serves.
+		The index is partial, so its ``email <> ''`` condition is repeated here
+		for the planner to prove it applies.
+		"""
+		return (
+			self.exclude(email="")
+			.alias(email_lower=Lower("email"))
+			.filter(email_lower=email.lower())
+		)
+
+	def get_by_email(self, email):
+		return self.filter_by_email(email).get()
+
+	def create_user_with_password_hash(self, username, email, password_hash, **extra_fields):
+		"""``create_user`` for a password that was already hashed elsewhere (e.g. the hashing pool)."""
+		user = self.model(
+			username=self.model.normalize_username(username),
+			email=self.normalize_email(email),
+			password=password_hash,
+			**extra_fields,
+		)
+		user.save(using=self._db)
+		return user
+
+
 class User(AbstractUser):
 	"""Extend Django's base user to capture Sweet Shop-specific roles."""
 
@@ -22,6 +55,18 @@ class User(AbstractUser):
 		help_text="Determines the user's access level.",
 	)
 
+	objects = UserManager()
+
+	class Meta(AbstractUser.Meta):
+		constraints = [
+			# One account per address regardless of case; blank emails are exempt.
+			models.UniqueConstraint(
+				Lower("email"),
+				name="accounts_user_email_ci_unique",
+				condition=~models.Q(email=""),
+			),
+		]
+
 	def is_admin(self) -> bool:
 		"""Convenience flag for permission checks."""
 		return self.role == self.Role.ADMIN or self.is_staff or self.is_superuser
@@ -1,13 +1,23 @@
 """Serializers encapsulating auth-related validation and output."""
 
+import random
+import re
+
 from django.contrib.auth import authenticate
+from django.db import IntegrityError, transaction
+from django.db.models import Count, IntegerField, Max, Q
+from django.db.models.functions import Cast, Substr
 from django.utils.translation import gettext_lazy as _
 from rest_framework import serializers
+from rest_framework_simplejwt.serializers import TokenRefreshSerializer
+
+from sweetshop.metrics import TimedSerializerMixin
 
+from .authentication import RoleRefreshToken
 from .models import User
 
 
-class UserSerializer(serializers.ModelSerializer):
+class UserSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     """Public-facing user representation for API responses."""
 
     class Meta:
@@ -32,6 +42,14 @@ class UserRegistrationSerializer(serializers.ModelSerializer):
         # an AssertionError during serializer field collection.
         fields = ("username", "name", "email", "password")
 
+    def validate_email(self, value):
+        if value and User.objects.filter_by_email(value).exists():
+            raise serializers.ValidationError(_("A user with this email already exists."))
+        return value
+
+    #: Fresh-suffix attempts before giving up under heavy signup contention.
+    max_username_attempts = 8
+
     def create(self, validated_data):
         # Pull out the provided name and optional username from validated data.
         # If a client supplied a username, validate/slugify and ensure it's
@@ -40,66 +58,119 @@ class UserRegistrationSerializer(serializers.ModelSerializer):
 
         name = validated_data.pop("name")
         provided_username = validated_data.pop("username", None)
+        # Set by the async registration view, which hashes in the worker pool.
+        password_hash = validated_data.pop("password_hash", None)
         email = validated_data["email"].lower()
 
-        if provided_username:
-            candidate = slugify(provided_username) or provided_username
-            candidate = candidate[:150]
-            if User.objects.filter(username=candidate).exists():
-                raise serializers.ValidationError(
-                    {"username": _("This username is already taken.")}
-                )
-            username = candidate
-        else:
-            username = self._generate_username(name=name, email=email)
-
         user_data = {
             **validated_data,
-            "username": username,
             "name": name,
             "email": email,
             "role": User.Role.CUSTOMER,
         }
 
-        return User.objects.create_user(**user_data)
+        if provided_username:
+            candidate = slugify(provided_username) or provided_username
+            candidate = candidate[:150]
+            if User.objects.filter(username=candidate).exists():
+                raise serializers.ValidationError(
+                    {"username": _("This username is already taken.")}
+                )
+            try:
+                return self._insert_user(candidate, user_data, password_hash)
+            except IntegrityError:
+                self._raise_for_conflict(email)
+                raise serializers.ValidationError(
+                    {"username": _("This username is already taken.")}
+                ) from None
+
+        # A concurrent signup can claim the generated suffix between the
+        # lookup and the INSERT; the unique index rejects it and we retry,
+        # skipping ahead randomly so racers stop colliding on the same number.
+        for attempt in range(self.max_username_attempts):
+            username = self._generate_username(name=name, email=email, spread=2**attempt - 1)
+            try:
+                return self._insert_user(username, user_data, password_hash)
+            except IntegrityError:
+                self._raise_for_conflict(email)
+        raise serializers.ValidationError(
+            {"username": _("Could not allocate a unique username, please retry.")}
+        )
 
-    def _generate_username(self, *, name: str, email: str) -> str:
+    @staticmethod
+    def _insert_user(username, user_data, password_hash):
+        # Savepoint so a unique-index IntegrityError leaves the outer
+        # transaction usable for the retry.
+        with transaction.atomic():
+            if password_hash is None:
+                return User.objects.create_user(username=username, **user_data)
+            user_data = {key: value for key, value in user_data.items() if key != "password"}
+            return User.objects.create_user_with_password_hash(
+                username=username, password_hash=password_hash, **user_data
+            )
+
+    def _raise_for_conflict(self, email):
+        """Turn a lost race on the email constraint into a validation error."""
+        if email and User.objects.filter_by_email(email).exists():
+            raise serializers.ValidationError(
+                {"email": _("A user with this email already exists.")}
+            )
+
+    def _generate_username(self, *, name: str, email: str, spread: int = 0) -> str:
+        """Return ``base`` or ``base-<n+1>`` using one aggregate query.
+
+        ``spread`` adds a random skip of up to that many suffixes (used on retry).
+        """
         from django.utils.text import slugify
 
         base_slug = slugify(name) or email.split("@")[0]
         base_slug = base_slug or "user"
         base_slug = base_slug[:150]
-        candidate = base_slug
-        suffix = 1
-
-        while User.objects.filter(username=candidate).exists():
-            suffix += 1
-            trimmed_base = base_slug[: max(0, 150 - len(f"-{suffix}"))]
-            candidate = f"{trimmed_base}-{suffix}" if trimmed_base else f"user-{suffix}"
-        return candidate
+        # Leave room for "-" plus a nine-digit suffix within the 150-char limit.
+        stem = base_slug[:140]
+        prefix = f"{stem}-"
+
+        taken = User.objects.filter(
+            Q(username=base_slug) | Q(username__startswith=prefix)
+        ).aggregate(
+            base=Count("pk", filter=Q(username=base_slug)),
+            suffix=Max(
+                Cast(Substr("username", len(prefix) + 1), output_field=IntegerField()),
+                filter=Q(username__regex=rf"^{re.escape(prefix)}[0-9]{{1,9}}$"),
+            ),
+        )
+        if not taken["base"] and not spread:
+            return base_slug
+        return f"{stem}-{max(taken['suffix'] or 1, 1) + 1 + random.randint(0, spread)}"
 
 
-class LoginSerializer(serializers.Serializer):
-    """Authenticate a user via email plus password."""
+class LoginCredentialsSerializer(serializers.Serializer):
+    """Validate the shape of login credentials without authenticating them."""
 
     email = serializers.EmailField(required=False)
     password = serializers.CharField(write_only=True, trim_whitespace=False)
 
     def validate(self, attrs):
-        request = self.context.get("request")
         email = attrs.get("email")
-        password = attrs.get("password")
 
         if not email:
             raise serializers.ValidationError({"detail": _("Email is required.")})
 
-        if email:
-            email = email.lower()
+        attrs["email"] = email.lower()
+        return attrs
+
+
+class LoginSerializer(LoginCredentialsSerializer):
+    """Authenticate a user via email plus password."""
+
+    def validate(self, attrs):
+        attrs = super().validate(attrs)
+        request = self.context.get("request")
 
         user = authenticate(
             request=request,
-            password=password,
-            email=email,
+            password=attrs.get("password"),
+            email=attrs["email"],
         )
 
         if not user:
@@ -107,3 +178,9 @@ class LoginSerializer(serializers.Serializer):
 
         attrs["user"] = user
         return attrs
+
+
+class RoleTokenRefreshSerializer(TokenRefreshSerializer):
+    """Refresh endpoint serializer minting access tokens with the user's current role."""
+
+    token_class = RoleRefreshToken
@@ -1,9 +1,21 @@
 """TDD-first tests for the authentication API endpoints."""
 
+import asyncio
+import threading
+from unittest import mock
+
+from asgiref.sync import async_to_sync
+
 from django.contrib.auth import get_user_model
+from django.db import IntegrityError, transaction
+from django.test import override_settings
 from django.urls import reverse
 from rest_framework import status
 from rest_framework.test import APITestCase
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
+
+from .hashing_pool import HashingPool, PoolSaturated
+from .serializers import UserRegistrationSerializer
 
 
 class AuthAPITests(APITestCase):
@@ -108,3 +120,295 @@ class AuthAPITests(APITestCase):
 		self.assertIn("access", response.data["tokens"])
 		self.assertIn("refresh", response.data["tokens"])
 		self.assertEqual(response.data["user"]["role"], "customer")
+
+	def test_login_matches_email_case_insensitively(self) -> None:
+		get_user_model().objects.create_user(
+			username="mixed-case", email="mixed@example.com", password="casepass123"
+		)
+
+		response = self.client.post(
+			reverse("auth-login"),
+			{"email": "Mixed@Example.COM", "password": "casepass123"},
+			format="json",
+		)
+
+		self.assertEqual(response.status_code, status.HTTP_200_OK)
+		self.assertEqual(response.data["user"]["username"], "mixed-case")
+
+	def test_login_lookup_uses_email_index(self) -> None:
+		plan = get_user_model().objects.filter_by_email("someone@example.com").explain()
+
+		self.assertIn("accounts_user_email_ci_unique", plan)
+
+	def test_register_rejects_email_taken_in_other_case(self) -> None:
+		get_user_model().objects.create_user(
+			username="first", email="taken@example.com", password="firstpass123"
+		)
+		payload = {"name": "Second", "email": "TAKEN@example.com", "password": "secondpass123"}
+
+		response = self.client.post(reverse("auth-register"), payload, format="json")
+
+		self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+		self.assertIn("email", response.data)
+
+	def test_email_uniqueness_is_enforced_by_the_database(self) -> None:
+		user_model = get_user_model()
+		user_model.objects.create_user(username="one", email="dup@example.com")
+		user_model.objects.create_user(username="blank-1", email="")
+		user_model.objects.create_user(username="blank-2", email="")
+
+		with self.assertRaises(IntegrityError), transaction.atomic():
+			user_model.objects.create_user(username="two", email="Dup@Example.com")
+
+	def test_generated_username_takes_next_suffix_in_constant_queries(self) -> None:
+		user_model = get_user_model()
+		user_model.objects.bulk_create(
+			[user_model(username="john-smith")]
+			+ [user_model(username=f"john-smith-{suffix}") for suffix in range(2, 41)]
+			+ [user_model(username="john-smith-jr"), user_model(username="john-smithers-99")]
+		)
+		payload = {"name": "John Smith", "email": "js41@example.com", "password": "johnsmith123"}
+
+		# email check + suffix aggregate + savepoint/INSERT/release, however many John Smiths exist
+		with self.assertNumQueries(5):
+			response = self.client.post(reverse("auth-register"), payload, format="json")
+
+		self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+		self.assertEqual(response.data["user"]["username"], "john-smith-41")
+
+	def test_generated_username_retries_after_losing_a_race(self) -> None:
+		user_model = get_user_model()
+		user_model.objects.create_user(username="racer", email="first@example.com")
+		payload = {"name": "Racer", "email": "second@example.com", "password": "racerpass123"}
+		serializer_class = UserRegistrationSerializer
+		original = serializer_class._generate_username
+		calls = []
+
+		def stale_then_fresh(serializer, spread=0, **kwargs):
+			# First answer is what a concurrent request could have seen before
+			# "racer" was committed.
+			calls.append(kwargs)
+			return "racer" if len(calls) == 1 else original(serializer, spread=spread, **kwargs)
+
+		with mock.patch.object(serializer_class, "_generate_username", stale_then_fresh):
+			response = self.client.post(reverse("auth-register"), payload, format="json")
+
+		self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+		self.assertRegex(response.data["user"]["username"], r"^racer-[0-9]+$")
+		self.assertEqual(len(calls), 2)
+
+	@override_settings(PASSWORD_HASHING_COSTS={"scrypt": {"work_factor": 2**10}, "pbkdf2": {"iterations": 1000}})
+	def test_login_rehashes_password_with_active_profile(self) -> None:
+		with override_settings(
+			PASSWORD_HASHERS=["accounts.hashers.TunedPBKDF2PasswordHasher"]
+		):
+			user = get_user_model().objects.create_user(
+				username="legacy", email="legacy@example.com", password="legacypass123"
+			)
+		self.assertTrue(user.password.startswith("pbkdf2_sha256$1000$"))
+
+		response = self.client.post(
+			reverse("auth-login"),
+			{"email": "legacy@example.com", "password": "legacypass123"},
+			format="json",
+		)
+
+		self.assertEqual(response.status_code, status.HTTP_200_OK)
+		user.refresh_from_db()
+		self.assertTrue(user.password.startswith("scrypt$1024$"))
+		self.assertTrue(user.check_password("legacypass123"))
+
+
+class ClaimsAuthenticationTests(APITestCase):
+	def setUp(self) -> None:
+		self.admin = get_user_model().objects.create_user(
+			username="claims-admin",
+			email="claims@example.com",
+			password="supersecret",
+			role="admin",
+		)
+
+	def login_access_token(self) -> str:
+		response = self.client.post(
+			reverse("auth-login"),
+			{"email": "claims@example.com", "password": "supersecret"},
+			format="json",
+		)
+		return response.data["tokens"]["access"]
+
+	def test_login_tokens_carry_role_claims(self) -> None:
+		token = AccessToken(self.login_access_token())
+
+		self.assertEqual(token["role"], "admin")
+		self.assertFalse(token["is_staff"])
+		self.assertFalse(token["is_superuser"])
+
+	def test_admin_read_needs_no_user_query(self) -> None:
+		headers = {"HTTP_AUTHORIZATION": f"Bearer {self.login_access_token()}"}
+
+		with self.assertNumQueries(0):
+			response = self.client.get(reverse("sweets-cache-stats"), **headers)
+
+		self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+	def test_tokens_without_claims_fall_back_to_user_row(self) -> None:
+		token = RefreshToken.for_user(self.admin).access_token
+		headers = {"HTTP_AUTHORIZATION": f"Bearer {token}"}
+
+		with self.assertNumQueries(1):
+			response = self.client.get(reverse("sweets-cache-stats"), **headers)
+
+		self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+	def test_writes_load_the_current_user(self) -> None:
+		headers = {"HTTP_AUTHORIZATION": f"Bearer {self.login_access_token()}"}
+		self.admin.role = "customer"
+		self.admin.save()
+
+		# The token still claims "admin", but writes check the live row.
+		response = self.client.post(
+			reverse("sweets-list"),
+			{"name": "Toffee", "price": "1.00", "category": "candy", "quantity_in_stock": 1},
+			format="json",
+			**headers,
+		)
+
+		self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+	def test_refreshed_access_token_follows_role_change(self) -> None:
+		response = self.client.post(
+			reverse("auth-login"),
+			{"email": "claims@example.com", "password": "supersecret"},
+			format="json",
+		)
+		refresh = response.data["tokens"]["refresh"]
+		self.assertNotIn("role", RefreshToken(refresh))
+		self.admin.role = "customer"
+		self.admin.save()
+
+		refreshed = self.client.post(reverse("token_refresh"), {"refresh": refresh}, format="json")
+		headers = {"HTTP_AUTHORIZATION": f"Bearer {refreshed.data['access']}"}
+		metrics = self.client.get(reverse("metrics"), **headers)
+		ledger = self.client.get(reverse("inventory-events-list"), **headers)
+
+		self.assertEqual(refreshed.status_code, status.HTTP_200_OK)
+		self.assertEqual(AccessToken(refreshed.data["access"])["role"], "customer")
+		self.assertEqual(metrics.status_code, status.HTTP_403_FORBIDDEN)
+		self.assertEqual(ledger.status_code, status.HTTP_403_FORBIDDEN)
+
+	def test_refresh_drops_role_claims_minted_onto_old_refresh_tokens(self) -> None:
+		legacy = RefreshToken.for_user(self.admin)
+		legacy["role"] = "admin"
+		legacy["is_staff"] = True
+		legacy["is_superuser"] = True
+		self.admin.role = "customer"
+		self.admin.save()
+
+		refreshed = self.client.post(reverse("token_refresh"), {"refresh": str(legacy)}, format="json")
+		access = AccessToken(refreshed.data["access"])
+
+		self.assertEqual((access["role"], access["is_staff"], access["is_superuser"]), ("customer", False, False))
+
+	@override_settings(ACCOUNTS_USER_CACHE_TIMEOUT=30)
+	def test_cached_user_is_dropped_when_user_changes(self) -> None:
+		headers = {"HTTP_AUTHORIZATION": f"Bearer {self.login_access_token()}"}
+		url = reverse("sweets-list")
+		payload = {"name": "Fudge", "price": "2.00", "category": "candy", "quantity_in_stock": 1}
+		self.assertEqual(self.client.post(url, payload, format="json", **headers).status_code, 201)
+
+		self.admin.is_active = False
+		self.admin.save()
+		payload["name"] = "Nougat"
+		response = self.client.post(url, payload, format="json", **headers)
+
+		self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class AsyncAuthTests(APITestCase):
+	def test_async_register_then_login(self) -> None:
+		payload = {"name": "Async Fan", "email": "Async@Example.com", "password": "asyncpass123"}
+
+		registered = self.client.post(reverse("async-auth-register"), payload, format="json")
+		login = self.client.post(
+			reverse("async-auth-login"),
+			{"email": "async@example.com", "password": "asyncpass123"},
+			format="json",
+		)
+
+		self.assertEqual(registered.status_code, status.HTTP_201_CREATED)
+		self.assertEqual(registered.json()["user"]["username"], "async-fan")
+		self.assertEqual(login.status_code, status.HTTP_200_OK)
+		self.assertEqual(login.json()["user"]["email"], "async@example.com")
+		self.assertIn("access", login.json()["tokens"])
+
+	def test_async_login_rejects_bad_credentials(self) -> None:
+		get_user_model().objects.create_user(
+			username="async-user", email="user@example.com", password="rightpass123"
+		)
+
+		response = self.client.post(
+			reverse("async-auth-login"),
+			{"email": "user@example.com", "password": "wrongpass123"},
+			format="json",
+		)
+
+		self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+		self.assertEqual(response.json(), {"detail": ["Invalid credentials."]})
+
+	def test_async_register_reports_validation_errors(self) -> None:
+		response = self.client.post(
+			reverse("async-auth-register"), {"email": "short@example.com", "password": "x"}, format="json"
+		)
+
+		self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+		self.assertEqual(set(response.json()), {"name", "password"})
+
+	@override_settings(PASSWORD_HASHING_COSTS={"scrypt": {"work_factor": 2**10}, "pbkdf2": {"iterations": 1000}})
+	def test_async_login_upgrades_outdated_hash(self) -> None:
+		with override_settings(PASSWORD_HASHERS=["accounts.hashers.TunedPBKDF2PasswordHasher"]):
+			user = get_user_model().objects.create_user(
+				username="old-hash", email="old@example.com", password="oldhashpass1"
+			)
+
+		response = self.client.post(
+			reverse("async-auth-login"),
+			{"email": "old@example.com", "password": "oldhashpass1"},
+			format="json",
+		)
+
+		self.assertEqual(response.status_code, status.HTTP_200_OK)
+		user.refresh_from_db()
+		self.assertTrue(user.password.startswith("scrypt$1024$"))
+
+	def test_pool_rejects_work_beyond_queue_bound(self) -> None:
+		pool = HashingPool(size=1, max_queue=1)
+		release = threading.Event()
+
+		async def scenario():
+			running = asyncio.ensure_future(pool.run(release.wait))
+			queued = asyncio.ensure_future(pool.run(lambda: "queued"))
+			await asyncio.sleep(0)
+			self.assertEqual(pool.stats()["queued"], 1)
+			with self.assertRaises(PoolSaturated):
+				await pool.run(lambda: "rejected")
+			release.set()
+			return await running, await queued
+
+		self.assertEqual(async_to_sync(scenario)(), (True, "queued"))
+		stats = pool.stats()
+		self.assertEqual((stats["completed"], stats["rejected"], stats["max_queued"]), (2, 1, 1))
+		self.assertEqual((stats["running"], stats["queued"]), (0, 0))
+
+	def test_hashing_stats_are_admin_only(self) -> None:
+		user_model = get_user_model()
+		admin = user_model.objects.create_user(username="pool-admin", email="pa@example.com", role="admin")
+		customer = user_model.objects.create_user(username="pool-user", email="pu@example.com")
+		url = reverse("auth-hashing-stats")
+
+		self.client.force_authenticate(customer)
+		self.assertEqual(self.client.get(url).status_code, status.HTTP_403_FORBIDDEN)
+		self.client.force_authenticate(admin)
+		response = self.client.get(url)
+
+		self.assertEqual(response.status_code, status.HTTP_200_OK)
+		self.assertIn("queued", response.data)
@@ -1,6 +1,12 @@
 from django.urls import path
 
-from .views import LoginView, RegistrationView
+from .views import (
+    AsyncLoginView,
+    AsyncRegistrationView,
+    HashingPoolStatsView,
+    LoginView,
+    RegistrationView,
+)
 from rest_framework_simplejwt.views import TokenRefreshView
 
 urlpatterns = [
@@ -8,4 +14,8 @@ urlpatterns = [
     path("auth/login/", LoginView.as_view(), name="auth-login"),
     # Allow clients to exchange a valid refresh token for a new access token.
     path("auth/token/refresh/", TokenRefreshView.as_view(), name="token_refresh"),
+    path("auth/hashing-stats/", HashingPoolStatsView.as_view(), name="auth-hashing-stats"),
+    # ASGI-native variants that hash in the worker pool instead of on the event loop.
+    path("async/auth/register/", AsyncRegistrationView.as_view(), name="async-auth-register"),
+    path("async/auth/login/", AsyncLoginView.as_view(), name="async-auth-login"),
 ]
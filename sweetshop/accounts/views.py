@@ -1,16 +1,31 @@
 """Authentication endpoints for registration and login."""
 
+import json
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth import aauthenticate
+from django.http import JsonResponse
+from django.utils.decorators import method_decorator
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
 from rest_framework import permissions, status
+from rest_framework.exceptions import PermissionDenied, ValidationError
 from rest_framework.response import Response
 from rest_framework.views import APIView
-from rest_framework_simplejwt.tokens import RefreshToken
 
-from .serializers import LoginSerializer, UserRegistrationSerializer, UserSerializer
+from .authentication import tokens_for_user
+from .hashing_pool import PoolSaturated, get_pool
+from .serializers import (
+	LoginCredentialsSerializer,
+	LoginSerializer,
+	UserRegistrationSerializer,
+	UserSerializer,
+)
 
 
 def _generate_tokens(user):
 	"""Create a fresh refresh/access token pair for the given user."""
-	refresh = RefreshToken.for_user(user)
+	refresh = tokens_for_user(user)
 	# SimpleJWT keeps the access token on the RefreshToken instance so we can
 	# serialize both without having to hit the database twice.
 	return {"refresh": str(refresh), "access": str(refresh.access_token)}
@@ -48,3 +63,81 @@ class LoginView(APIView):
 			},
 			status=status.HTTP_200_OK,
 		)
+
+
+def _json_body(request):
+	try:
+		data = json.loads(request.body or b"{}")
+	except (UnicodeDecodeError, ValueError):
+		return None
+	return data if isinstance(data, dict) else None
+
+
+def _saturated_response():
+	response = JsonResponse(
+		{"detail": "Authentication is busy, please retry shortly."},
+		status=status.HTTP_503_SERVICE_UNAVAILABLE,
+	)
+	response["Retry-After"] = "1"
+	return response
+
+
+@method_decorator(csrf_exempt, name="dispatch")
+class AsyncRegistrationView(View):
+	"""ASGI-native registration: the password is hashed in the worker pool."""
+
+	http_method_names = ["post"]
+
+	async def post(self, request):
+		data = _json_body(request)
+		if data is None:
+			return JsonResponse({"detail": "Malformed JSON body."}, status=status.HTTP_400_BAD_REQUEST)
+		serializer = UserRegistrationSerializer(data=data)
+		if not await sync_to_async(serializer.is_valid)():
+			return JsonResponse(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+		try:
+			password_hash = await get_pool().make_password(serializer.validated_data["password"])
+		except PoolSaturated:
+			return _saturated_response()
+		try:
+			user = await sync_to_async(serializer.save)(password_hash=password_hash)
+		except ValidationError as exc:
+			return JsonResponse(exc.detail, status=status.HTTP_400_BAD_REQUEST)
+		return JsonResponse(
+			{"user": UserSerializer(user).data, "tokens": _generate_tokens(user)},
+			status=status.HTTP_201_CREATED,
+		)
+
+
+@method_decorator(csrf_exempt, name="dispatch")
+class AsyncLoginView(View):
+	"""ASGI-native login: password verification runs in the worker pool."""
+
+	http_method_names = ["post"]
+
+	async def post(self, request):
+		data = _json_body(request)
+		if data is None:
+			return JsonResponse({"detail": "Malformed JSON body."}, status=status.HTTP_400_BAD_REQUEST)
+		serializer = LoginCredentialsSerializer(data=data)
+		if not serializer.is_valid():
+			return JsonResponse(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+		try:
+			user = await aauthenticate(request, **serializer.validated_data)
+		except PoolSaturated:
+			return _saturated_response()
+		if user is None:
+			return JsonResponse({"detail": ["Invalid credentials."]}, status=status.HTTP_400_BAD_REQUEST)
+		return JsonResponse(
+			{"user": UserSerializer(user).data, "tokens": _generate_tokens(user)},
+			status=status.HTTP_200_OK,
+		)
+
+
+class HashingPoolStatsView(APIView):
+	"""Admin-only queue depth and throughput counters for the hashing pool."""
+
+	def get(self, request):
+		if not request.user.is_admin():
+			raise PermissionDenied
+		return Response(get_pool().stats())
@@ -0,0 +1,116 @@
+"""ASGI-native read endpoints for the catalogue (list, retrieve, search).
+
+They answer the same queries as ``SweetViewSet`` and reuse its queryset,
+projection and pagination helpers, but the view itself runs on the event loop:
+rows come from ``aiterator()``/``afirst()``, validators from ``aaggregate()``
+and cache entries from the async cache API. Only the query execution inside
+Django's async ORM leaves the loop; auth (from token claims), rendering and the
+rest of the request do not, unlike a sync DRF view served under ASGI.
+"""
+
+from django.http import HttpResponse
+from django.views import View
+from rest_framework import status
+from rest_framework.exceptions import APIException, NotAuthenticated, NotFound
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+
+from accounts.authentication import ClaimsJWTAuthentication
+
+from . import cache as response_cache
+from . import conditional
+from .models import Sweet
+from .search import aget_search_backend
+from .serializers import SweetSerializer
+from .views import SweetViewSet
+
+
+def _json_response(data, status_code=status.HTTP_200_OK):
+    return HttpResponse(
+        JSONRenderer().render(data), status=status_code, content_type="application/json"
+    )
+
+
+class AsyncSweetReadView(View):
+    """Dispatch ``action`` ("list", "retrieve" or "search") for GET requests."""
+
+    http_method_names = ["get", "head", "options"]
+    action = "list"
+    authentication_class = ClaimsJWTAuthentication
+
+    async def get(self, request, pk=None):
+        authenticator = self.authentication_class()
+        request = Request(request, authenticators=[authenticator])
+        try:
+            result = await authenticator.aauthenticate(request)
+            if result is None:
+                raise NotAuthenticated
+            request.user, request.auth = result
+            # The first search in a process picks a backend by querying the
+            # database; do that off the loop before the sync queryset helpers run.
+            await aget_search_backend(Sweet.objects.db)
+            view = SweetViewSet(
+                request=request, action=self.action, args=(), kwargs={"pk": pk}, format_kwarg=None
+            )
+            if self.action == "retrieve":
+                return await self.retrieve(request, view, pk)
+            if self.action == "search":
+                return await self.list(request, view, "search", view._search_queryset(request))
+            return await self.list(
+                request, view, "list", view.filter_queryset(view.get_queryset())
+            )
+        except APIException as exc:
+            response = _json_response({"detail": exc.detail}, exc.status_code)
+            if exc.status_code == status.HTTP_401_UNAUTHORIZED:
+                response["WWW-Authenticate"] = authenticator.authenticate_header(request)
+            return response
+
+    async def list(self, request, view, scope, queryset):
+        visibility = view._visibility(request.user)
+        etag, last_modified = await conditional.alist_validators(request, queryset, scope, visibility)
+        not_modified = conditional.not_modified(request, etag, last_modified)
+        if not_modified is not None:
+            return not_modified
+
+        async def build():
+            projected, requested, fast = view._projected(queryset)
+            paginator = view.paginator
+            page = paginator.get_page_queryset(projected, request, view)
+            rows = paginator.build_page([row async for row in page.aiterator()])
+            return paginator.get_paginated_response(view._render_rows(rows, requested, fast)).data
+
+        response = await self.cached(request, scope, visibility, build)
+        return conditional.set_validators(response, etag, last_modified)
+
+    async def retrieve(self, request, view, pk):
+        instance = await view.filter_queryset(view.get_queryset()).filter(pk=pk).afirst()
+        if instance is None:
+            raise NotFound("No Sweet matches the given query.")
+        etag = conditional.make_etag(request, "retrieve", instance.pk, instance.updated_at)
+        not_modified = conditional.not_modified(request, etag, instance.updated_at)
+        if not_modified is not None:
+            return not_modified
+
+        async def build():
+            return SweetSerializer(instance, fields=view._requested_fields(request)).data
+
+        response = await self.cached(request, "retrieve", view._visibility(request.user), build)
+        return conditional.set_validators(response, etag, instance.updated_at)
+
+    async def cached(self, request, scope, visibility, build):
+        """Async twin of ``SweetViewSet._cached_response``."""
+        if not response_cache.is_enabled():
+            return _json_response(await build())
+        key = await response_cache.aresponse_key(request, scope, visibility)
+        cached = await response_cache.aget_response(key)
+        if cached is not None:
+            status_code, data = cached
+            response = _json_response(data, status_code)
+            response["X-Cache"] = "HIT"
+            return response
+
+        data = await build()
+        await response_cache.aset_response(key, status.HTTP_200_OK, data)
+        response = _json_response(data)
+        response["X-Cache"] = "MISS"
+        return response
@@ -0,0 +1,116 @@
+"""Versioned response cache for catalogue reads.
+
+Entry keys embed a catalogue-wide version number. Any write to the catalogue
+bumps the version, so stale entries are simply never looked up again and age
+out of the backend on their own; nothing has to be deleted or scanned.
+"""
+
+import hashlib
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+VERSION_KEY = "sweets:catalogue:version"
+
+_stats_lock = threading.Lock()
+_stats = {"hits": 0, "misses": 0}
+
+
+def get_cache():
+    return caches[getattr(settings, "SWEETS_CACHE_ALIAS", "default")]
+
+
+def is_enabled() -> bool:
+    return getattr(settings, "SWEETS_CACHE_ENABLED", True)
+
+
+def catalogue_version() -> int:
+    cache = get_cache()
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        # Seed from the clock so a lost counter can never reuse an old version.
+        cache.add(VERSION_KEY, time.time_ns() // 1000, timeout=None)
+        version = cache.get(VERSION_KEY)
+    return version
+
+
+async def acatalogue_version() -> int:
+    cache = get_cache()
+    version = await cache.aget(VERSION_KEY)
+    if version is None:
+        await cache.aadd(VERSION_KEY, time.time_ns() // 1000, timeout=None)
+        version = await cache.aget(VERSION_KEY)
+    return version
+
+
+def bump_catalogue_version(using=None) -> None:
+    """Invalidate every cached catalogue response.
+
+    Inside a transaction the version is bumped now *and* again on commit: the
+    second bump evicts anything a concurrent reader cached from pre-commit data.
+    """
+    _bump()
+    if transaction.get_connection(using).in_atomic_block:
+        transaction.on_commit(_bump, using=using)
+
+
+def _bump() -> None:
+    cache = get_cache()
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        catalogue_version()
+
+
+def response_key(request, scope: str, visibility: str) -> str:
+    """Key on path, normalised query params, host (links are absolute) and role."""
+    return f"sweets:v{catalogue_version()}:{scope}:{visibility}:{_request_digest(request)}"
+
+
+async def aresponse_key(request, scope: str, visibility: str) -> str:
+    return f"sweets:v{await acatalogue_version()}:{scope}:{visibility}:{_request_digest(request)}"
+
+
+def _request_digest(request) -> str:
+    params = sorted(
+        (name, value) for name, values in request.query_params.lists() for value in values
+    )
+    return hashlib.sha1(
+        repr((request.get_host(), request.path, params)).encode("utf-8")
+    ).hexdigest()
+
+
+def get_response(key):
+    return _count_lookup(get_cache().get(key))
+
+
+async def aget_response(key):
+    return _count_lookup(await get_cache().aget(key))
+
+
+def _count_lookup(entry):
+    with _stats_lock:
+        _stats["hits" if entry is not None else "misses"] += 1
+    return entry
+
+
+def set_response(key, status_code, data) -> None:
+    get_cache().set(key, (status_code, data), getattr(settings, "SWEETS_CACHE_TIMEOUT", 300))
+
+
+async def aset_response(key, status_code, data) -> None:
+    await get_cache().aset(key, (status_code, data), getattr(settings, "SWEETS_CACHE_TIMEOUT", 300))
+
+
+def stats() -> dict:
+    with _stats_lock:
+        hits, misses = _stats["hits"], _stats["misses"]
+    lookups = hits + misses
+    return {
+        "hits": hits,
+        "misses": misses,
+        "hit_ratio": round(hits / lookups, 4) if lookups else 0.0,
+    }
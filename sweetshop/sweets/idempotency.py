@@ -0,0 +1,196 @@
+"""``Idempotency-Key`` support for the stock-changing actions.
+
+A client that retries a POST with the same key gets the stored response of the
+first attempt instead of a second purchase. A retry that arrives while the
+first attempt is still running waits for it. Keys are scoped per user and kept
+in the Django cache named by ``SWEETS_IDEMPOTENCY_CACHE_ALIAS`` for
+``SWEETS_IDEMPOTENCY_TTL_SECONDS``, so every worker sharing that backend sees
+them.
+"""
+
+import functools
+import hashlib
+import json
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework import status
+from rest_framework.response import Response
+
+HEADER = "Idempotency-Key"
+MAX_KEY_LENGTH = 255
+POLL_SECONDS = 0.05
+
+
+class KeyReused(Exception):
+    """The key was already used for a different request."""
+
+
+class _Entry:
+    __slots__ = ("key", "fingerprint", "status_code", "data")
+
+    def __init__(self, key, fingerprint, status_code=None, data=None):
+        self.key = key
+        self.fingerprint = fingerprint
+        self.status_code = status_code
+        self.data = data
+
+    @property
+    def done(self) -> bool:
+        return self.status_code is not None
+
+
+class IdempotencyStore:
+    """``user:key`` to the response it produced, kept in a Django cache.
+
+    ``cache.add`` is atomic on every backend, so exactly one attempt claims a
+    key. The claim holds a pending marker for ``SWEETS_IDEMPOTENCY_LEASE_SECONDS``
+    (a crashed worker frees its keys when the lease lapses); ``finish``
+    replaces it with the response for the full TTL. Bounding and eviction are
+    left to the backend. Counters are per process, like the other metrics.
+    """
+
+    def __init__(self, cache=None):
+        self._cache = cache
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._stats = {"executed": 0, "replayed": 0, "waited": 0, "conflicts": 0}
+
+    @property
+    def cache(self):
+        if self._cache is not None:
+            return self._cache
+        return caches[getattr(settings, "SWEETS_IDEMPOTENCY_CACHE_ALIAS", "default")]
+
+    @staticmethod
+    def _cache_key(key) -> str:
+        # Raw keys may hold spaces or run past memcached's 250-byte limit.
+        return "sweets:idempotency:" + hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+    def claim(self, key, fingerprint):
+        """Return ``(entry, owner)``; the owner must call ``finish`` or ``abandon``."""
+        cache_key = self._cache_key(key)
+        lease = getattr(settings, "SWEETS_IDEMPOTENCY_LEASE_SECONDS", 60)
+        while True:
+            if self.cache.add(cache_key, (fingerprint, None, None), timeout=lease):
+                with self._lock:
+                    self._stats["executed"] += 1
+                    self._in_flight += 1
+                return _Entry(key, fingerprint), True
+            stored = self.cache.get(cache_key)
+            if stored is None:
+                continue  # expired or abandoned between the two calls
+            if stored[0] != fingerprint:
+                self.count("conflicts")
+                raise KeyReused
+            return _Entry(key, *stored), False
+
+    def wait(self, entry, timeout):
+        """Poll until ``entry`` is answered; ``None`` if its key was freed, ``entry`` on timeout."""
+        deadline = time.monotonic() + timeout
+        while not entry.done and time.monotonic() < deadline:
+            time.sleep(POLL_SECONDS)
+            stored = self.cache.get(self._cache_key(entry.key))
+            if stored is None or stored[0] != entry.fingerprint:
+                return None
+            entry = _Entry(entry.key, *stored)
+        return entry
+
+    def finish(self, entry, status_code, data) -> None:
+        entry.status_code, entry.data = status_code, data
+        self.cache.set(
+            self._cache_key(entry.key),
+            (entry.fingerprint, status_code, data),
+            timeout=getattr(settings, "SWEETS_IDEMPOTENCY_TTL_SECONDS", 86_400),
+        )
+        self._release()
+
+    def abandon(self, entry) -> None:
+        """Forget a failed attempt so the next retry runs the action again."""
+        self.cache.delete(self._cache_key(entry.key))
+        self._release()
+
+    def _release(self) -> None:
+        with self._lock:
+            self._in_flight -= 1
+
+    def count(self, name) -> None:
+        with self._lock:
+            self._stats[name] += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"in_flight": self._in_flight, **self._stats}
+
+
+_store = IdempotencyStore()
+
+
+def get_store() -> IdempotencyStore:
+    return _store
+
+
+def _fingerprint(request) -> str:
+    body = json.dumps(request.data, sort_keys=True, default=str)
+    return hashlib.sha256(f"{request.method} {request.path}\n{body}".encode("utf-8")).hexdigest()
+
+
+def idempotent(view_method):
+    """Replay the stored response for a repeated ``Idempotency-Key`` header.
+
+    Requests without the header run as usual. Only responses below 500 are
+    stored; a server error or exception frees the key for another attempt.
+    """
+
+    @functools.wraps(view_method)
+    def wrapper(self, request, *args, **kwargs):
+        raw_key = request.headers.get(HEADER)
+        if raw_key is None:
+            return view_method(self, request, *args, **kwargs)
+        if not raw_key.strip() or len(raw_key) > MAX_KEY_LENGTH:
+            return Response(
+                {"detail": f"{HEADER} must be 1-{MAX_KEY_LENGTH} characters."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        key = f"{request.user.pk}:{raw_key}"
+        fingerprint = _fingerprint(request)
+        while True:
+            try:
+                entry, owner = _store.claim(key, fingerprint)
+            except KeyReused:
+                return Response(
+                    {"detail": f"{HEADER} was already used for a different request."},
+                    status=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                )
+            if owner:
+                break
+            if not entry.done:
+                _store.count("waited")
+                entry = _store.wait(entry, getattr(settings, "SWEETS_IDEMPOTENCY_WAIT_SECONDS", 10))
+                if entry is None:
+                    continue  # the first attempt failed and released the key; claim it again
+                if not entry.done:
+                    return Response(
+                        {"detail": f"A request with this {HEADER} is still being processed."},
+                        status=status.HTTP_409_CONFLICT,
+                    )
+            _store.count("replayed")
+            response = Response(entry.data, status=entry.status_code)
+            response["Idempotent-Replayed"] = "true"
+            return response
+
+        try:
+            response = view_method(self, request, *args, **kwargs)
+        except BaseException:
+            _store.abandon(entry)
+            raise
+        if response.status_code >= 500:
+            _store.abandon(entry)
+        else:
+            _store.finish(entry, response.status_code, response.data)
+        return response
+
+    return wrapper
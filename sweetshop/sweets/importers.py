@@ -0,0 +1,198 @@
+"""Batched catalogue import/restock shared by the bulk API and ``import_sweets``."""
+
+import csv
+import json
+import time
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+
+from django.db import transaction
+from django.db.models import F
+from django.db.models.functions import Lower
+from django.utils import timezone
+
+from .cache import bump_catalogue_version
+from .models import Category, InventoryEvent, Sweet
+
+PRICE_QUANT = Decimal("0.01")
+MAX_PRICE = Decimal("9999.99")
+
+
+def read_csv_rows(stream):
+    """Yield one dict per CSV record from a text stream with a header row."""
+    yield from csv.DictReader(stream)
+
+
+def read_json_rows(stream):
+    """Yield rows from a JSON array, an ``{"items": [...]}`` object, or NDJSON."""
+    line = stream.readline()
+    while line and not line.strip():
+        line = stream.readline()
+    try:
+        record = json.loads(line) if line.strip() else None
+    except json.JSONDecodeError:
+        # A pretty-printed document spans lines; load it in one go.
+        record = json.loads(line + stream.read())
+    if isinstance(record, list):
+        yield from record
+        return
+    if isinstance(record, dict) and isinstance(record.get("items"), list):
+        yield from record["items"]
+        return
+    # Newline-delimited JSON is read lazily so huge feeds never sit in memory.
+    while line:
+        if line.strip():
+            yield json.loads(line)
+        line = stream.readline()
+
+
+class SweetImporter:
+    """Upsert sweets and log restock events in fixed-size batches.
+
+    Rows are keyed by ``name``. Unknown names create a new sweet (``price`` is
+    then required); known names are updated in place and ``quantity`` units are
+    added to stock. Each batch commits on its own and costs a constant number
+    of queries regardless of its size.
+    """
+
+    def __init__(self, user, *, batch_size: int = 500):
+        if batch_size <= 0:
+            raise ValueError("Batch size must be positive.")
+        self.user = user
+        self.batch_size = batch_size
+        self.rows = 0
+        self.created = 0
+        self.updated = 0
+        self.restocked_units = 0
+        self.elapsed = 0.0
+
+    def run(self, rows, on_batch=None) -> "SweetImporter":
+        started = time.perf_counter()
+        rows = iter(rows)
+        try:
+            while batch := list(islice(rows, self.batch_size)):
+                # Permission is checked once per batch rather than once per row.
+                if self.user is None or not self.user.is_admin():
+                    raise PermissionError("Only admin users can restock inventory.")
+                self._import_batch(batch)
+                if on_batch is not None:
+                    on_batch(self)
+        finally:
+            self.elapsed = time.perf_counter() - started
+        return self
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.rows / self.elapsed if self.elapsed else 0.0
+
+    def summary(self) -> dict:
+        return {
+            "rows": self.rows,
+            "created": self.created,
+            "updated": self.updated,
+            "restocked_units": self.restocked_units,
+            "elapsed_seconds": round(self.elapsed, 3),
+            "rows_per_second": round(self.rows_per_second, 1),
+        }
+
+    def _import_batch(self, batch):
+        # Names match case-insensitively, like the API's uniqueness check.
+        changes = {}
+        for offset, raw in enumerate(batch, start=self.rows + 1):
+            name, quantity, attrs = self._clean_row(offset, raw)
+            entry = changes.setdefault(name.lower(), {"name": name, "quantity": 0, "attrs": {}, "row": offset})
+            entry["quantity"] += quantity
+            entry["attrs"].update(attrs)
+
+        now = timezone.now()
+        with transaction.atomic():
+            existing = {
+                sweet.key: sweet
+                for sweet in Sweet.objects.annotate(key=Lower("name")).filter(key__in=list(changes))
+            }
+            new_sweets = {}
+            for key, entry in changes.items():
+                if key in existing:
+                    continue
+                if "price" not in entry["attrs"]:
+                    raise ValueError(f"Row {entry['row']}: price is required for new sweet {entry['name']!r}.")
+                new_sweets[key] = Sweet(
+                    name=entry["name"],
+                    created_by=self.user,
+                    quantity_in_stock=entry["quantity"],
+                    **entry["attrs"],
+                )
+            Sweet.objects.bulk_create(new_sweets.values())
+
+            update_fields = {"quantity_in_stock", "updated_at"}
+            for key, sweet in existing.items():
+                entry = changes[key]
+                for field, value in entry["attrs"].items():
+                    setattr(sweet, field, value)
+                    update_fields.add(field)
+                sweet.quantity_in_stock = F("quantity_in_stock") + entry["quantity"]
+                # bulk_update bypasses auto_now, so stamp the change explicitly.
+                sweet.updated_at = now
+            Sweet.objects.bulk_update(existing.values(), sorted(update_fields))
+            # Sharded stock lives in shard rows; the column above is just its snapshot.
+            for key, sweet in existing.items():
+                if sweet.shard_count and changes[key]["quantity"]:
+                    sweet._add_to_shards(changes[key]["quantity"])
+
+            # A new sweet's units are its opening stock, as for one created through the API.
+            events = [
+                InventoryEvent(
+                    sweet=sweet,
+                    event_type=event_type,
+                    quantity=changes[key]["quantity"],
+                    performed_by=self.user,
+                )
+                for sweets, event_type in (
+                    (new_sweets, InventoryEvent.EventType.OPENING),
+                    (existing, InventoryEvent.EventType.RESTOCK),
+                )
+                for key, sweet in sweets.items()
+                if changes[key]["quantity"]
+            ]
+            InventoryEvent.objects.bulk_create(events)
+            bump_catalogue_version()
+
+        self.rows += len(batch)
+        self.created += len(new_sweets)
+        self.updated += len(existing)
+        self.restocked_units += sum(event.quantity for event in events)
+
+    @staticmethod
+    def _clean_row(number, raw):
+        if not isinstance(raw, dict):
+            raise ValueError(f"Row {number}: expected an object with a name.")
+        name = str(raw.get("name") or "").strip()
+        if not name:
+            raise ValueError(f"Row {number}: name is required.")
+        if len(name) > Sweet._meta.get_field("name").max_length:
+            raise ValueError(f"Row {number}: name is too long.")
+
+        try:
+            quantity = int(raw.get("quantity") or 0)
+        except (TypeError, ValueError):
+            raise ValueError(f"Row {number}: quantity must be an integer.") from None
+        if quantity < 0:
+            raise ValueError(f"Row {number}: quantity cannot be negative.")
+
+        attrs = {}
+        if raw.get("price") not in (None, ""):
+            try:
+                price = Decimal(str(raw["price"])).quantize(PRICE_QUANT)
+            except InvalidOperation:
+                raise ValueError(f"Row {number}: price must be a valid number.") from None
+            if not Decimal("0") < price <= MAX_PRICE:
+                raise ValueError(f"Row {number}: price must be between 0.01 and {MAX_PRICE}.")
+            attrs["price"] = price
+        if raw.get("category") not in (None, ""):
+            category = str(raw["category"]).lower()
+            if category not in Category.values:
+                raise ValueError(f"Row {number}: unknown category {raw['category']!r}.")
+            attrs["category"] = category
+        if raw.get("description") not in (None, ""):
+            attrs["description"] = str(raw["description"])
+        return name, quantity, attrs
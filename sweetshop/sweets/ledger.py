@@ -0,0 +1,398 @@
+"""Write-behind batching of ``InventoryEvent`` inserts.
+
+With ``SWEETS_LEDGER_WRITE_BEHIND`` on, purchases and restocks no longer
+insert their ledger row inline. The row is appended to a local spool file
+before the stock change commits, and queued in memory once it does; if the
+transaction rolls back, the row is struck from the spool instead. A
+background thread then writes the queue with one ``bulk_create`` when it
+reaches ``SWEETS_LEDGER_BATCH_SIZE`` rows or every
+``SWEETS_LEDGER_FLUSH_SECONDS``.
+
+Each row carries a unique ``ledger_key``. Replaying a spool after a crash, even
+one that died mid-flush, therefore never writes an event twice. A committed
+sale is on disk before its commit, so a crash cannot lose its event; a worker
+killed in the middle of a sale leaves a row that replay writes although the
+sale never committed, which ``check_ledger`` reports as drift.
+"""
+
+import atexit
+import fcntl
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+import weakref
+from pathlib import Path
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils.dateparse import parse_datetime
+
+logger = logging.getLogger(__name__)
+
+# Ids are handed out before commit, so the newest events may still have
+# lower-id neighbours in flight. Checkpointed readers stay this far behind
+# the newest insert.
+SETTLE_SECONDS = 60
+
+
+class LedgerWriter:
+    """In-memory queue mirrored to append-only spool segments.
+
+    Rows are spooled to ``ledger-<token>-<n>.jsonl``, opened on first use. A
+    flush first rotates the current segment, then inserts everything queued.
+    A rotated segment is deleted once each of its rows has been inserted or
+    struck, so every row not yet in the database is in a segment on disk,
+    and a failed flush keeps both for the next attempt.
+
+    The token is unique to this writer, not just its pid: a restarted worker
+    often gets its predecessor's pid. While it spools, the writer holds an
+    exclusive ``flock`` on ``ledger-<token>.lock``; the kernel drops it when
+    the process dies, which is how :func:`recover` tells a dead writer's
+    segments from a live one's.
+    """
+
+    def __init__(self, spool_dir, *, batch_size=500, flush_seconds=1.0, fsync=True):
+        self.spool_dir = Path(spool_dir)
+        self.spool_dir.mkdir(parents=True, exist_ok=True)
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        self.fsync = fsync
+        self.token = f"{os.getpid()}.{uuid.uuid4().hex[:12]}"
+        self._lock = None
+        self._ready = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._queue = []
+        self._oldest = None
+        self._segment = 0
+        self._spool = None
+        self._rotated = []
+        # Rows per segment not yet inserted or struck.
+        self._outstanding = {}
+        self._thread = None
+        self._stats = {
+            "enqueued": 0, "flushed": 0, "flushes": 0, "failures": 0, "recovered": 0, "discarded": 0,
+            "last_flush_ms": 0.0, "max_flush_ms": 0.0, "total_flush_ms": 0.0,
+        }
+
+    @staticmethod
+    def row(event) -> dict:
+        return {
+            "ledger_key": str(event.ledger_key or uuid.uuid4()),
+            "sweet_id": event.sweet_id,
+            "event_type": event.event_type,
+            "quantity": event.quantity,
+            "performed_by_id": event.performed_by_id,
+            "occurred_at": event.occurred_at.isoformat(),
+        }
+
+    def spool(self, rows):
+        """Spool ``rows`` now; returns the ``transaction.on_commit`` callback that queues them.
+
+        Call it inside the transaction that records the rows. On rollback,
+        Django drops the callback without running it, and the rows are struck
+        from their segment as it is collected.
+        """
+        with self._ready:
+            if self._spool is None:
+                self._open_segment()
+            path = Path(self._spool.name)
+            self._write(path, rows)
+            self._outstanding[path] = self._outstanding.get(path, 0) + len(rows)
+        committed = []
+
+        def commit():
+            committed.append(True)
+            self._enqueue(path, rows)
+
+        weakref.finalize(commit, self._strike, path, rows, committed).atexit = False
+        return commit
+
+    def flush(self) -> int:
+        """Insert everything queued so far; returns the number of rows written."""
+        with self._flush_lock:
+            with self._ready:
+                if not self._queue:
+                    return 0
+                batch, self._queue, self._oldest = self._queue, [], None
+                if self._spool is not None:
+                    self._spool.close()
+                    self._rotated.append(Path(self._spool.name))
+                    self._spool = None
+
+            started = time.perf_counter()
+            try:
+                _insert([row for _, row in batch])
+            except Exception:
+                with self._ready:
+                    # Put the rows back in front; their segments stay on disk.
+                    self._queue[:0] = batch
+                    self._oldest = time.monotonic()
+                    self._stats["failures"] += 1
+                raise
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            with self._ready:
+                for path, _ in batch:
+                    self._settle(path, 1)
+                self._stats["flushed"] += len(batch)
+                self._stats["flushes"] += 1
+                self._stats["last_flush_ms"] = round(elapsed_ms, 3)
+                self._stats["max_flush_ms"] = round(max(self._stats["max_flush_ms"], elapsed_ms), 3)
+                self._stats["total_flush_ms"] += elapsed_ms
+            return len(batch)
+
+    def close(self) -> None:
+        """Stop spooling and release the lock; unflushed rows are left to :func:`recover`."""
+        with self._ready:
+            if self._spool is not None:
+                self._spool.close()
+                self._spool = None
+            if self._lock is not None:
+                self._lock.close()
+                self._lock = None
+
+    def start(self) -> "LedgerWriter":
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="ledger-writer", daemon=True)
+            self._thread.start()
+            atexit.register(self.flush)
+        return self
+
+    def _run(self) -> None:
+        while True:
+            with self._ready:
+                self._ready.wait_for(lambda: len(self._queue) >= self.batch_size, self.flush_seconds)
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Ledger flush failed; rows stay spooled for the next attempt.")
+                connection.close()
+                time.sleep(self.flush_seconds)
+
+    def _open_segment(self) -> None:
+        if self._lock is None:
+            self._lock = open(self.spool_dir / f"ledger-{self.token}.lock", "a")
+            fcntl.flock(self._lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        self._segment += 1
+        self._spool = open(self.spool_dir / f"ledger-{self.token}-{self._segment}.jsonl", "a", encoding="utf-8")
+
+    def _write(self, path, records) -> None:
+        lines = "".join(json.dumps(record) + "\n" for record in records)
+        if self._spool is not None and path == Path(self._spool.name):
+            spool = self._spool
+            spool.write(lines)
+        else:
+            spool = open(path, "a", encoding="utf-8")
+            spool.write(lines)
+        spool.flush()
+        if self.fsync:
+            os.fsync(spool.fileno())
+        if spool is not self._spool:
+            spool.close()
+
+    def _enqueue(self, path, rows) -> None:
+        with self._ready:
+            if not self._queue:
+                self._oldest = time.monotonic()
+            self._queue.extend((path, row) for row in rows)
+            self._stats["enqueued"] += len(rows)
+            if len(self._queue) >= self.batch_size:
+                self._ready.notify()
+
+    def _strike(self, path, rows, committed) -> None:
+        # The commit callback was collected; unless it ran, the sale rolled back.
+        if committed:
+            return
+        with self._ready:
+            if path not in self._outstanding:
+                return
+            if path.exists():
+                self._write(path, [{"discard": row["ledger_key"]} for row in rows])
+            self._stats["discarded"] += len(rows)
+            self._settle(path, len(rows))
+
+    def _settle(self, path, count) -> None:
+        self._outstanding[path] -= count
+        if not self._outstanding[path] and path in self._rotated:
+            path.unlink(missing_ok=True)
+            self._rotated.remove(path)
+            del self._outstanding[path]
+
+    def stats(self) -> dict:
+        with self._ready:
+            stats = dict(self._stats)
+            flushes = stats.pop("flushes")
+            total = stats.pop("total_flush_ms")
+            return {
+                **stats,
+                "flushes": flushes,
+                "avg_flush_ms": round(total / flushes, 3) if flushes else 0.0,
+                "queue_depth": len(self._queue),
+                "oldest_pending_seconds": round(time.monotonic() - self._oldest, 3) if self._oldest else 0.0,
+                "spool_segments": len(self._rotated) + (self._spool is not None),
+            }
+
+
+def recover(spool_dir) -> int:
+    """Replay spool segments left behind by writers that are no longer running."""
+    spool_dir = Path(spool_dir)
+    if not spool_dir.is_dir():
+        return 0
+    recovered = 0
+    for lock_path in sorted(spool_dir.glob("ledger-*.lock")):
+        token = lock_path.name.removeprefix("ledger-").removesuffix(".lock")
+        with open(lock_path, "a") as lock:
+            try:
+                # Held by a live writer, or by another process replaying it.
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                continue
+            segments = sorted(
+                spool_dir.glob(f"ledger-{token}-*.jsonl"), key=lambda path: int(path.stem.rsplit("-", 1)[1])
+            )
+            for path in segments:
+                records = [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines() if line]
+                struck = {record["discard"] for record in records if "discard" in record}
+                rows = [record for record in records if "discard" not in record and record["ledger_key"] not in struck]
+                _insert(rows)
+                path.unlink()
+                recovered += len(rows)
+            lock_path.unlink(missing_ok=True)
+    return recovered
+
+
+def _insert(rows) -> None:
+    from django.contrib.auth import get_user_model
+
+    from .models import InventoryEvent, Sweet
+
+    # Sweets and users may have been deleted since the event was queued; mirror
+    # CASCADE / SET_NULL so one stale row cannot wedge every later flush.
+    sweets = set(Sweet.objects.filter(pk__in={row["sweet_id"] for row in rows}).values_list("pk", flat=True))
+    users = set(
+        get_user_model().objects.filter(
+            pk__in={row["performed_by_id"] for row in rows if row["performed_by_id"] is not None}
+        ).values_list("pk", flat=True)
+    )
+    events = [
+        InventoryEvent(
+            **{
+                **row,
+                "performed_by_id": row["performed_by_id"] if row["performed_by_id"] in users else None,
+                "occurred_at": parse_datetime(row["occurred_at"]),
+            }
+        )
+        for row in rows
+        if row["sweet_id"] in sweets
+    ]
+    with transaction.atomic():
+        InventoryEvent.objects.bulk_create(events, ignore_conflicts=True)
+
+
+def ledger_net(model, **filters):
+    """Correlated ``SUM`` of signed quantities for the outer ``Sweet`` row.
+
+    ``model`` is ``InventoryEvent`` or ``InventoryDailySummary``; both are
+    served by an index led by ``sweet``.
+    """
+    from django.db import models
+    from django.db.models import OuterRef, Subquery, Sum
+    from django.db.models.functions import Coalesce
+
+    from .models import InventoryEvent
+
+    total = (
+        model.objects.filter(sweet=OuterRef("pk"), **filters)
+        .order_by()
+        .values("sweet")
+        .annotate(total=Sum(InventoryEvent.signed_quantity()))
+        .values("total")
+    )
+    return Coalesce(Subquery(total), 0, output_field=models.BigIntegerField())
+
+
+def stock_drift(expected=None, *, drifting=False, settled=False, now=None) -> dict:
+    """``{sweet_id: (stock, expected)}`` in one query.
+
+    ``expected`` defaults to the ledger total: the live events plus the daily
+    summaries of archived ones. With ``drifting``, only sweets whose stock
+    disagrees are returned, which is what ``reconcile_stock`` reports. With
+    ``settled``, sweets whose stock moved or who gained events within
+    ``SETTLE_SECONDS`` are left out, since their latest events may still be
+    in flight.
+
+    Sweets created or edited through the API log their opening stock and
+    adjustments, so their stock matches. Stock set around the API (shell,
+    fixtures, older data) leaves a constant offset. What must hold is that
+    the offset never *changes* while events are written or archived, which
+    is what ``check_ledger`` compares against a saved baseline.
+    """
+    from datetime import timedelta
+
+    from django.db.models import Exists, F, OuterRef, Q
+    from django.utils import timezone
+
+    from .models import InventoryDailySummary, InventoryEvent, Sweet, stock_units
+
+    if expected is None:
+        expected = ledger_net(InventoryEvent) + ledger_net(InventoryDailySummary)
+    rows = Sweet.objects.order_by("pk").annotate(stock=stock_units(), expected=expected)
+    if drifting:
+        rows = rows.filter(~Q(stock=F("expected")))
+    if settled:
+        cutoff = (now or timezone.now()) - timedelta(seconds=SETTLE_SECONDS)
+        recent = InventoryEvent.objects.filter(sweet=OuterRef("pk"), updated_at__gte=cutoff)
+        rows = rows.filter(updated_at__lt=cutoff).exclude(Exists(recent))
+    return {pk: (stock, total) for pk, stock, total in rows.values_list("pk", "stock", "expected")}
+
+
+def settled_event_id(now=None) -> int:
+    """Highest event id a checkpointed reader (rollups, reconcile_stock) may pass.
+
+    Settles on insertion time, not ``occurred_at``: write-behind rows keep
+    the time of the sale but get their id when flushed or replayed, maybe
+    long after. ``updated_at`` is stamped by the INSERT, and ledger rows are
+    never saved again.
+    """
+    from datetime import timedelta
+
+    from django.utils import timezone
+
+    from .models import InventoryEvent
+
+    now = now or timezone.now()
+    settled = (
+        InventoryEvent.objects.filter(updated_at__lt=now - timedelta(seconds=SETTLE_SECONDS))
+        .order_by("-id")
+        .values_list("id", flat=True)
+        .first()
+    )
+    return settled or 0
+
+
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def get_writer():
+    """The process-wide writer, or ``None`` when write-behind is off."""
+    global _writer
+    if not getattr(settings, "SWEETS_LEDGER_WRITE_BEHIND", False):
+        return None
+    if _writer is None:
+        with _writer_lock:
+            if _writer is None:
+                writer = LedgerWriter(
+                    getattr(settings, "SWEETS_LEDGER_SPOOL_DIR", "/tmp/sweetshop-ledger"),
+                    batch_size=getattr(settings, "SWEETS_LEDGER_BATCH_SIZE", 500),
+                    flush_seconds=getattr(settings, "SWEETS_LEDGER_FLUSH_SECONDS", 1.0),
+                    fsync=getattr(settings, "SWEETS_LEDGER_FSYNC", True),
+                )
+                try:
+                    writer._stats["recovered"] = recover(writer.spool_dir)
+                except Exception:
+                    logger.exception("Could not replay leftover ledger spool segments.")
+                _writer = writer.start()
+    return _writer
@@ -0,0 +1,48 @@
+"""Roll old inventory events into daily summaries and compressed archive files."""
+
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from sweets.archive import ArchiveConflict, archive_before
+
+
+class Command(BaseCommand):
+    help = (
+        "Archive inventory events older than --days, one UTC day at a time: stream the "
+        "raw rows to gzipped NDJSON files, add their per-sweet totals to the daily "
+        "summaries, then delete them. Ledger totals (check_ledger) are unchanged."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--days",
+            type=int,
+            default=getattr(settings, "SWEETS_LEDGER_RETENTION_DAYS", 90),
+            help="Keep this many days of raw events (today counts as one).",
+        )
+        parser.add_argument(
+            "--output-dir",
+            default=getattr(settings, "SWEETS_LEDGER_ARCHIVE_DIR", "ledger-archive"),
+            help="Where the inventory-events-<day>-<first id>.ndjson.gz files go.",
+        )
+        parser.add_argument("--chunk-size", type=int, default=5000)
+
+    def handle(self, *args, days, output_dir, chunk_size, **options):
+        if days < 1:
+            raise CommandError("--days must be at least 1.")
+        cutoff = timezone.now() - timedelta(days=days - 1)
+        started = time.perf_counter()
+        total = 0
+        try:
+            for day, events, path in archive_before(cutoff, output_dir, chunk_size=chunk_size):
+                total += events
+                self.stdout.write(f"  {day}: {events} event(s) -> {path.name}")
+        except ArchiveConflict as exc:
+            raise CommandError(str(exc)) from exc
+        self.stdout.write(
+            f"Archived {total} event(s) in {time.perf_counter() - started:.1f} s."
+        )
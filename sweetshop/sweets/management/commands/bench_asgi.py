@@ -0,0 +1,107 @@
+"""Compare catalogue read throughput and tail latency under WSGI and ASGI."""
+
+import asyncio
+import statistics
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.test import AsyncClient, Client
+from django.test.utils import override_settings
+
+from accounts.authentication import tokens_for_user
+from sweets.models import Category, Sweet
+
+
+class Command(BaseCommand):
+    help = (
+        "Drive the WSGI and ASGI handlers in-process at a fixed concurrency and report "
+        "requests/s, p50 and p99 for the sync DRF list (under WSGI and ASGI) and the "
+        "async list. Seeded rows are deleted afterwards. Numbers exclude the network "
+        "server; use them to compare handlers, not to size a deployment."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=2000)
+        parser.add_argument("--concurrency", type=int, default=64)
+        parser.add_argument("--rows", type=int, default=500)
+        parser.add_argument("--page-size", type=int, default=50)
+        parser.add_argument(
+            "--cache", action="store_true", help="Keep the response cache on (off by default)."
+        )
+
+    def handle(self, *args, requests, concurrency, rows, page_size, cache, **options):
+        run = uuid.uuid4().hex[:8]
+        owner = get_user_model().objects.create_user(username=f"bench-asgi-{run}", password=None)
+        Sweet.objects.bulk_create(
+            Sweet(
+                name=f"Bench {run} {index:06d}",
+                description="benchmark row",
+                price="1.00",
+                created_by=owner,
+                quantity_in_stock=10,
+                category=Category.values[index % len(Category.values)],
+            )
+            for index in range(rows)
+        )
+        headers = {"Authorization": f"Bearer {tokens_for_user(owner).access_token}"}
+        query = f"?page_size={page_size}"
+        scenarios = [
+            ("WSGI  sync  /api/sweets/", self._wsgi, "/api/sweets/" + query),
+            ("ASGI  sync  /api/sweets/", self._asgi, "/api/sweets/" + query),
+            ("ASGI  async /api/async/sweets/", self._asgi, "/api/async/sweets/" + query),
+        ]
+        try:
+            # The test clients send "Host: testserver".
+            with override_settings(SWEETS_CACHE_ENABLED=cache, ALLOWED_HOSTS=["testserver"]):
+                self.stdout.write(f"{requests} requests, concurrency {concurrency}, {rows} rows")
+                for label, runner, path in scenarios:
+                    elapsed, timings = runner(path, headers, requests, concurrency)
+                    timings.sort()
+                    p99 = timings[min(len(timings) - 1, int(len(timings) * 0.99))]
+                    self.stdout.write(
+                        f"  {label:<32} {len(timings) / elapsed:8.0f} req/s   "
+                        f"p50 {statistics.median(timings):7.1f} ms   p99 {p99:7.1f} ms"
+                    )
+        finally:
+            Sweet.objects.filter(created_by=owner).delete()
+            owner.delete()
+
+    @staticmethod
+    def _wsgi(path, headers, requests, concurrency):
+        local = threading.local()
+
+        def fetch(_):
+            if not hasattr(local, "client"):
+                local.client = Client()
+            began = time.perf_counter()
+            response = local.client.get(path, headers=headers)
+            assert response.status_code == 200, response.status_code
+            return (time.perf_counter() - began) * 1000
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            timings = list(pool.map(fetch, range(requests)))
+        return time.perf_counter() - started, timings
+
+    @staticmethod
+    def _asgi(path, headers, requests, concurrency):
+        async def main():
+            client = AsyncClient()
+            slots = asyncio.Semaphore(concurrency)
+
+            async def fetch():
+                async with slots:
+                    began = time.perf_counter()
+                    response = await client.get(path, headers=headers)
+                    assert response.status_code == 200, response.status_code
+                    return (time.perf_counter() - began) * 1000
+
+            started = time.perf_counter()
+            timings = await asyncio.gather(*(fetch() for _ in range(requests)))
+            return time.perf_counter() - started, list(timings)
+
+        return asyncio.run(main())
@@ -0,0 +1,70 @@
+"""Benchmark list serialization: SweetSerializer vs the ``.values()`` fast path."""
+
+import time
+import uuid
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from rest_framework.renderers import JSONRenderer
+
+from sweets.models import Sweet
+from sweets.serializers import SweetSerializer, sweet_rows_to_representation
+
+
+class Command(BaseCommand):
+    help = (
+        "Render pages of synthetic sweets through SweetSerializer and through the "
+        "serializer-free fast path, check the JSON is byte-identical, and report rows/s."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=20_000, help="Synthetic sweets to create.")
+        parser.add_argument("--page-sizes", type=int, nargs="+", default=[50, 200, 1000])
+        parser.add_argument("--repeat", type=int, default=5)
+
+    def handle(self, *args, rows, page_sizes, repeat, **options):
+        renderer = JSONRenderer()
+        fields = SweetSerializer.Meta.fields
+
+        def serializer_path(size):
+            page = list(Sweet.objects.order_by("name", "id")[:size])
+            return renderer.render(SweetSerializer(page, many=True).data)
+
+        def fast_path(size):
+            page = list(Sweet.objects.order_by("name", "id").values(*fields)[:size])
+            return renderer.render(sweet_rows_to_representation(page, fields))
+
+        with transaction.atomic():
+            owner = get_user_model().objects.create_user(
+                username=f"bench-{uuid.uuid4().hex[:8]}", password=None
+            )
+            Sweet.objects.bulk_create(
+                (
+                    Sweet(
+                        name=f"Bench sweet {index:07d}",
+                        description="A fairly long description of a sweet " * 8,
+                        price=f"{index % 100}.{index % 97:02d}",
+                        created_by=owner,
+                        quantity_in_stock=index % 40,
+                    )
+                    for index in range(rows)
+                ),
+                batch_size=5_000,
+            )
+
+            for size in page_sizes:
+                if serializer_path(size) != fast_path(size):
+                    raise CommandError(f"Fast path output differs at page size {size}.")
+                results = {}
+                for label, render in (("serializer", serializer_path), ("fast path", fast_path)):
+                    started = time.perf_counter()
+                    for _ in range(repeat):
+                        render(size)
+                    elapsed = time.perf_counter() - started
+                    results[label] = size * repeat / elapsed
+                    self.stdout.write(f"  page {size:>5}  {label:<10} {results[label]:>12,.0f} rows/s")
+                self.stdout.write(
+                    f"  page {size:>5}  speed-up   {results['fast path'] / results['serializer']:>12.1f}x (byte-identical)"
+                )
+            transaction.set_rollback(True)
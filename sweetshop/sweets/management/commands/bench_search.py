@@ -0,0 +1,90 @@
+"""Benchmark catalogue search latency: icontains scan vs the full-text backend."""
+
+import random
+import statistics
+import time
+import uuid
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from sweets.models import Category, Sweet
+from sweets.search import IContainsSearchBackend, get_search_backend
+
+WORDS = (
+    "almond apple butter caramel cherry chewy chocolate cinnamon citrus cocoa "
+    "coconut crunchy dark fizzy fudge ginger hazelnut honey lemon liquorice "
+    "malt maple marshmallow milk mint nougat orange peanut praline raspberry "
+    "salted sour strawberry sugar toffee truffle vanilla white"
+).split()
+SYLLABLES = "ba bo ca ci da do fa fi ga go la li ma mo na ni pa po ra ri sa so ta ti va vo za zu".split()
+
+
+class Command(BaseCommand):
+    help = (
+        "Fill the catalogue with synthetic sweets at each size and compare search "
+        "latency of icontains against the configured backend. All rows are rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+        parser.add_argument("--queries", type=int, default=20, help="Queries per backend per size.")
+        parser.add_argument(
+            "--terms", nargs="+", default=["choc", "salted caramel", "min", "sour apple", "xylophone"]
+        )
+        parser.add_argument("--page-size", type=int, default=50)
+        parser.add_argument("--seed", type=int, default=7)
+
+    def handle(self, *args, sizes, queries, terms, page_size, seed, **options):
+        rng = random.Random(seed)
+        # A realistic vocabulary keeps terms selective instead of hitting every row.
+        vocabulary = WORDS + sorted(
+            {"".join(rng.choices(SYLLABLES, k=3)) for _ in range(5_000)}
+        )
+        backends = [("icontains", IContainsSearchBackend())]
+        configured = get_search_backend()
+        if not isinstance(configured, IContainsSearchBackend):
+            backends.append((type(configured).__name__, configured))
+
+        with transaction.atomic():
+            owner = get_user_model().objects.create_user(
+                username=f"bench-{uuid.uuid4().hex[:8]}", password=None
+            )
+            inserted = 0
+            for size in sorted(sizes):
+                started = time.perf_counter()
+                while inserted < size:
+                    chunk = min(5_000, size - inserted)
+                    Sweet.objects.bulk_create(
+                        self._synthetic(rng, vocabulary, owner, inserted + offset)
+                        for offset in range(chunk)
+                    )
+                    inserted += chunk
+                self.stdout.write(f"\n{size:,} rows (filled in {time.perf_counter() - started:.1f}s)")
+
+                for label, backend in backends:
+                    ordering = ("-search_rank", "id") if backend.ranks else ("name", "id")
+                    timings = []
+                    for index in range(queries):
+                        term = terms[index % len(terms)]
+                        began = time.perf_counter()
+                        list(backend.search(Sweet.objects.all(), term).order_by(*ordering)[:page_size])
+                        timings.append((time.perf_counter() - began) * 1000)
+                    timings.sort()
+                    p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+                    self.stdout.write(
+                        f"  {label:<24} p50 {statistics.median(timings):8.2f} ms   p95 {p95:8.2f} ms"
+                    )
+            transaction.set_rollback(True)
+
+    @staticmethod
+    def _synthetic(rng, vocabulary, owner, index):
+        return Sweet(
+            name=f"{' '.join(rng.sample(vocabulary, 2)).title()} {index}",
+            description=" ".join(rng.choices(vocabulary, k=12)),
+            price="1.00",
+            created_by=owner,
+            quantity_in_stock=rng.randint(0, 50),
+            category=rng.choice(Category.values),
+        )
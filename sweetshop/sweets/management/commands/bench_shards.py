@@ -0,0 +1,84 @@
+"""Compare hot-sweet purchase throughput across stock shard counts."""
+
+import threading
+import time
+import uuid
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connection
+
+from sweets.ledger import get_writer
+from sweets.models import InventoryEvent, Sweet
+
+
+class Command(BaseCommand):
+    help = (
+        "Fire concurrent single-unit purchases at one throwaway sweet per shard count "
+        "(0 = unsharded), verify nothing is oversold and report purchases/s. Postgres "
+        "shows the row-lock relief; SQLite serialises all writers, so expect it flat."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--shards", type=int, nargs="+", default=[0, 1, 4, 16])
+        parser.add_argument("--threads", type=int, default=8)
+        parser.add_argument("--purchases", type=int, default=200, help="Purchases per thread.")
+
+    def handle(self, *args, shards, threads, purchases, **options):
+        run = uuid.uuid4().hex[:8]
+        owner = get_user_model().objects.create_user(username=f"bench-shards-{run}", password=None)
+        stock = threads * purchases
+        self.stdout.write(f"{connection.vendor}: {threads} threads x {purchases} purchases")
+        try:
+            for count in shards:
+                sweet = Sweet.objects.create(
+                    name=f"bench-shards-{run}-{count}", price="1.00", created_by=owner, quantity_in_stock=stock
+                )
+                sweet.rebalance(count)
+                elapsed, retries = self._hammer(sweet.pk, threads, purchases)
+                writer = get_writer()
+                if writer is not None:
+                    writer.flush()
+                left = sweet.availability()["quantity_in_stock"]
+                events = InventoryEvent.objects.filter(sweet=sweet).count()
+                if left != 0 or events != stock:
+                    raise CommandError(f"{count} shards: stock left {left}, {events} events for {stock} sales.")
+                self.stdout.write(
+                    f"  {count:>3} shard(s): {stock / elapsed:8.0f} purchases/s   "
+                    f"{retries} lock retries"
+                )
+        finally:
+            Sweet.objects.filter(created_by=owner).delete()
+            owner.delete()
+
+    @staticmethod
+    def _hammer(pk, threads, purchases):
+        retries = []
+        barrier = threading.Barrier(threads + 1)
+
+        def buyer():
+            busy = 0
+            sweet = Sweet.objects.get(pk=pk)
+            barrier.wait()
+            try:
+                for _ in range(purchases):
+                    while True:
+                        try:
+                            sweet.purchase(quantity=1)
+                        except OperationalError:
+                            # SQLite surfaces lock contention as an error; retry.
+                            busy += 1
+                            continue
+                        break
+            finally:
+                connection.close()
+                retries.append(busy)
+
+        workers = [threading.Thread(target=buyer) for _ in range(threads)]
+        for worker in workers:
+            worker.start()
+        barrier.wait()
+        started = time.perf_counter()
+        for worker in workers:
+            worker.join()
+        return time.perf_counter() - started, sum(retries)
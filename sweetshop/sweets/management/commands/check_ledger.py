@@ -0,0 +1,58 @@
+"""Reconcile inventory ledger totals against stock levels."""
+
+import json
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from sweets.ledger import recover, stock_drift
+
+
+class Command(BaseCommand):
+    help = (
+        "Replay spool segments left by dead write-behind writers, then compare each "
+        "sweet's stock with its signed ledger total. With --baseline, fail "
+        "if any sweet's drift changed since the baseline was saved, i.e. ledger "
+        "events were lost or duplicated. Run it while writers are idle or flushed. "
+        "reconcile_stock lists and repairs sweets whose stock disagrees outright."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--baseline", help="JSON file of drift per sweet; created if missing.")
+        parser.add_argument("--update", action="store_true", help="Rewrite the baseline after checking.")
+
+    def handle(self, *args, baseline, update, **options):
+        recovered = recover(getattr(settings, "SWEETS_LEDGER_SPOOL_DIR", "/tmp/sweetshop-ledger"))
+        if recovered:
+            self.stdout.write(f"Replayed {recovered} spooled event(s).")
+
+        drift = {pk: stock - expected for pk, (stock, expected) in stock_drift().items()}
+        self.stdout.write(
+            f"{len(drift)} sweet(s); {sum(1 for value in drift.values() if value)} with stock "
+            f"not explained by the ledger (opening stock or direct edits)."
+        )
+        if not baseline:
+            return
+
+        path = Path(baseline)
+        if not path.exists():
+            self._save(path, drift)
+            self.stdout.write(f"Baseline saved to {path}.")
+            return
+
+        saved = {int(pk): value for pk, value in json.loads(path.read_text()).items()}
+        changed = {
+            pk: (saved[pk], value) for pk, value in drift.items() if pk in saved and saved[pk] != value
+        }
+        if update:
+            self._save(path, drift)
+        if changed:
+            for pk, (before, after) in sorted(changed.items())[:20]:
+                self.stderr.write(f"  sweet {pk}: drift {before} -> {after}")
+            raise CommandError(f"Ledger and stock disagree for {len(changed)} sweet(s).")
+        self.stdout.write(self.style.SUCCESS("Ledger and stock agree since the baseline."))
+
+    @staticmethod
+    def _save(path, drift):
+        path.write_text(json.dumps({str(pk): value for pk, value in drift.items()}))
@@ -0,0 +1,31 @@
+"""Sweep lapsed stock reservations into the expired state."""
+
+import time
+
+from django.core.management.base import BaseCommand
+
+from sweets.models import StockReservation
+
+
+class Command(BaseCommand):
+    help = (
+        "Mark active reservations past their expiry as expired, in batched UPDATEs. "
+        "Lapsed holds already stop counting against stock, so this only keeps the "
+        "active-hold indexes small. Run it from cron, or with --loop as a worker."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument("--loop", action="store_true", help="Keep sweeping until interrupted.")
+        parser.add_argument("--interval", type=float, default=30.0, help="Seconds between sweeps with --loop.")
+
+    def handle(self, *args, batch_size, loop, interval, **options):
+        while True:
+            started = time.perf_counter()
+            expired = StockReservation.expire_stale(batch_size=batch_size)
+            self.stdout.write(
+                f"Expired {expired} reservation(s) in {(time.perf_counter() - started) * 1000:.1f} ms."
+            )
+            if not loop:
+                return
+            time.sleep(interval)
@@ -0,0 +1,34 @@
+"""Recompute the hourly and daily sales/restock rollups from the ledger."""
+
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from sweets.rollups import fold, rebuild
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuild InventoryRollup rows from InventoryEvent (and the daily summaries of "
+        "archived days) in chunks of --chunk-days UTC days, --workers chunks at a "
+        "time. Events folded meanwhile are counted exactly once. With --incremental, "
+        "only fold the events recorded since the last fold (e.g. from cron)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=4)
+        parser.add_argument("--chunk-days", type=int, default=7)
+        parser.add_argument("--incremental", action="store_true", help="Fold new events instead of rebuilding.")
+
+    def handle(self, *args, workers, chunk_days, incremental, **options):
+        if chunk_days < 1:
+            raise CommandError("--chunk-days must be at least 1.")
+        started = time.perf_counter()
+        if incremental:
+            events = fold()
+            self.stdout.write(f"Folded {events} event(s) in {time.perf_counter() - started:.1f} s.")
+            return
+        rows, days = rebuild(workers=workers, chunk_days=chunk_days)
+        self.stdout.write(
+            f"Rebuilt {rows} rollup row(s) over {days} day(s) in {time.perf_counter() - started:.1f} s."
+        )
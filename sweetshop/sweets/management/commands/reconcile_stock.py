@@ -0,0 +1,64 @@
+"""Compare every sweet's stock with the stock its inventory ledger implies."""
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from sweets.ledger import recover, stock_drift
+from sweets.reconcile import incremental_drift, repair_ledger, repair_stock
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuild expected stock from the ledger (opening stock + restocks + adjustments "
+        "in - purchases - adjustments out, archived days included) and report sweets "
+        "whose quantity_in_stock disagrees. --incremental only aggregates events past "
+        "the last checkpoint. --repair stock trusts the ledger; --repair ledger trusts "
+        "the stock and logs adjustment events."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--incremental", action="store_true", help="Only scan events since the last incremental run."
+        )
+        parser.add_argument("--repair", choices=["stock", "ledger"])
+        parser.add_argument("--user", help="Username recorded on --repair ledger adjustments.")
+
+    def handle(self, *args, incremental, repair, user, **options):
+        if repair == "stock" and getattr(settings, "SWEETS_LEDGER_WRITE_BEHIND", False):
+            # Queued events would read as missing sales and put sold units back on sale.
+            raise CommandError("--repair stock trusts the ledger; disable SWEETS_LEDGER_WRITE_BEHIND first.")
+        performed_by = None
+        if user:
+            try:
+                performed_by = get_user_model().objects.get(username=user)
+            except get_user_model().DoesNotExist as exc:
+                raise CommandError(f"No user named {user!r}.") from exc
+
+        recovered = recover(getattr(settings, "SWEETS_LEDGER_SPOOL_DIR", "/tmp/sweetshop-ledger"))
+        if recovered:
+            self.stdout.write(f"Replayed {recovered} spooled event(s).")
+        if incremental:
+            drift, scanned = incremental_drift()
+            self.stdout.write(f"Scanned {scanned} new event(s).")
+        else:
+            drift = stock_drift(drifting=True, settled=True)
+        self.stdout.write(f"{len(drift)} sweet(s) drifting.")
+        for pk, (stock, expected) in sorted(drift.items())[:20]:
+            self.stdout.write(f"  sweet {pk}: stock {stock}, ledger {expected}")
+        if not drift:
+            return
+
+        if repair == "stock":
+            repaired = repair_stock(drift)
+            skipped = len(drift) - len(repaired)
+            self.stdout.write(self.style.SUCCESS(f"Set stock from the ledger for {len(repaired)} sweet(s)."))
+            if skipped:
+                raise CommandError(
+                    f"{skipped} sweet(s) left as they are (sharded, negative ledger or stock moved)."
+                )
+        elif repair == "ledger":
+            repaired = repair_ledger(drift, user=performed_by)
+            self.stdout.write(self.style.SUCCESS(f"Logged adjustments for {len(repaired)} sweet(s)."))
+        else:
+            raise CommandError(f"Stock disagrees with the ledger for {len(drift)} sweet(s).")
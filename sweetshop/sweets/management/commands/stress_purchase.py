@@ -0,0 +1,89 @@
+"""Concurrent purchase stress test reporting throughput and oversell checks."""
+
+import threading
+import time
+import uuid
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connection
+
+from sweets.ledger import get_writer
+from sweets.models import InventoryEvent, Sweet
+
+
+class Command(BaseCommand):
+    help = (
+        "Fire concurrent purchases at a single throwaway sweet, verify that "
+        "stock never goes negative, and report purchases per second."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--threads", type=int, default=8)
+        parser.add_argument("--purchases", type=int, default=200, help="Attempts per thread.")
+        parser.add_argument("--stock", type=int, default=1000)
+
+    def handle(self, *args, threads, purchases, stock, **options):
+        owner = get_user_model().objects.filter(is_superuser=True).first()
+        if owner is None:
+            raise CommandError("Create an admin user before running the stress test.")
+
+        sweet = Sweet.objects.create(
+            name=f"stress-{uuid.uuid4().hex[:12]}",
+            price="1.00",
+            created_by=owner,
+            quantity_in_stock=stock,
+        )
+        sold = []
+        lock = threading.Lock()
+        barrier = threading.Barrier(threads)
+
+        def buyer():
+            count = 0
+            target = Sweet.objects.get(pk=sweet.pk)
+            barrier.wait()
+            try:
+                for _ in range(purchases):
+                    while True:
+                        try:
+                            target.purchase(quantity=1)
+                            count += 1
+                        except ValueError:
+                            pass
+                        except OperationalError:
+                            # SQLite surfaces lock contention as an error; retry.
+                            continue
+                        break
+            finally:
+                connection.close()
+                with lock:
+                    sold.append(count)
+
+        workers = [threading.Thread(target=buyer) for _ in range(threads)]
+        started = time.perf_counter()
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        elapsed = time.perf_counter() - started
+
+        writer = get_writer()
+        if writer is not None:
+            # Count write-behind events too, not just those already flushed.
+            writer.flush()
+        try:
+            sweet.refresh_from_db()
+            total_sold = sum(sold)
+            events = InventoryEvent.objects.filter(sweet=sweet).count()
+            attempts = threads * purchases
+            self.stdout.write(
+                f"{attempts} attempts, {total_sold} sold in {elapsed:.2f}s "
+                f"({attempts / elapsed:.0f} attempts/s, {total_sold / elapsed:.0f} purchases/s)"
+            )
+            if total_sold > stock or sweet.quantity_in_stock != stock - total_sold or events != total_sold:
+                raise CommandError(
+                    f"Oversell detected: stock={sweet.quantity_in_stock} sold={total_sold} events={events}"
+                )
+            self.stdout.write(self.style.SUCCESS("No oversell: stock, sales and ledger agree."))
+        finally:
+            sweet.delete()
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.8 on 2026-10-16 23:04
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sweets', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SweetSearchIndex',
+            fields=[
+                ('sweet', models.OneToOneField(db_column='rowid', db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, primary_key=True, related_name='search_index', serialize=False, to='sweets.sweet')),
+                ('name', models.TextField()),
+                ('description', models.TextField()),
+            ],
+            options={
+                'db_table': 'sweets_sweet_fts',
+                'managed': False,
+            },
+        ),
+    ]
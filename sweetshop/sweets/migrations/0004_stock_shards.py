@@ -0,0 +1,31 @@
+# Generated by Django 5.2.8 on 2026-10-16 23:55
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sweets', '0003_stockreservation'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='sweet',
+            name='shard_count',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.CreateModel(
+            name='StockShard',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('index', models.PositiveSmallIntegerField()),
+                ('quantity', models.PositiveIntegerField(default=0)),
+                ('sweet', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stock_shards', to='sweets.sweet')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('sweet', 'index'), name='sweets_stockshard_unique_index')],
+            },
+        ),
+    ]
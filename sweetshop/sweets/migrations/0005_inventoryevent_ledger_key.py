@@ -0,0 +1,24 @@
+# Generated by Django 5.2.8 on 2026-10-16 23:59
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sweets', '0004_stock_shards'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='inventoryevent',
+            name='ledger_key',
+            field=models.UUIDField(blank=True, editable=False, null=True, unique=True),
+        ),
+        migrations.AlterField(
+            model_name='inventoryevent',
+            name='occurred_at',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False),
+        ),
+    ]
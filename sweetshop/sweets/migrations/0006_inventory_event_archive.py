@@ -0,0 +1,55 @@
+# Generated by Django 5.2.8 on 2026-10-17 00:06
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sweets', '0005_inventoryevent_ledger_key'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InventoryDailySummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('event_type', models.CharField(choices=[('purchase', 'Purchase'), ('restock', 'Restock')], max_length=20)),
+                ('quantity', models.PositiveBigIntegerField(default=0)),
+                ('events', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'ordering': ['-day', 'sweet_id', 'event_type'],
+            },
+        ),
+        migrations.AlterModelOptions(
+            name='inventoryevent',
+            options={'ordering': ['-occurred_at', '-id']},
+        ),
+        migrations.AddIndex(
+            model_name='inventoryevent',
+            index=models.Index(fields=['sweet', 'occurred_at', 'id'], name='sweets_event_sweet_time_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='inventoryevent',
+            index=models.Index(fields=['occurred_at', 'id'], name='sweets_event_time_idx'),
+        ),
+        migrations.AlterField(
+            model_name='inventoryevent',
+            name='sweet',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='inventory_events', to='sweets.sweet'),
+        ),
+        migrations.AddField(
+            model_name='inventorydailysummary',
+            name='sweet',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='daily_summaries', to='sweets.sweet'),
+        ),
+        migrations.AddConstraint(
+            model_name='inventorydailysummary',
+            constraint=models.UniqueConstraint(fields=('sweet', 'day', 'event_type'), name='sweets_daily_summary_unique_day'),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.8 on 2026-10-17 00:10
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sweets', '0006_inventory_event_archive'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InventoryRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('granularity', models.CharField(choices=[('hour', 'Hour'), ('day', 'Day')], max_length=4)),
+                ('bucket', models.DateTimeField()),
+                ('category', models.CharField(blank=True, choices=[('chocolate', 'Chocolate'), ('candy', 'Candy'), ('bakery', 'Bakery'), ('gum', 'Gum'), ('other', 'Other')], max_length=50)),
+                ('purchased_units', models.PositiveBigIntegerField(default=0)),
+                ('purchases', models.PositiveIntegerField(default=0)),
+                ('restocked_units', models.PositiveBigIntegerField(default=0)),
+                ('restocks', models.PositiveIntegerField(default=0)),
+                ('sweet', models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='rollups', to='sweets.sweet')),
+            ],
+            options={
+                'ordering': ['bucket'],
+                'constraints': [models.UniqueConstraint(condition=models.Q(('sweet__isnull', False)), fields=('sweet', 'granularity', 'bucket'), name='sweets_rollup_sweet_bucket'), models.UniqueConstraint(condition=models.Q(('sweet__isnull', True)), fields=('category', 'granularity', 'bucket'), name='sweets_rollup_category_bucket')],
+            },
+        ),
+    ]
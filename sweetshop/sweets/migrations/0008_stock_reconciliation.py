@@ -0,0 +1,41 @@
+# Generated by Django 5.2.8 on 2026-10-17 00:20
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sweets', '0007_inventory_rollups'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LedgerCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True)),
+                ('last_event_id', models.BigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ReconciledStock',
+            fields=[
+                ('sweet', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='reconciled_stock', serialize=False, to='sweets.sweet')),
+                ('ledger_total', models.BigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AlterField(
+            model_name='inventorydailysummary',
+            name='event_type',
+            field=models.CharField(choices=[('purchase', 'Purchase'), ('restock', 'Restock'), ('opening', 'Opening stock'), ('adjustment_in', 'Adjustment (in)'), ('adjustment_out', 'Adjustment (out)')], max_length=20),
+        ),
+        migrations.AlterField(
+            model_name='inventoryevent',
+            name='event_type',
+            field=models.CharField(choices=[('purchase', 'Purchase'), ('restock', 'Restock'), ('opening', 'Opening stock'), ('adjustment_in', 'Adjustment (in)'), ('adjustment_out', 'Adjustment (out)')], max_length=20),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.8 on 2026-10-17 00:41
+
+from django.db import migrations
+from django.db.models import Max
+
+
+def seed_checkpoint(apps, schema_editor):
+    # Rollups were kept current inside each sale until now; folding starts
+    # after the events they already count.
+    InventoryEvent = apps.get_model("sweets", "InventoryEvent")
+    LedgerCheckpoint = apps.get_model("sweets", "LedgerCheckpoint")
+    last = InventoryEvent.objects.aggregate(last=Max("id"))["last"] or 0
+    LedgerCheckpoint.objects.update_or_create(name="rollups", defaults={"last_event_id": last})
+
+
+def drop_checkpoint(apps, schema_editor):
+    apps.get_model("sweets", "LedgerCheckpoint").objects.filter(name="rollups").delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sweets', '0008_stock_reconciliation'),
+    ]
+
+    operations = [
+        migrations.RunPython(seed_checkpoint, drop_checkpoint),
+    ]
@@ -1,7 +1,17 @@
 """Inventory domain models for sweets and their stock events."""
 
+import random
+from datetime import timedelta, timezone as dt_timezone
+
 from django.conf import settings
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Case, F, OuterRef, Q, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .cache import bump_catalogue_version
+from .ledger import get_writer
+from .stream import publish_stock
 
 
 class Category(models.TextChoices):
@@ -27,26 +37,162 @@ class Sweet(models.Model):
     category = models.CharField(
         max_length=50, choices=Category.choices, default=Category.OTHER
     )
+    # 0 = stock lives in quantity_in_stock. N > 0 = stock is striped across N
+    # StockShard rows and quantity_in_stock is only a catalogue snapshot.
+    shard_count = models.PositiveSmallIntegerField(default=0)
+
+    # Shards tried at random before locking them all to gather scattered units.
+    shard_probes = 3
+    max_shards = 64
 
     def __str__(self) -> str:
         return self.name
 
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        bump_catalogue_version(using=self._state.db)
+
+    def delete(self, *args, **kwargs):
+        result = super().delete(*args, **kwargs)
+        bump_catalogue_version(using=self._state.db)
+        return result
+
+    def record_stock_set(self, previous=None, user=None) -> None:
+        """Log stock set directly: opening stock on create, else the edit's delta.
+
+        ``previous`` is the stock before an edit (``None`` for a new sweet).
+        Call it inside the transaction that saved the new value.
+        """
+        if previous is None:
+            event_type, quantity = InventoryEvent.EventType.OPENING, self.quantity_in_stock
+        elif self.quantity_in_stock >= previous:
+            event_type, quantity = InventoryEvent.EventType.ADJUSTMENT_IN, self.quantity_in_stock - previous
+        else:
+            event_type, quantity = InventoryEvent.EventType.ADJUSTMENT_OUT, previous - self.quantity_in_stock
+        if quantity:
+            record_events([
+                InventoryEvent(sweet=self, event_type=event_type, quantity=quantity, performed_by=user)
+            ])
+
     def purchase(self, quantity: int, user=None) -> None:
-        """Decrease stock for a customer purchase and create an audit log."""
+        """Decrease stock for a customer purchase and create an audit log.
+
+        The stock check and decrement happen in a single conditional UPDATE so
+        concurrent buyers can never oversell or lose each other's writes. Units
+        held by unexpired reservations are not for sale. Sharded sweets take
+        the units from one of their stock shards instead (see ``rebalance``).
+        """
 
         if quantity <= 0:
             raise ValueError("Quantity must be positive.")
-        if quantity > self.quantity_in_stock:
-            raise ValueError("Insufficient stock for the requested purchase.")
 
-        self.quantity_in_stock -= quantity
-        InventoryEvent.objects.create(
-            sweet=self,
-            event_type=InventoryEvent.EventType.PURCHASE,
-            quantity=quantity,
-            performed_by=user,
-        )
-        self.save(update_fields=["quantity_in_stock", "updated_at"])
+        with transaction.atomic():
+            if self.shard_count:
+                self.quantity_in_stock = self._take_from_shards(quantity)
+            else:
+                updated = Sweet.objects.filter(
+                    pk=self.pk, shard_count=0, quantity_in_stock__gte=quantity + held_units()
+                ).update(
+                    quantity_in_stock=F("quantity_in_stock") - quantity,
+                    updated_at=timezone.now(),
+                )
+                if not updated:
+                    # Sharded since this instance was loaded: the column is only a
+                    # snapshot now, and the shards hold the units.
+                    self.shard_count = Sweet.objects.values_list("shard_count", flat=True).get(pk=self.pk)
+                    if not self.shard_count:
+                        raise ValueError("Insufficient stock for the requested purchase.")
+                    self.quantity_in_stock = self._take_from_shards(quantity)
+            record_events([
+                InventoryEvent(
+                    sweet=self,
+                    event_type=InventoryEvent.EventType.PURCHASE,
+                    quantity=quantity,
+                    performed_by=user,
+                )
+            ])
+            bump_catalogue_version()
+            if not self.shard_count:
+                # Reading back inside the transaction returns exactly the value our
+                # own UPDATE produced, since competing writers wait on the row.
+                self.refresh_from_db(fields=["quantity_in_stock", "updated_at"])
+            publish_stock({self.pk: self.quantity_in_stock})
+
+    @classmethod
+    def checkout(cls, quantities: dict[int, int], user=None) -> list["Sweet"]:
+        """Purchase several sweets all-or-nothing with a constant number of queries.
+
+        ``quantities`` maps sweet ids to the units requested. Every line is
+        decremented by one conditional UPDATE; if any line lacks stock the whole
+        transaction rolls back and nothing is sold.
+        """
+
+        if not quantities:
+            raise ValueError("At least one line item is required.")
+        if any(quantity <= 0 for quantity in quantities.values()):
+            raise ValueError("Quantity must be positive.")
+
+        with transaction.atomic():
+            sweets = cls.objects.in_bulk(list(quantities))
+            missing = sorted(set(quantities) - set(sweets))
+            if missing:
+                raise ValueError(f"Unknown sweet id(s): {', '.join(map(str, missing))}.")
+            # Sharded lines are taken from their shards; the rest share one UPDATE.
+            sharded = {
+                pk: sweets[pk]._take_from_shards(quantity)
+                for pk, quantity in quantities.items()
+                if sweets[pk].shard_count
+            }
+            lines = {pk: quantity for pk, quantity in quantities.items() if pk not in sharded}
+            short = sorted(
+                sweets[pk].name
+                for pk, quantity in lines.items()
+                if sweets[pk].quantity_in_stock < quantity
+            )
+            if short:
+                raise ValueError(f"Insufficient stock for: {', '.join(short)}.")
+
+            if lines:
+                in_stock = Q()
+                for pk, quantity in lines.items():
+                    in_stock |= Q(pk=pk, shard_count=0, quantity_in_stock__gte=quantity + held_units())
+                delta = Case(
+                    *(When(pk=pk, then=Value(quantity)) for pk, quantity in lines.items()),
+                    output_field=models.PositiveIntegerField(),
+                )
+                updated = cls.objects.filter(in_stock).update(
+                    quantity_in_stock=F("quantity_in_stock") - delta,
+                    updated_at=timezone.now(),
+                )
+                if updated != len(lines):
+                    # Lines sharded by a rebalance since the snapshot above sell
+                    # from their shards instead.
+                    resharded = dict(
+                        cls.objects.filter(pk__in=list(lines), shard_count__gt=0).values_list("pk", "shard_count")
+                    )
+                    # A competing buyer may have drained a line after the snapshot;
+                    # the conditional UPDATE skips that row, so roll everything back.
+                    if updated + len(resharded) != len(lines):
+                        raise ValueError("Insufficient stock for the requested purchase.")
+                    for pk, shard_count in resharded.items():
+                        sweets[pk].shard_count = shard_count
+                        sharded[pk] = sweets[pk]._take_from_shards(lines[pk])
+
+            record_events([
+                InventoryEvent(
+                    sweet=sweets[pk],
+                    event_type=InventoryEvent.EventType.PURCHASE,
+                    quantity=quantity,
+                    performed_by=user,
+                )
+                for pk, quantity in quantities.items()
+            ])
+            bump_catalogue_version()
+            sweets = list(cls.objects.filter(pk__in=list(quantities)).order_by("name"))
+            for sweet in sweets:
+                sweet.quantity_in_stock = sharded.get(sweet.pk, sweet.quantity_in_stock)
+            publish_stock({sweet.pk: sweet.quantity_in_stock for sweet in sweets})
+            return sweets
 
     def restock(self, quantity: int, user=None) -> None:
         """Allow admins to add stock while logging who performed the action."""
@@ -56,28 +202,336 @@ class Sweet(models.Model):
         if quantity <= 0:
             raise ValueError("Quantity must be positive.")
 
-        self.quantity_in_stock += quantity
-        InventoryEvent.objects.create(
-            sweet=self,
-            event_type=InventoryEvent.EventType.RESTOCK,
-            quantity=quantity,
-            performed_by=user,
+        with transaction.atomic():
+            if self.shard_count:
+                self._add_to_shards(quantity)
+                # Restocks are rare, so they also refresh the catalogue snapshot.
+                Sweet.objects.filter(pk=self.pk).update(
+                    quantity_in_stock=self.shard_total(), updated_at=timezone.now()
+                )
+            else:
+                Sweet.objects.filter(pk=self.pk).update(
+                    quantity_in_stock=F("quantity_in_stock") + quantity,
+                    updated_at=timezone.now(),
+                )
+            record_events([
+                InventoryEvent(
+                    sweet=self,
+                    event_type=InventoryEvent.EventType.RESTOCK,
+                    quantity=quantity,
+                    performed_by=user,
+                )
+            ])
+            bump_catalogue_version()
+            self.refresh_from_db(fields=["quantity_in_stock", "updated_at"])
+            publish_stock({self.pk: self.quantity_in_stock})
+
+    def availability(self) -> dict:
+        """Stock, units on hold and units still for sale, read in one query."""
+        quantity_in_stock, held = (
+            Sweet.objects.filter(pk=self.pk)
+            .annotate(stock=stock_units(), held=held_units())
+            .values_list("stock", "held")
+            .get()
         )
-        self.save(update_fields=["quantity_in_stock", "updated_at"])
+        return {
+            "id": self.pk,
+            "quantity_in_stock": quantity_in_stock,
+            "held": held,
+            "available": max(quantity_in_stock - held, 0),
+        }
+
+    def reserve(self, quantity: int, user) -> "StockReservation":
+        """Hold ``quantity`` units for ``user`` until confirmed, released or expired.
+
+        Stock itself is untouched; the hold just stops others from buying the
+        units. Reserving locks the sweet row first (``SELECT ... FOR UPDATE``;
+        SQLite serialises writers anyway) so concurrent holds cannot
+        over-commit it.
+        """
+
+        if quantity <= 0:
+            raise ValueError("Quantity must be positive.")
+
+        with transaction.atomic():
+            if Sweet.objects.select_for_update().filter(pk=self.pk).values_list("shard_count", flat=True).get():
+                raise ValueError("Sharded sweets cannot be reserved.")
+            # A new statement after the lock, so holds committed meanwhile are counted.
+            if self.availability()["available"] < quantity:
+                raise ValueError("Insufficient stock for the requested reservation.")
+            ttl = getattr(settings, "SWEETS_RESERVATION_TTL_SECONDS", 600)
+            return StockReservation.objects.create(
+                sweet=self,
+                user=user,
+                quantity=quantity,
+                expires_at=timezone.now() + timedelta(seconds=ttl),
+            )
+
+    def rebalance(self, shards: int | None = None) -> None:
+        """Spread the stock evenly over ``shards`` shard rows (0 switches sharding off).
+
+        Also writes the exact total back to ``quantity_in_stock``, so running it
+        periodically keeps the catalogue snapshot of a hot sweet fresh.
+        """
+
+        shards = self.shard_count if shards is None else shards
+        if not 0 <= shards <= self.max_shards:
+            raise ValueError(f"Shard count must be between 0 and {self.max_shards}.")
+
+        with transaction.atomic():
+            sweet = Sweet.objects.select_for_update().get(pk=self.pk)
+            existing = list(StockShard.objects.select_for_update().filter(sweet_id=self.pk))
+            if shards and StockReservation.objects.filter(
+                sweet_id=self.pk, status=StockReservation.Status.ACTIVE, expires_at__gt=timezone.now()
+            ).exists():
+                raise ValueError("Confirm or release this sweet's active reservations first.")
+            total = sum(shard.quantity for shard in existing) if sweet.shard_count else sweet.quantity_in_stock
+            StockShard.objects.filter(sweet_id=self.pk).delete()
+            base, extra = divmod(total, shards) if shards else (0, 0)
+            StockShard.objects.bulk_create(
+                StockShard(sweet_id=self.pk, index=index, quantity=base + (index < extra))
+                for index in range(shards)
+            )
+            Sweet.objects.filter(pk=self.pk).update(
+                shard_count=shards, quantity_in_stock=total, updated_at=timezone.now()
+            )
+            bump_catalogue_version()
+            self.refresh_from_db(fields=["shard_count", "quantity_in_stock", "updated_at"])
+            publish_stock({self.pk: total})
+
+    def shard_total(self) -> int:
+        return StockShard.objects.filter(sweet_id=self.pk).aggregate(
+            total=Coalesce(Sum("quantity"), 0)
+        )["total"]
+
+    def _take_from_shards(self, quantity: int) -> int:
+        """Remove ``quantity`` units from the shards; returns the stock left.
+
+        A few random shards are tried with the usual conditional UPDATE, so
+        concurrent buyers mostly land on different rows. When none of them can
+        cover the purchase alone, every shard is locked in index order and the
+        units are gathered from several of them.
+        """
+        indexes = random.sample(range(self.shard_count), min(self.shard_probes, self.shard_count))
+        for index in indexes:
+            if StockShard.objects.filter(
+                sweet_id=self.pk, index=index, quantity__gte=quantity
+            ).update(quantity=F("quantity") - quantity):
+                return self.shard_total()
+
+        shards = list(StockShard.objects.select_for_update().filter(sweet_id=self.pk).order_by("index"))
+        if sum(shard.quantity for shard in shards) < quantity:
+            raise ValueError("Insufficient stock for the requested purchase.")
+        takes, remaining = {}, quantity
+        for shard in sorted(shards, key=lambda shard: -shard.quantity):
+            takes[shard.pk] = min(shard.quantity, remaining)
+            remaining -= takes[shard.pk]
+            if not remaining:
+                break
+        StockShard.objects.filter(pk__in=list(takes)).update(
+            quantity=F("quantity") - Case(
+                *(When(pk=pk, then=Value(take)) for pk, take in takes.items()),
+                output_field=models.PositiveIntegerField(),
+            )
+        )
+        return self.shard_total()
+
+    def _add_to_shards(self, quantity: int) -> None:
+        base, extra = divmod(quantity, self.shard_count)
+        StockShard.objects.filter(sweet_id=self.pk).update(
+            quantity=F("quantity") + Case(
+                When(index__lt=extra, then=Value(base + 1)),
+                default=Value(base),
+                output_field=models.PositiveIntegerField(),
+            )
+        )
+
+
+def stock_units():
+    """Exact stock of the outer ``Sweet`` row: its shard total when sharded."""
+    total = (
+        StockShard.objects.filter(sweet=OuterRef("pk"))
+        .order_by()
+        .values("sweet")
+        .annotate(total=Sum("quantity"))
+        .values("total")
+    )
+    return Case(
+        When(shard_count=0, then=F("quantity_in_stock")),
+        default=Coalesce(Subquery(total), 0),
+        output_field=models.PositiveIntegerField(),
+    )
+
+
+def held_units():
+    """Units held by unexpired reservations of the outer ``Sweet`` row.
+
+    A correlated ``SUM`` served by the partial ``(sweet, expires_at)`` index on
+    active reservations. Expired holds stop counting at once, whether or not
+    the sweeper has visited them yet.
+    """
+    held = (
+        StockReservation.objects.filter(
+            sweet=OuterRef("pk"),
+            status=StockReservation.Status.ACTIVE,
+            expires_at__gt=timezone.now(),
+        )
+        .order_by()
+        .values("sweet")
+        .annotate(total=Sum("quantity"))
+        .values("total")
+    )
+    return Coalesce(Subquery(held), 0, output_field=models.PositiveIntegerField())
+
+
+class StockShard(models.Model):
+    """One stripe of a sharded sweet's stock (see ``Sweet.rebalance``)."""
+
+    sweet = models.ForeignKey(Sweet, related_name="stock_shards", on_delete=models.CASCADE)
+    index = models.PositiveSmallIntegerField()
+    quantity = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["sweet", "index"], name="sweets_stockshard_unique_index"),
+        ]
+
+    def __str__(self):
+        return f"Shard {self.index} of sweet {self.sweet_id}: {self.quantity}"
+
+
+class StockReservation(models.Model):
+    """A timed hold on stock that a checkout confirms (sells) or releases."""
+
+    class Status(models.TextChoices):
+        ACTIVE = "active", "Active"
+        CONFIRMED = "confirmed", "Confirmed"
+        RELEASED = "released", "Released"
+        EXPIRED = "expired", "Expired"
+
+    sweet = models.ForeignKey(Sweet, related_name="reservations", on_delete=models.CASCADE)
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="stock_reservations",
+    )
+    quantity = models.PositiveIntegerField()
+    status = models.CharField(max_length=20, choices=Status.choices, default=Status.ACTIVE)
+    expires_at = models.DateTimeField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ["-id"]
+        indexes = [
+            # Only active holds are ever aggregated or swept, so keep the rest out.
+            models.Index(
+                fields=["sweet", "expires_at"],
+                condition=Q(status="active"),
+                name="sweets_resv_active_sweet_idx",
+            ),
+            models.Index(
+                fields=["expires_at"],
+                condition=Q(status="active"),
+                name="sweets_resv_active_expiry_idx",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.quantity} of sweet {self.sweet_id} ({self.status})"
+
+    def confirm(self, user=None) -> None:
+        """Sell the held units: decrement stock and log a purchase event."""
+
+        now = timezone.now()
+        with transaction.atomic():
+            claimed = StockReservation.objects.filter(
+                pk=self.pk, status=self.Status.ACTIVE, expires_at__gt=now
+            ).update(status=self.Status.CONFIRMED, updated_at=now)
+            if not claimed:
+                raise ValueError("Reservation has expired or is no longer active.")
+            # The hold guaranteed these units, so only the raw stock is checked.
+            updated = Sweet.objects.filter(
+                pk=self.sweet_id, quantity_in_stock__gte=self.quantity
+            ).update(
+                quantity_in_stock=F("quantity_in_stock") - self.quantity,
+                updated_at=now,
+            )
+            if not updated:
+                raise ValueError("Insufficient stock to confirm the reservation.")
+            record_events([
+                InventoryEvent(
+                    sweet_id=self.sweet_id,
+                    event_type=InventoryEvent.EventType.PURCHASE,
+                    quantity=self.quantity,
+                    performed_by=user,
+                )
+            ])
+            bump_catalogue_version()
+            publish_stock(
+                {self.sweet_id: Sweet.objects.values_list("quantity_in_stock", flat=True).get(pk=self.sweet_id)}
+            )
+            self.status, self.updated_at = self.Status.CONFIRMED, now
+
+    def release(self) -> None:
+        """Give the held units back before the hold expires."""
+
+        now = timezone.now()
+        released = StockReservation.objects.filter(
+            pk=self.pk, status=self.Status.ACTIVE, expires_at__gt=now
+        ).update(status=self.Status.RELEASED, updated_at=now)
+        if not released:
+            raise ValueError("Reservation has expired or is no longer active.")
+        self.status, self.updated_at = self.Status.RELEASED, now
+
+    @classmethod
+    def expire_stale(cls, *, batch_size: int = 1000, now=None) -> int:
+        """Mark lapsed holds expired in batched UPDATEs; returns how many.
+
+        Purely housekeeping: lapsed holds already stopped counting against
+        stock. ``skip_locked`` lets several sweepers share the work on
+        databases that support it.
+        """
+
+        if batch_size <= 0:
+            raise ValueError("Batch size must be positive.")
+        now = now or timezone.now()
+        expired = 0
+        while True:
+            with transaction.atomic():
+                batch = list(
+                    cls.objects.select_for_update(skip_locked=True)
+                    .filter(status=cls.Status.ACTIVE, expires_at__lte=now)
+                    .order_by()
+                    .values_list("pk", flat=True)[:batch_size]
+                )
+                if not batch:
+                    return expired
+                expired += cls.objects.filter(pk__in=batch, status=cls.Status.ACTIVE).update(
+                    status=cls.Status.EXPIRED, updated_at=now
+                )
 
 
 class InventoryEvent(models.Model):
     """Immutable ledger capturing every inventory-changing action."""
 
     class EventType(models.TextChoices):
-        """Categorizes whether an event represents a purchase or restock."""
+        """Categorizes what changed stock: a sale, a restock or a direct stock edit."""
         PURCHASE = "purchase", "Purchase"
         RESTOCK = "restock", "Restock"
+        OPENING = "opening", "Opening stock"
+        ADJUSTMENT_IN = "adjustment_in", "Adjustment (in)"
+        ADJUSTMENT_OUT = "adjustment_out", "Adjustment (out)"
+
+    # Event types that add units to stock; every other type removes them.
+    inbound = (EventType.RESTOCK, EventType.OPENING, EventType.ADJUSTMENT_IN)
 
     sweet = models.ForeignKey(
         Sweet,
         related_name="inventory_events",
         on_delete=models.CASCADE,
+        # Covered by the leading column of sweets_event_sweet_time_idx.
+        db_index=False,
     )
     event_type = models.CharField(max_length=20, choices=EventType.choices)
     quantity = models.PositiveIntegerField()
@@ -88,11 +542,240 @@ class InventoryEvent(models.Model):
         blank=True,
         related_name="inventory_events",
     )
-    occurred_at = models.DateTimeField(auto_now_add=True)
+    # Stamped when the event is built, so rows written behind keep their real time.
+    occurred_at = models.DateTimeField(default=timezone.now, editable=False)
     updated_at = models.DateTimeField(auto_now=True)
+    # Set on write-behind rows so a replayed spool never inserts them twice.
+    ledger_key = models.UUIDField(null=True, blank=True, unique=True, editable=False)
 
     class Meta:
-        ordering = ["-occurred_at"]
+        ordering = ["-occurred_at", "-id"]
+        indexes = [
+            # Ledger reads seek on (occurred_at, id), overall or for one sweet;
+            # archival range-scans whole days through the same indexes.
+            models.Index(fields=["sweet", "occurred_at", "id"], name="sweets_event_sweet_time_idx"),
+            models.Index(fields=["occurred_at", "id"], name="sweets_event_time_idx"),
+        ]
 
     def __str__(self):
-        return f"{self.get_event_type_display()} {self.quantity} of {self.sweet.name}"
\ No newline at end of file
+        return f"{self.get_event_type_display()} {self.quantity} of {self.sweet.name}"
+
+    @classmethod
+    def signed_quantity(cls):
+        """``quantity`` signed by its effect on stock; works on daily summaries too."""
+        return Case(
+            When(event_type__in=cls.inbound, then=F("quantity")),
+            default=F("quantity") * -1,
+            output_field=models.BigIntegerField(),
+        )
+
+
+class InventoryDailySummary(models.Model):
+    """Per-sweet, per-day totals of ledger events moved out by ``archive_inventory_events``."""
+
+    sweet = models.ForeignKey(
+        Sweet,
+        related_name="daily_summaries",
+        on_delete=models.CASCADE,
+        # Covered by the leading column of sweets_daily_summary_unique_day.
+        db_index=False,
+    )
+    day = models.DateField()
+    event_type = models.CharField(max_length=20, choices=InventoryEvent.EventType.choices)
+    quantity = models.PositiveBigIntegerField(default=0)
+    events = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        ordering = ["-day", "sweet_id", "event_type"]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["sweet", "day", "event_type"], name="sweets_daily_summary_unique_day"
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.events} {self.event_type} event(s) of sweet {self.sweet_id} on {self.day}"
+
+
+class InventoryRollup(models.Model):
+    """Purchase and restock totals of one hour or day, for one sweet or one category.
+
+    Sweet rows have ``sweet`` set and a blank ``category``; category rows have
+    no sweet. Buckets start on UTC hour/day boundaries. ``sweets.rollups.fold``
+    keeps them current from the ledger, outside the transactions that sell.
+    """
+
+    class Granularity(models.TextChoices):
+        HOUR = "hour", "Hour"
+        DAY = "day", "Day"
+
+    granularity = models.CharField(max_length=4, choices=Granularity.choices)
+    bucket = models.DateTimeField()
+    sweet = models.ForeignKey(
+        Sweet,
+        null=True,
+        blank=True,
+        related_name="rollups",
+        on_delete=models.CASCADE,
+        # Covered by the leading column of sweets_rollup_sweet_bucket.
+        db_index=False,
+    )
+    category = models.CharField(max_length=50, choices=Category.choices, blank=True)
+    purchased_units = models.PositiveBigIntegerField(default=0)
+    purchases = models.PositiveIntegerField(default=0)
+    restocked_units = models.PositiveBigIntegerField(default=0)
+    restocks = models.PositiveIntegerField(default=0)
+
+    # Layout of the per-row deltas built by add_totals.
+    counter_fields = ("purchased_units", "purchases", "restocked_units", "restocks")
+    # Opening stock and adjustments are not sales or restocks, so they are not rolled up.
+    event_types = ("purchase", "restock")
+    # Keeps each UPDATE's OR/CASE well below SQLite's expression depth limit.
+    keys_per_update = 100
+
+    class Meta:
+        ordering = ["bucket"]
+        constraints = [
+            # One row per bucket and sweet, and per bucket and category; each
+            # also serves the analytics range scan for its kind of row.
+            models.UniqueConstraint(
+                fields=["sweet", "granularity", "bucket"],
+                condition=Q(sweet__isnull=False),
+                name="sweets_rollup_sweet_bucket",
+            ),
+            models.UniqueConstraint(
+                fields=["category", "granularity", "bucket"],
+                condition=Q(sweet__isnull=True),
+                name="sweets_rollup_category_bucket",
+            ),
+        ]
+
+    def __str__(self):
+        subject = f"sweet {self.sweet_id}" if self.sweet_id else self.category
+        return f"{self.granularity} {self.bucket:%Y-%m-%d %H:00} of {subject}"
+
+    @staticmethod
+    def buckets(moment):
+        """``[(granularity, bucket start)]`` containing ``moment``."""
+        hour = moment.astimezone(dt_timezone.utc).replace(minute=0, second=0, microsecond=0)
+        return [
+            (InventoryRollup.Granularity.HOUR, hour),
+            (InventoryRollup.Granularity.DAY, hour.replace(hour=0)),
+        ]
+
+    @classmethod
+    def add_totals(cls, totals) -> None:
+        """Add per-hour ledger totals to their sweet and category buckets.
+
+        ``totals`` holds ``(sweet_id, category, event_type, hour, units, events)``
+        rows. One ``UPDATE ... SET units = units + CASE ...`` covers up to
+        ``keys_per_update`` touched rows. Buckets seen for the first time are
+        inserted at zero (ignoring ones another fold just created) and
+        incremented again.
+        """
+        deltas = {}
+        for sweet_id, category, event_type, hour, units, events in totals:
+            column = 0 if event_type == InventoryEvent.EventType.PURCHASE else 2
+            for granularity, bucket in cls.buckets(hour):
+                for key in ((granularity, bucket, sweet_id, ""), (granularity, bucket, None, category)):
+                    delta = deltas.setdefault(key, [0, 0, 0, 0])
+                    delta[column] += units
+                    delta[column + 1] += events
+        keys = list(deltas)
+        for offset in range(0, len(keys), cls.keys_per_update):
+            chunk = {key: deltas[key] for key in keys[offset:offset + cls.keys_per_update]}
+            if cls._increment(chunk) == len(chunk):
+                continue
+            match = Q()
+            for key in chunk:
+                match |= cls._key(key)
+            existing = set(
+                cls.objects.filter(match).order_by().values_list("granularity", "bucket", "sweet_id", "category")
+            )
+            missing = {key: delta for key, delta in chunk.items() if key not in existing}
+            cls.objects.bulk_create(
+                [
+                    cls(granularity=granularity, bucket=bucket, sweet_id=sweet_id, category=category)
+                    for granularity, bucket, sweet_id, category in missing
+                ],
+                ignore_conflicts=True,
+            )
+            cls._increment(missing)
+
+    @classmethod
+    def _increment(cls, deltas) -> int:
+        match = Q()
+        for key in deltas:
+            match |= cls._key(key)
+        changes = {}
+        for index, column in enumerate(cls.counter_fields):
+            whens = [
+                When(cls._key(key), then=Value(delta[index]))
+                for key, delta in deltas.items()
+                if delta[index]
+            ]
+            if whens:
+                changes[column] = F(column) + Case(
+                    *whens, default=Value(0), output_field=models.PositiveBigIntegerField()
+                )
+        return cls.objects.filter(match).update(**changes)
+
+    @staticmethod
+    def _key(key) -> Q:
+        granularity, bucket, sweet_id, category = key
+        if sweet_id is not None:
+            return Q(granularity=granularity, bucket=bucket, sweet_id=sweet_id)
+        return Q(granularity=granularity, bucket=bucket, sweet__isnull=True, category=category)
+
+
+def record_events(events) -> None:
+    """Insert ledger rows now, or spool them for the write-behind writer to insert after commit."""
+    writer = get_writer()
+    if writer is None:
+        InventoryEvent.objects.bulk_create(events)
+        return
+    # Spooled before the sale commits, so no crash can lose a sold event.
+    transaction.on_commit(writer.spool([writer.row(event) for event in events]))
+
+
+class ReconciledStock(models.Model):
+    """A sweet's ledger total up to ``LedgerCheckpoint.last_event_id`` (see ``reconcile_stock``)."""
+
+    sweet = models.OneToOneField(
+        Sweet, primary_key=True, related_name="reconciled_stock", on_delete=models.CASCADE
+    )
+    ledger_total = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Sweet {self.sweet_id}: {self.ledger_total} by the ledger"
+
+
+class LedgerCheckpoint(models.Model):
+    """The last ledger event a named incremental job has processed."""
+
+    name = models.CharField(max_length=50, unique=True)
+    last_event_id = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name} at event {self.last_event_id}"
+
+
+class SweetSearchIndex(models.Model):
+    """Read-only mapping of the SQLite FTS5 index (see ``sweets.search``) for JOINs."""
+
+    sweet = models.OneToOneField(
+        Sweet,
+        primary_key=True,
+        db_column="rowid",
+        db_constraint=False,
+        on_delete=models.DO_NOTHING,
+        related_name="search_index",
+    )
+    name = models.TextField()
+    description = models.TextField()
+
+    class Meta:
+        managed = False
+        db_table = "sweets_sweet_fts"
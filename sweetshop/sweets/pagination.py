@@ -0,0 +1,178 @@
+"""Keyset (seek) pagination so page cost stays flat however deep a client scrolls."""
+
+import base64
+import binascii
+import json
+
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.filters import OrderingFilter
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """Paginate on an ordered, unique key tuple instead of OFFSET/COUNT.
+
+    Each cursor encodes the key values of the row at the page edge, so the
+    next page is ``WHERE (name, id) > (:name, :id) ORDER BY name, id LIMIT n``
+    and is served straight off the index. No ``COUNT(*)`` is ever issued.
+    The final ordering field must be unique (``id`` by default) so ties on the
+    earlier fields are broken deterministically.
+    """
+
+    ordering = ("name", "id")
+    page_size = 50
+    max_page_size = 200
+    page_size_query_param = "page_size"
+    cursor_query_param = "cursor"
+    invalid_cursor_message = "Invalid cursor"
+
+    def paginate_queryset(self, queryset, request, view=None):
+        return self.build_page(list(self.get_page_queryset(queryset, request, view)))
+
+    def get_page_queryset(self, queryset, request, view=None):
+        """Return the sliced queryset for the requested page without evaluating it.
+
+        Split from :meth:`build_page` so callers can fetch rows however they like
+        (e.g. with ``.values()`` or the async ORM) and hand them back afterwards.
+        """
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.key_fields = self.get_ordering(request, queryset, view)
+        self.cursor_key, self.reverse = self.decode_cursor(request)
+
+        ordering = self.key_fields
+        if self.reverse:
+            ordering = tuple(self._flip(field) for field in ordering)
+        queryset = queryset.order_by(*ordering)
+        if self.cursor_key is not None:
+            queryset = queryset.filter(self._seek(self.cursor_key))
+        # One extra row tells us whether another page exists without counting.
+        return queryset[: self.page_size + 1]
+
+    def build_page(self, rows):
+        has_more = len(rows) > self.page_size
+        rows = list(rows[: self.page_size])
+        if self.reverse:
+            rows.reverse()
+            self.has_previous, self.has_next = has_more, True
+        else:
+            self.has_previous, self.has_next = self.cursor_key is not None, has_more
+        self.page = rows
+        return rows
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return min(max(size, 1), self.max_page_size)
+
+    def get_ordering(self, request, queryset, view):
+        """Honour ``?ordering=`` from ``OrderingFilter`` while keeping a unique tail."""
+        for backend in getattr(view, "filter_backends", ()):
+            if issubclass(backend, OrderingFilter):
+                requested = backend().get_ordering(request, queryset, view)
+                if requested:
+                    requested = tuple(requested)
+                    tail = self.ordering[-1]
+                    if tail.lstrip("-") not in {field.lstrip("-") for field in requested}:
+                        requested += (tail,)
+                    return requested
+        return tuple(getattr(view, "keyset_ordering", None) or self.ordering)
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None, False
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(encoded.encode("ascii")))
+            key, reverse = payload["k"], bool(payload.get("r"))
+        except (binascii.Error, UnicodeEncodeError, ValueError, KeyError, TypeError):
+            raise NotFound(self.invalid_cursor_message) from None
+        if not isinstance(key, list) or len(key) != len(self.key_fields):
+            raise NotFound(self.invalid_cursor_message)
+        return key, reverse
+
+    def encode_cursor(self, row, reverse):
+        key = [self._value(row, field.lstrip("-")) for field in self.key_fields]
+        payload = json.dumps({"k": key, "r": int(reverse)}, default=str, separators=(",", ":"))
+        encoded = base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii")
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, encoded)
+
+    def get_next_link(self):
+        if not (self.has_next and self.page):
+            return None
+        return self.encode_cursor(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.page:
+            return remove_query_param(self.request.build_absolute_uri(), self.cursor_query_param)
+        return self.encode_cursor(self.page[0], reverse=True)
+
+    def get_paginated_response(self, data):
+        return Response(
+            {
+                "next": self.get_next_link(),
+                "previous": self.get_previous_link(),
+                "results": data,
+            }
+        )
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            "type": "object",
+            "required": ["results"],
+            "properties": {
+                "next": {"type": "string", "nullable": True, "format": "uri"},
+                "previous": {"type": "string", "nullable": True, "format": "uri"},
+                "results": schema,
+            },
+        }
+
+    def get_schema_operation_parameters(self, view):
+        return [
+            {
+                "name": self.cursor_query_param,
+                "required": False,
+                "in": "query",
+                "description": "Opaque keyset cursor from a previous page's next/previous link.",
+                "schema": {"type": "string"},
+            },
+            {
+                "name": self.page_size_query_param,
+                "required": False,
+                "in": "query",
+                "description": f"Rows per page (max {self.max_page_size}).",
+                "schema": {"type": "integer"},
+            },
+        ]
+
+    def _seek(self, key):
+        # Expand (a, b, c) > (x, y, z) into a > x OR (a = x AND (b > y OR ...)).
+        condition = None
+        for field, value in reversed(list(zip(self.key_fields, key))):
+            name = field.lstrip("-")
+            strict = Q(**{f"{name}__{self._direction(field)}": value})
+            condition = strict if condition is None else strict | (Q(**{name: value}) & condition)
+        # The redundant a >= x bound lets the planner seek into the index
+        # instead of scanning from its start and discarding rows.
+        leading = self.key_fields[0]
+        bound = Q(**{f"{leading.lstrip('-')}__{self._direction(leading)}e": key[0]})
+        return bound & condition
+
+    def _direction(self, field):
+        return "lt" if field.startswith("-") != self.reverse else "gt"
+
+    @staticmethod
+    def _flip(field):
+        return field[1:] if field.startswith("-") else f"-{field}"
+
+    @staticmethod
+    def _value(row, field):
+        return row[field] if isinstance(row, dict) else getattr(row, field)
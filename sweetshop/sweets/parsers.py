@@ -0,0 +1,28 @@
+"""Streaming request parsers for bulk inventory uploads."""
+
+import codecs
+
+from django.conf import settings
+from rest_framework.parsers import BaseParser
+
+from .importers import read_csv_rows, read_json_rows
+
+
+class CSVParser(BaseParser):
+    """Parse ``text/csv`` bodies lazily into row dicts keyed by the header."""
+
+    media_type = "text/csv"
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        encoding = (parser_context or {}).get("encoding", settings.DEFAULT_CHARSET)
+        return read_csv_rows(codecs.getreader(encoding)(stream))
+
+
+class NDJSONParser(BaseParser):
+    """Parse newline-delimited JSON bodies one record at a time."""
+
+    media_type = "application/x-ndjson"
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        encoding = (parser_context or {}).get("encoding", settings.DEFAULT_CHARSET)
+        return read_json_rows(codecs.getreader(encoding)(stream))
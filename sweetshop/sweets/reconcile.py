@@ -0,0 +1,118 @@
+"""Expected stock rebuilt from the inventory ledger, compared with ``quantity_in_stock``.
+
+A sweet's expected stock is the signed sum of its ledger: opening stock,
+restocks and adjustments in, minus purchases and adjustments out, plus the
+daily summaries of archived days.
+
+:func:`~sweets.ledger.stock_drift` computes that for every sweet in one
+query. :func:`incremental_drift` keeps each sweet's total up to a checkpointed event
+id in ``ReconciledStock`` and only aggregates the events after it, so a
+nightly run reads the day's new events rather than the whole ledger.
+"""
+
+from django.db import transaction
+from django.db.models import Count, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .cache import bump_catalogue_version
+from .ledger import ledger_net, settled_event_id, stock_drift
+from .models import (
+    InventoryDailySummary,
+    InventoryEvent,
+    LedgerCheckpoint,
+    ReconciledStock,
+    Sweet,
+    record_events,
+)
+from .stream import publish_stock
+
+CHECKPOINT = "reconcile_stock"
+
+
+def incremental_drift(now=None) -> tuple[dict, int]:
+    """Fold new events into ``ReconciledStock``, then compare; returns ``(drift, events scanned)``.
+
+    The first run seeds the totals from the whole ledger and the archived
+    summaries. Later runs aggregate only events past the checkpoint, one
+    grouped query over a primary-key range.
+    """
+    now = now or timezone.now()
+    with transaction.atomic():
+        checkpoint, seeding = LedgerCheckpoint.objects.select_for_update().get_or_create(name=CHECKPOINT)
+        upto = max(settled_event_id(now), checkpoint.last_event_id)
+        deltas = {}
+        scanned = 0
+        new_events = (
+            InventoryEvent.objects.filter(id__gt=checkpoint.last_event_id, id__lte=upto)
+            .order_by()
+            .values("sweet_id")
+            .annotate(net=Sum(InventoryEvent.signed_quantity()), events=Count("id"))
+        )
+        for row in new_events:
+            deltas[row["sweet_id"]] = row["net"]
+            scanned += row["events"]
+        if seeding:
+            archived = (
+                InventoryDailySummary.objects.order_by()
+                .values("sweet_id")
+                .annotate(net=Sum(InventoryEvent.signed_quantity()))
+            )
+            for row in archived:
+                deltas[row["sweet_id"]] = deltas.get(row["sweet_id"], 0) + row["net"]
+
+        totals = ReconciledStock.objects.in_bulk(list(deltas))
+        for total in totals.values():
+            total.ledger_total += deltas[total.pk]
+            total.updated_at = now
+        ReconciledStock.objects.bulk_update(totals.values(), ["ledger_total", "updated_at"])
+        ReconciledStock.objects.bulk_create(
+            ReconciledStock(sweet_id=pk, ledger_total=net) for pk, net in deltas.items() if pk not in totals
+        )
+        checkpoint.last_event_id = upto
+        checkpoint.save(update_fields=["last_event_id", "updated_at"])
+
+    reconciled = ReconciledStock.objects.filter(sweet=OuterRef("pk")).values("ledger_total")
+    # Events that arrived after the checkpoint still count towards today's stock.
+    expected = Coalesce(Subquery(reconciled), 0) + ledger_net(InventoryEvent, id__gt=upto)
+    return stock_drift(expected, drifting=True, settled=True, now=now), scanned
+
+
+def repair_stock(drift) -> list:
+    """Set ``quantity_in_stock`` to the ledger's value; returns the repaired ids.
+
+    Each row is only rewritten if it still holds the stock that was compared,
+    so a sale that lands meanwhile is never overwritten. Sharded sweets and
+    negative ledger totals need a person and are skipped.
+    """
+    repaired = {}
+    with transaction.atomic():
+        for pk, (stock, expected) in drift.items():
+            if expected < 0:
+                continue
+            if Sweet.objects.filter(pk=pk, shard_count=0, quantity_in_stock=stock).update(
+                quantity_in_stock=expected, updated_at=timezone.now()
+            ):
+                repaired[pk] = expected
+        if repaired:
+            bump_catalogue_version()
+            publish_stock(repaired)
+    return sorted(repaired)
+
+
+def repair_ledger(drift, user=None) -> list:
+    """Log adjustment events so the ledger explains current stock; returns the ids."""
+    events = [
+        InventoryEvent(
+            sweet_id=pk,
+            event_type=(
+                InventoryEvent.EventType.ADJUSTMENT_IN if stock > expected else InventoryEvent.EventType.ADJUSTMENT_OUT
+            ),
+            quantity=abs(stock - expected),
+            performed_by=user,
+        )
+        for pk, (stock, expected) in drift.items()
+    ]
+    with transaction.atomic():
+        record_events(events)
+    return sorted(drift)
@@ -0,0 +1,24 @@
+"""Response renderers beyond DRF's JSON/browsable API defaults."""
+
+from rest_framework.renderers import JSONRenderer
+
+
+class EventStreamRenderer(JSONRenderer):
+    """Let ``Accept: text/event-stream`` negotiate; error bodies are still JSON."""
+
+    media_type = "text/event-stream"
+    format = "sse"
+
+
+class CSVRenderer(JSONRenderer):
+    """Let ``?format=csv`` / ``Accept: text/csv`` negotiate a streamed export."""
+
+    media_type = "text/csv"
+    format = "csv"
+
+
+class NDJSONRenderer(JSONRenderer):
+    """Let ``?format=ndjson`` / ``Accept: application/x-ndjson`` negotiate a streamed export."""
+
+    media_type = "application/x-ndjson"
+    format = "ndjson"
@@ -0,0 +1,210 @@
+"""Keep ``InventoryRollup`` rows current from the ledger, and rebuild them.
+
+Sales never touch the rollups. :func:`fold` adds the events past the
+``rollups`` checkpoint to their hour and day buckets, one grouped query and
+one ``UPDATE`` per batch of ids, then advances the checkpoint. Analytics
+reads, the archiver and ``rebuild_rollups --incremental`` call it, so the
+rollups trail the ledger by ``ledger.SETTLE_SECONDS`` at most when read.
+
+:func:`rebuild` recomputes them after a backfill, a bug fix or a restore. The
+ledger's time span is cut into chunks of whole UTC days. Each chunk's events
+are aggregated by sweet and hour in the database, then one short transaction
+swaps the chunk's old rollups for the new rows. Chunks run on a thread pool,
+one database connection per worker.
+
+Days already archived by ``archive_inventory_events`` only have daily totals
+left. Their day rows are rebuilt from ``InventoryDailySummary`` and their hour
+rows are kept as they are.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, time, timedelta, timezone as dt_timezone
+
+from django.db import OperationalError, connection, transaction
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import TruncHour
+from django.utils import timezone
+
+from .ledger import settled_event_id
+from .models import InventoryDailySummary, InventoryEvent, InventoryRollup, LedgerCheckpoint, Sweet
+
+CHECKPOINT = "rollups"
+HOUR = InventoryRollup.Granularity.HOUR
+DAY = InventoryRollup.Granularity.DAY
+
+
+def fold(now=None, *, batch_size=50_000) -> int:
+    """Add settled events past the checkpoint to the rollups; returns how many."""
+    upto = settled_event_id(now)
+    if _checkpoint().last_event_id >= upto:
+        return 0
+    folded = 0
+    while True:
+        try:
+            with transaction.atomic():
+                checkpoint = _lock_checkpoint()
+                if checkpoint.last_event_id >= upto:
+                    return folded
+                stop = min(upto, checkpoint.last_event_id + batch_size)
+                totals = list(
+                    _hourly(
+                        InventoryEvent.objects.filter(id__gt=checkpoint.last_event_id, id__lte=stop), "sweet__category"
+                    ).values_list("sweet_id", "sweet__category", "event_type", "hour", "units", "events")
+                )
+                InventoryRollup.add_totals(totals)
+                checkpoint.last_event_id = stop
+                checkpoint.save(update_fields=["last_event_id", "updated_at"])
+        except OperationalError:
+            # SQLite refuses the write lock outright while another writer holds
+            # it (Postgres waits instead). The batch rolled back; that fold, or
+            # the next one, picks these events up.
+            if connection.vendor != "sqlite":
+                raise
+            return folded
+        folded += sum(row[-1] for row in totals)
+
+
+def rebuild(*, workers=4, chunk_days=7) -> tuple[int, int]:
+    """Rebuild every rollup; returns ``(rows written, days covered)``."""
+    _checkpoint()
+    with transaction.atomic():
+        # Chunks count every event up to the checkpoint, so move it to the
+        # settled tip first; folds then only add what arrives after it.
+        checkpoint = _lock_checkpoint()
+        checkpoint.last_event_id = max(checkpoint.last_event_id, settled_event_id())
+        checkpoint.save(update_fields=["last_event_id", "updated_at"])
+    span = _span()
+    if span is None:
+        InventoryRollup.objects.all().delete()
+        return 0, 0
+    first, last = span
+    chunks = []
+    day = first
+    while day <= last:
+        chunks.append((day, min(day + timedelta(days=chunk_days), last + timedelta(days=1))))
+        day = chunks[-1][1]
+    # Buckets outside the ledger's span have nothing left to count.
+    InventoryRollup.objects.exclude(
+        bucket__gte=_midnight(first), bucket__lt=_midnight(last + timedelta(days=1))
+    ).delete()
+
+    if workers <= 1:
+        written = sum(rebuild_chunk(start, stop) for start, stop in chunks)
+    else:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            written = sum(pool.map(lambda chunk: _in_thread(*chunk), chunks))
+    return written, (last - first).days + 1
+
+
+def rebuild_chunk(first_day, stop_day) -> int:
+    """Rebuild the rollups of days ``[first_day, stop_day)``; returns the rows written.
+
+    The new rows hold exactly the events up to the checkpoint. Events folded
+    while the chunk was aggregated are added inside the swap transaction,
+    which holds the checkpoint, so none is lost or counted twice.
+    """
+    start, stop = _midnight(first_day), _midnight(stop_day)
+    totals = {}
+    archived = set()
+
+    def add(granularity, bucket, sweet_id, category, event_type, units, events):
+        offset = 0 if event_type == InventoryEvent.EventType.PURCHASE else 2
+        for key in ((granularity, bucket, sweet_id, ""), (granularity, bucket, None, category)):
+            row = totals.setdefault(key, [0, 0, 0, 0])
+            row[offset] += units
+            row[offset + 1] += events
+
+    def add_events(events):
+        for row in _hourly(events.filter(occurred_at__gte=start, occurred_at__lt=stop)):
+            category = categories[row["sweet_id"]]
+            day = row["hour"].date()
+            if day not in archived:
+                add(HOUR, row["hour"], row["sweet_id"], category, row["event_type"], row["units"], row["events"])
+            add(DAY, _midnight(day), row["sweet_id"], category, row["event_type"], row["units"], row["events"])
+
+    categories = dict(Sweet.objects.values_list("pk", "category"))
+    summaries = InventoryDailySummary.objects.filter(
+        day__gte=first_day, day__lt=stop_day, event_type__in=InventoryRollup.event_types
+    ).values_list("sweet_id", "day", "event_type", "quantity", "events")
+    for sweet_id, day, event_type, quantity, events in summaries:
+        archived.add(day)
+        add(DAY, _midnight(day), sweet_id, categories[sweet_id], event_type, quantity, events)
+    counted = _checkpoint().last_event_id
+    add_events(InventoryEvent.objects.filter(id__lte=counted))
+
+    kept = Q()
+    for day in archived:
+        kept |= Q(bucket__gte=_midnight(day), bucket__lt=_midnight(day + timedelta(days=1)))
+    # Aggregation runs outside the transaction so workers overlap on it; only
+    # the swap of old rows for new ones holds a write lock.
+    with transaction.atomic():
+        checkpoint = _lock_checkpoint()
+        if checkpoint.last_event_id > counted:
+            add_events(InventoryEvent.objects.filter(id__gt=counted, id__lte=checkpoint.last_event_id))
+        InventoryRollup.objects.filter(granularity=DAY, bucket__gte=start, bucket__lt=stop).delete()
+        InventoryRollup.objects.filter(granularity=HOUR, bucket__gte=start, bucket__lt=stop).exclude(
+            kept
+        ).delete()
+        InventoryRollup.objects.bulk_create(
+            [
+                InventoryRollup(
+                    granularity=granularity,
+                    bucket=bucket,
+                    sweet_id=sweet_id,
+                    category=category,
+                    **dict(zip(InventoryRollup.counter_fields, counters)),
+                )
+                for (granularity, bucket, sweet_id, category), counters in totals.items()
+            ],
+            batch_size=1000,
+        )
+    return len(totals)
+
+
+def _in_thread(first_day, stop_day) -> int:
+    try:
+        return rebuild_chunk(first_day, stop_day)
+    finally:
+        connection.close()
+
+
+def _hourly(events, *fields):
+    """Rolled-up event types grouped by sweet, type, UTC hour and ``fields``, with units and counts."""
+    return (
+        events.filter(event_type__in=InventoryRollup.event_types)
+        .annotate(hour=TruncHour("occurred_at", tzinfo=dt_timezone.utc))
+        .order_by()
+        .values("sweet_id", "event_type", "hour", *fields)
+        .annotate(units=Sum("quantity"), events=Count("id"))
+    )
+
+
+def _checkpoint():
+    return LedgerCheckpoint.objects.get_or_create(name=CHECKPOINT)[0]
+
+
+def _lock_checkpoint():
+    """Lock and return the (existing) checkpoint; call inside a transaction.
+
+    Writing the row first takes the row lock on Postgres and the database
+    write lock on SQLite, so concurrent folds never both read the same
+    checkpoint.
+    """
+    LedgerCheckpoint.objects.filter(name=CHECKPOINT).update(updated_at=timezone.now())
+    return LedgerCheckpoint.objects.get(name=CHECKPOINT)
+
+
+def _span():
+    """First and last UTC day holding live or archived events, or ``None``."""
+    days = []
+    live = InventoryEvent.objects.order_by("occurred_at", "id").values_list("occurred_at", flat=True)
+    for moment in (live.first(), live.reverse().first()):
+        if moment is not None:
+            days.append(moment.astimezone(dt_timezone.utc).date())
+    archived = InventoryDailySummary.objects.order_by("day").values_list("day", flat=True)
+    days += [day for day in (archived.first(), archived.reverse().first()) if day is not None]
+    return (min(days), max(days)) if days else None
+
+
+def _midnight(day):
+    return datetime.combine(day, time.min, tzinfo=dt_timezone.utc)
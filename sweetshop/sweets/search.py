@@ -0,0 +1,178 @@
+"""Pluggable full-text search backends for the sweets catalogue.
+
+``SWEETS_SEARCH_BACKEND`` selects the implementation: ``"auto"`` (default)
+picks SQLite FTS5 or Postgres ``tsvector`` based on the database engine and
+falls back to ``icontains`` elsewhere; a dotted path selects a custom class.
+"""
+
+import re
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import connections
+from django.db.models import BooleanField, FloatField, Q
+from django.db.models.expressions import RawSQL
+from django.utils.module_loading import import_string
+
+TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+class BaseSearchBackend:
+    """Filter a ``Sweet`` queryset by a free-text term."""
+
+    #: Whether matches are annotated with a ``search_rank`` (higher is better).
+    ranks = False
+
+    def search(self, queryset, term):
+        raise NotImplementedError
+
+    def install(self, connection):
+        """Create any index structures; must be idempotent (runs after every migrate)."""
+
+    @staticmethod
+    def tokens(term):
+        return TOKEN_RE.findall(term.lower())
+
+
+class IContainsSearchBackend(BaseSearchBackend):
+    """Portable substring match; scans the table, kept as the fallback."""
+
+    def search(self, queryset, term):
+        return queryset.filter(Q(name__icontains=term) | Q(description__icontains=term))
+
+
+class SQLiteFTSSearchBackend(BaseSearchBackend):
+    """SQLite FTS5 index over name/description with BM25 ranking and prefix matching.
+
+    The FTS table uses ``sweets_sweet`` as external content and is kept in sync
+    by triggers, so saves, deletes, ``.update()`` and ``bulk_*`` writes are all
+    covered without application code.
+    """
+
+    ranks = True
+    table = "sweets_sweet_fts"
+    install_sql = (
+        "CREATE VIRTUAL TABLE IF NOT EXISTS sweets_sweet_fts USING fts5("
+        "name, description, content='sweets_sweet', content_rowid='id', "
+        "tokenize='unicode61 remove_diacritics 2', prefix='2 3')",
+        # Name hits weigh ten times more than description hits.
+        "INSERT INTO sweets_sweet_fts(sweets_sweet_fts, rank) VALUES ('rank', 'bm25(10.0, 1.0)')",
+        "CREATE TRIGGER IF NOT EXISTS sweets_sweet_fts_ai AFTER INSERT ON sweets_sweet BEGIN "
+        "INSERT INTO sweets_sweet_fts(rowid, name, description) "
+        "VALUES (new.id, new.name, new.description); END",
+        "CREATE TRIGGER IF NOT EXISTS sweets_sweet_fts_ad AFTER DELETE ON sweets_sweet BEGIN "
+        "INSERT INTO sweets_sweet_fts(sweets_sweet_fts, rowid, name, description) "
+        "VALUES ('delete', old.id, old.name, old.description); END",
+        "CREATE TRIGGER IF NOT EXISTS sweets_sweet_fts_au AFTER UPDATE OF name, description "
+        "ON sweets_sweet BEGIN "
+        "INSERT INTO sweets_sweet_fts(sweets_sweet_fts, rowid, name, description) "
+        "VALUES ('delete', old.id, old.name, old.description); "
+        "INSERT INTO sweets_sweet_fts(rowid, name, description) "
+        "VALUES (new.id, new.name, new.description); END",
+    )
+
+    def search(self, queryset, term):
+        query = self.match_expression(term)
+        if not query:
+            return queryset.none()
+        # JOIN the index (via the unmanaged SweetSearchIndex mapping) so the
+        # MATCH runs once and bm25 comes from the same pass, rather than from a
+        # correlated subquery per matching row.
+        return (
+            queryset.filter(search_index__isnull=False)
+            .filter(RawSQL("sweets_sweet_fts MATCH %s", (query,), output_field=BooleanField()))
+            .annotate(search_rank=RawSQL("-sweets_sweet_fts.rank", (), output_field=FloatField()))
+        )
+
+    @classmethod
+    def match_expression(cls, term):
+        # Quote every token (so FTS operators in user input are inert) and make
+        # each a prefix query; tokens are implicitly ANDed.
+        return " ".join(f'"{token}"*' for token in cls.tokens(term))
+
+    def install(self, connection):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s", [self.table]
+            )
+            existed = cursor.fetchone() is not None
+            for statement in self.install_sql:
+                cursor.execute(statement)
+            if not existed:
+                cursor.execute(f"INSERT INTO {self.table}({self.table}) VALUES ('rebuild')")
+
+    @staticmethod
+    def is_available(connection):
+        with connection.cursor() as cursor:
+            cursor.execute("PRAGMA compile_options")
+            return any(row[0] == "ENABLE_FTS5" for row in cursor.fetchall())
+
+
+class PostgresSearchBackend(BaseSearchBackend):
+    """Postgres ``tsvector`` search backed by a GIN expression index."""
+
+    ranks = True
+    # Must match the indexed expression character for character.
+    vector_sql = "to_tsvector('simple'::regconfig, sweets_sweet.name || ' ' || sweets_sweet.description)"
+    install_sql = (
+        "CREATE INDEX IF NOT EXISTS sweets_sweet_search_gin ON sweets_sweet USING gin "
+        "((to_tsvector('simple'::regconfig, name || ' ' || description)))",
+    )
+
+    def search(self, queryset, term):
+        tokens = self.tokens(term)
+        if not tokens:
+            return queryset.none()
+        query = " & ".join(f"{token}:*" for token in tokens)
+        tsquery = "to_tsquery('simple'::regconfig, %s)"
+        return queryset.filter(
+            RawSQL(f"{self.vector_sql} @@ {tsquery}", (query,), output_field=BooleanField())
+        ).annotate(
+            search_rank=RawSQL(
+                f"ts_rank({self.vector_sql}, {tsquery})", (query,), output_field=FloatField()
+            )
+        )
+
+    def install(self, connection):
+        with connection.cursor() as cursor:
+            for statement in self.install_sql:
+                cursor.execute(statement)
+
+
+_backends = {}
+
+
+def get_search_backend(using="default"):
+    """Return the configured backend for a database alias (cached per process)."""
+    if using not in _backends:
+        _backends[using] = _build_backend(connections[using])
+    return _backends[using]
+
+
+async def aget_search_backend(using="default"):
+    """``get_search_backend`` for async views: building one probes the database off the loop."""
+    if using not in _backends:
+        await sync_to_async(get_search_backend)(using)
+    return _backends[using]
+
+
+def _build_backend(connection):
+    configured = getattr(settings, "SWEETS_SEARCH_BACKEND", "auto")
+    if configured != "auto":
+        return import_string(configured)()
+    if connection.vendor == "sqlite" and SQLiteFTSSearchBackend.is_available(connection):
+        return SQLiteFTSSearchBackend()
+    if connection.vendor == "postgresql":
+        return PostgresSearchBackend()
+    return IContainsSearchBackend()
+
+
+def install_search_index(sender, using="default", **kwargs):
+    """``post_migrate`` hook: (re)create index objects after schema changes.
+
+    SQLite rebuilds tables for many ``ALTER``s, which silently drops triggers,
+    so this runs after every migrate rather than from a one-off migration.
+    """
+    connection = connections[using]
+    if "sweets_sweet" in connection.introspection.table_names():
+        get_search_backend(using).install(connection)
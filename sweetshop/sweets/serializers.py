@@ -1,17 +1,63 @@
+import decimal
+
+from django.db import transaction
 from django.utils.translation import gettext_lazy as _
 from rest_framework import serializers
 
-from .models import Sweet
+from sweetshop.metrics import TimedSerializerMixin, serializer_timer
+
+from .models import InventoryEvent, StockReservation, Sweet
+
 
+class SweetSerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    """Public serializer presented in list/detail responses.
 
-class SweetSerializer(serializers.ModelSerializer):
-    """Public serializer presented in list/detail responses."""
+    Pass ``fields=`` to render only a subset of ``Meta.fields``.
+    """
 
     class Meta:
         model = Sweet
         fields = ("id", "name", "description", "price", "category", "quantity_in_stock")
         read_only_fields = fields
 
+    def __init__(self, *args, fields=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+
+def _decimal_formatter(model_field):
+    # Mirrors DRF's DecimalField.to_representation (quantize, then "{:f}").
+    exponent = decimal.Decimal(".1") ** model_field.decimal_places
+    context = decimal.Context(prec=model_field.max_digits)
+
+    def format_decimal(value):
+        if value is None:
+            return None
+        return "{:f}".format(value.quantize(exponent, context=context))
+
+    return format_decimal
+
+
+def sweet_rows_to_representation(rows, fields=SweetSerializer.Meta.fields):
+    """Render ``.values()`` rows exactly as ``SweetSerializer`` would.
+
+    Skips model instantiation and per-row field objects; only decimals need
+    formatting, every other field already has its JSON-ready Python type.
+    Extra keys in the rows (e.g. pagination keys) are dropped.
+    """
+    formatters = {
+        name: _decimal_formatter(Sweet._meta.get_field(name))
+        for name in fields
+        if Sweet._meta.get_field(name).get_internal_type() == "DecimalField"
+    }
+    with serializer_timer():
+        return [
+            {name: formatters[name](row[name]) if name in formatters else row[name] for name in fields}
+            for row in rows
+        ]
+
 
 class SweetWriteSerializer(serializers.ModelSerializer):
     """Serializer used for create/update operations."""
@@ -34,6 +80,44 @@ class SweetWriteSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError(_("Price must be a positive value."))
         return value
 
+    def validate_quantity_in_stock(self, value):
+        if self.instance and self.instance.shard_count and value != self.instance.quantity_in_stock:
+            raise serializers.ValidationError(
+                _("Stock of a sharded sweet changes through purchases, restocks and rebalancing.")
+            )
+        return value
+
+    def create(self, validated_data):
+        # The opening stock goes into the ledger so reconcile_stock can explain it.
+        with transaction.atomic():
+            sweet = super().create(validated_data)
+            sweet.record_stock_set(user=self._user())
+        return sweet
+
+    def update(self, instance, validated_data):
+        if "quantity_in_stock" not in validated_data or instance.shard_count:
+            # Write only the edited columns: a full save would put back the
+            # stock this instance was read with, undoing sales made since.
+            validated_data.pop("quantity_in_stock", None)
+            for attr, value in validated_data.items():
+                setattr(instance, attr, value)
+            instance.save(update_fields=[*validated_data, "updated_at"])
+            return instance
+        with transaction.atomic():
+            # Re-read under lock so the logged adjustment is against committed stock.
+            previous = (
+                Sweet.objects.select_for_update()
+                .values_list("quantity_in_stock", flat=True)
+                .get(pk=instance.pk)
+            )
+            sweet = super().update(instance, validated_data)
+            sweet.record_stock_set(previous, user=self._user())
+        return sweet
+
+    def _user(self):
+        request = self.context.get("request")
+        return getattr(request, "user", None)
+
 
 class SweetPurchaseSerializer(serializers.Serializer):
     """Validate purchase requests."""
@@ -55,3 +139,54 @@ class SweetRestockSerializer(serializers.Serializer):
         if value <= 0:
             raise serializers.ValidationError(_("Quantity must be a positive integer."))
         return value
+
+
+class SweetRebalanceSerializer(serializers.Serializer):
+    """Validate rebalance requests (admin only); 0 shards turns sharding off."""
+
+    shards = serializers.IntegerField(min_value=0, max_value=Sweet.max_shards, required=False)
+
+
+class CheckoutLineSerializer(serializers.Serializer):
+    """A single cart line: which sweet and how many units."""
+
+    sweet_id = serializers.IntegerField(min_value=1)
+    quantity = serializers.IntegerField(min_value=1)
+
+
+class CheckoutSerializer(serializers.Serializer):
+    """Validate a multi-item checkout, merging repeated lines for the same sweet."""
+
+    items = CheckoutLineSerializer(many=True, allow_empty=False, max_length=100)
+
+    def validate_items(self, value):
+        quantities = {}
+        for line in value:
+            quantities[line["sweet_id"]] = quantities.get(line["sweet_id"], 0) + line["quantity"]
+        return quantities
+
+
+class StockReservationSerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    """Read-only view of a stock hold."""
+
+    class Meta:
+        model = StockReservation
+        fields = ("id", "sweet", "quantity", "status", "expires_at", "created_at")
+        read_only_fields = fields
+
+
+class InventoryEventSerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    """Read-only view of one ledger row; names come from ``select_related`` joins."""
+
+    sweet_name = serializers.CharField(source="sweet.name", read_only=True)
+    performed_by_username = serializers.CharField(
+        source="performed_by.username", read_only=True, allow_null=True
+    )
+
+    class Meta:
+        model = InventoryEvent
+        fields = (
+            "id", "sweet", "sweet_name", "event_type", "quantity", "performed_by",
+            "performed_by_username", "occurred_at",
+        )
+        read_only_fields = fields
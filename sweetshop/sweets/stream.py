@@ -0,0 +1,246 @@
+"""Live stock levels pushed to ``GET /api/sweets/stream/`` as server-sent events.
+
+Committed purchases, checkouts and restocks call :func:`publish_stock`, which
+hands ``{sweet_id: quantity_in_stock}`` to the configured transport. Every
+process runs one :class:`StockHub` that fans changes out to its subscribers.
+Each subscriber keeps only the latest level per sweet until its stream flushes,
+so a burst of sales on one sweet reaches a slow client as a single event.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+from pathlib import Path
+
+from django.conf import settings
+from django.db import transaction
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+# Sent first so EventSource reconnects after 3 s instead of its default back-off.
+PREAMBLE = "retry: 3000\n\n"
+
+
+class Subscriber:
+    """One stream's pending changes, woken from any thread."""
+
+    def __init__(self, loop=None):
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._loop = loop
+        self._ready = asyncio.Event() if loop is not None else threading.Event()
+
+    def offer(self, changes: dict) -> None:
+        with self._lock:
+            # Newer levels replace older ones, so pending size is bounded by the catalogue.
+            self._pending.update(changes)
+        if self._loop is None:
+            self._ready.set()
+        else:
+            self._loop.call_soon_threadsafe(self._ready.set)
+
+    def drain(self) -> dict:
+        # Clear before taking so an offer racing with us re-arms the event.
+        self._ready.clear()
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        return pending
+
+    def wait(self, timeout) -> bool:
+        return self._ready.wait(timeout)
+
+    async def await_changes(self, timeout) -> bool:
+        try:
+            await asyncio.wait_for(self._ready.wait(), timeout)
+        except asyncio.TimeoutError:
+            return False
+        return True
+
+
+class StockHub:
+    """In-process broadcast of stock changes to every open stream."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = set()
+        self._stats = {"published": 0, "delivered": 0, "dropped": 0}
+
+    def subscribe(self, loop=None) -> Subscriber:
+        subscriber = Subscriber(loop)
+        with self._lock:
+            self._subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber) -> None:
+        with self._lock:
+            self._subscribers.discard(subscriber)
+
+    def publish(self, changes: dict) -> None:
+        with self._lock:
+            subscribers = list(self._subscribers)
+            self._stats["published"] += 1
+        for subscriber in subscribers:
+            try:
+                subscriber.offer(changes)
+            except RuntimeError:
+                # The subscriber's event loop has closed without unsubscribing.
+                self.unsubscribe(subscriber)
+                with self._lock:
+                    self._stats["dropped"] += 1
+            else:
+                with self._lock:
+                    self._stats["delivered"] += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"subscribers": len(self._subscribers), **self._stats}
+
+
+class LocalTransport:
+    """Deliver to this process only (single-process deployments, tests)."""
+
+    def __init__(self, hub):
+        self.hub = hub
+
+    def send(self, changes: dict) -> None:
+        self.hub.publish(changes)
+
+
+class UnixSocketTransport(LocalTransport):
+    """Broadcast to every process that shares ``SWEETS_STREAM_SOCKET_DIR``.
+
+    Each process binds its own datagram socket in the directory and a daemon
+    thread feeds what it receives into the local hub. Sending delivers locally
+    and then writes one datagram per peer; sockets left behind by dead
+    processes refuse the datagram and are removed.
+    """
+
+    # Keeps each datagram far below the default Unix socket buffer size.
+    max_entries = 500
+
+    def __init__(self, hub):
+        super().__init__(hub)
+        self.directory = Path(getattr(settings, "SWEETS_STREAM_SOCKET_DIR", "/tmp/sweetshop-stream"))
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.path = self.directory / f"{os.getpid()}-{uuid.uuid4().hex[:8]}.sock"
+        self._receiver = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self._receiver.bind(str(self.path))
+        self._sender = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self._sender.setblocking(False)
+        threading.Thread(target=self._receive, name="stock-stream", daemon=True).start()
+
+    def send(self, changes: dict) -> None:
+        super().send(changes)
+        items = list(changes.items())
+        payloads = [
+            json.dumps(dict(items[start:start + self.max_entries])).encode("utf-8")
+            for start in range(0, len(items), self.max_entries)
+        ]
+        for peer in self.directory.glob("*.sock"):
+            if peer == self.path:
+                continue
+            for payload in payloads:
+                try:
+                    self._sender.sendto(payload, str(peer))
+                except (ConnectionRefusedError, FileNotFoundError):
+                    peer.unlink(missing_ok=True)
+                    break
+                except BlockingIOError:
+                    # A peer that stopped reading loses updates rather than stalling writers.
+                    logger.warning("Stock stream peer %s is not keeping up.", peer.name)
+                    break
+
+    def _receive(self) -> None:
+        while True:
+            payload = self._receiver.recv(65536)
+            try:
+                changes = {int(pk): quantity for pk, quantity in json.loads(payload).items()}
+            except (ValueError, AttributeError):
+                logger.warning("Ignoring malformed stock stream datagram.")
+                continue
+            self.hub.publish(changes)
+
+
+_hub = StockHub()
+_transport = None
+_transport_lock = threading.Lock()
+
+
+def get_hub() -> StockHub:
+    return _hub
+
+
+def get_transport():
+    global _transport
+    if _transport is None:
+        with _transport_lock:
+            if _transport is None:
+                path = getattr(settings, "SWEETS_STREAM_TRANSPORT", "sweets.stream.LocalTransport")
+                _transport = import_string(path)(_hub)
+    return _transport
+
+
+def publish_stock(changes: dict, using=None) -> None:
+    """Broadcast ``{sweet_id: quantity_in_stock}`` once the current transaction commits."""
+    if not changes:
+        return
+    # robust: a failing transport is logged rather than failing a committed sale.
+    transaction.on_commit(lambda: get_transport().send(changes), using=using, robust=True)
+
+
+def _settings():
+    return (
+        getattr(settings, "SWEETS_STREAM_HEARTBEAT_SECONDS", 15),
+        getattr(settings, "SWEETS_STREAM_COALESCE_SECONDS", 0.25),
+    )
+
+
+def _format(changes: dict) -> str:
+    return "".join(
+        f"event: stock\ndata: {json.dumps({'id': pk, 'quantity_in_stock': quantity})}\n\n"
+        for pk, quantity in changes.items()
+    )
+
+
+def stream_events():
+    """Blocking SSE stream for WSGI workers (one thread per open stream)."""
+    heartbeat, coalesce = _settings()
+    subscriber = _hub.subscribe()
+    try:
+        yield PREAMBLE
+        while True:
+            if not subscriber.wait(heartbeat):
+                yield ": keepalive\n\n"
+                continue
+            if coalesce:
+                time.sleep(coalesce)
+            changes = subscriber.drain()
+            if changes:
+                yield _format(changes)
+    finally:
+        _hub.unsubscribe(subscriber)
+
+
+async def astream_events():
+    """SSE stream for ASGI servers; idle streams cost no thread."""
+    heartbeat, coalesce = _settings()
+    subscriber = _hub.subscribe(asyncio.get_running_loop())
+    try:
+        yield PREAMBLE
+        while True:
+            if not await subscriber.await_changes(heartbeat):
+                yield ": keepalive\n\n"
+                continue
+            if coalesce:
+                await asyncio.sleep(coalesce)
+            changes = subscriber.drain()
+            if changes:
+                yield _format(changes)
+    finally:
+        _hub.unsubscribe(subscriber)
@@ -1,12 +1,46 @@
 """TDD-first API tests for sweets CRUD and inventory actions."""
 
+import gzip
+import json
+import re
+import tempfile
+import threading
+import time
+import uuid
+from datetime import timedelta
+from io import StringIO
+from pathlib import Path
+from unittest import mock
+
 from django.contrib.auth import get_user_model
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.management import CommandError, call_command
+from django.db import OperationalError, connection, transaction
+from django.test import TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils import timezone
 from rest_framework import status
 from rest_framework.test import APITestCase
-from rest_framework_simplejwt.tokens import RefreshToken
 
-from .models import InventoryEvent, Sweet
+from accounts.authentication import tokens_for_user
+from sweetshop.metrics import RequestMetrics
+
+from . import rollups
+from .idempotency import IdempotencyStore, KeyReused, get_store
+from .ledger import LedgerWriter, recover, settled_event_id, stock_drift
+from .models import (
+	InventoryDailySummary,
+	InventoryEvent,
+	InventoryRollup,
+	LedgerCheckpoint,
+	ReconciledStock,
+	StockReservation,
+	StockShard,
+	Sweet,
+)
+from .serializers import SweetWriteSerializer
+from .stream import StockHub, UnixSocketTransport, get_hub
 
 
 class SweetAPITests(APITestCase):
@@ -43,7 +77,7 @@ class SweetAPITests(APITestCase):
 		)
 
 	def auth_headers(self, user):
-		token = RefreshToken.for_user(user).access_token
+		token = tokens_for_user(user).access_token
 		return {"HTTP_AUTHORIZATION": f"Bearer {token}"}
 
 	def test_customer_can_list_sweets(self) -> None:
@@ -51,9 +85,9 @@ class SweetAPITests(APITestCase):
 		response = self.client.get(url, **self.auth_headers(self.customer))
 
 		self.assertEqual(response.status_code, status.HTTP_200_OK)
-		self.assertEqual(len(response.data), 2)
+		self.assertEqual(len(response.data["results"]), 2)
 		self.assertCountEqual(
-			[s["name"] for s in response.data],
+			[s["name"] for s in response.data["results"]],
 			[self.sample_sweet.name, self.candy_sweet.name],
 		)
 
@@ -72,8 +106,8 @@ class SweetAPITests(APITestCase):
 		)
 
 		self.assertEqual(response.status_code, status.HTTP_200_OK)
-		self.assertEqual(len(response.data), 1)
-		self.assertEqual(response.data[0]["name"], self.candy_sweet.name)
+		self.assertEqual(len(response.data["results"]), 1)
+		self.assertEqual(response.data["results"][0]["name"], self.candy_sweet.name)
 
 	def test_customer_can_search_sweets_by_name(self) -> None:
 		url = reverse("sweets-list")
@@ -82,8 +116,405 @@ class SweetAPITests(APITestCase):
 		)
 
 		self.assertEqual(response.status_code, status.HTTP_200_OK)
-		self.assertEqual(len(response.data), 1)
-		self.assertEqual(response.data[0]["name"], self.sample_sweet.name)
+		self.assertEqual(len(response.data["results"]), 1)
+		self.assertEqual(response.data["results"][0]["name"], self.sample_sweet.name)
+
+	def test_list_walks_keyset_pages_without_counting(self) -> None:
+		for index in range(5):
+			Sweet.objects.create(
+				name=f"Bonbon {index}",
+				price="0.50",
+				created_by=self.admin,
+				quantity_in_stock=1,
+			)
+		headers = self.auth_headers(self.customer)
+		url = reverse("sweets-list") + "?page_size=3"
+
+		names = []
+		while url:
+			# validator aggregate + one seek query; no auth load, no OFFSET scans
+			with self.assertNumQueries(2):
+				response = self.client.get(url, **headers)
+			self.assertEqual(response.status_code, status.HTTP_200_OK)
+			names.extend(s["name"] for s in response.data["results"])
+			last_page = response.data
+			url = response.data["next"]
+
+		self.assertEqual(names, sorted(names))
+		self.assertEqual(len(names), 7)
+		self.assertEqual(len(last_page["results"]), 1)
+
+		response = self.client.get(last_page["previous"], **headers)
+		self.assertEqual(
+			[s["name"] for s in response.data["results"]], names[3:6]
+		)
+		self.assertIsNotNone(response.data["next"])
+
+	def test_search_endpoint_is_paginated(self) -> None:
+		url = reverse("sweets-search") + "?page_size=1"
+		response = self.client.get(url, **self.auth_headers(self.customer))
+
+		self.assertEqual(response.status_code, status.HTTP_200_OK)
+		self.assertEqual([s["name"] for s in response.data["results"]], ["Dark Chocolate"])
+		self.assertIsNone(response.data["previous"])
+
+		response = self.client.get(response.data["next"], **self.auth_headers(self.customer))
+		self.assertEqual([s["name"] for s in response.data["results"]], ["Gummy Bears"])
+		self.assertIsNone(response.data["next"])
+
+	def test_list_rejects_tampered_cursor(self) -> None:
+		url = reverse("sweets-list") + "?cursor=not-a-cursor"
+		response = self.client.get(url, **self.auth_headers(self.customer))
+
+		self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+	def test_search_matches_word_prefixes_ranked_by_relevance(self) -> None:
+		Sweet.objects.create(
+			name="Cocoa Truffle",
+			description="Dusted with cocoa",
+			price="2.00",
+			created_by=self.admin,
+			quantity_in_stock=3,
+		)
+		url = reverse("sweets-list") + "?search=coco"
+		response = self.client.get(url, **self.auth_headers(self.customer))
+
+		self.assertEqual(response.status_code, status.HTTP_200_OK)
+		# A name hit outranks a description-only hit ("70% cocoa").
+		self.assertEqual(
+			[s["name"] for s in response.data["results"]],
+			["Cocoa Truffle", "Dark Chocolate"],
+		)
+
+		# Keyset pages follow the relevance order too.
+		response = self.client.get(url + "&page_size=1", **self.auth_headers(self.customer))
+		self.assertEqual([s["name"] for s in response.data["results"]], ["Cocoa Truffle"])
+		response = self.client.get(response.data["next"], **self.auth_headers(self.customer))
+		self.assertEqual([s["name"] for s in response.data["results"]], ["Dark Chocolate"])
+		self.assertIsNone(response.data["next"])
+
+	def test_search_index_follows_updates_and_deletes(self) -> None:
+		url = reverse("sweets-search")
+		headers = self.auth_headers(self.customer)
+		self.candy_sweet.name = "Sour Worms"
+		self.candy_sweet.save()
+
+		response = self.client.get(url + "?name=worm", **headers)
+		self.assertEqual([s["name"] for s in response.data["results"]], ["Sour Worms"])
+		self.assertFalse(self.client.get(url + "?name=gummy", **headers).data["results"])
+
+		self.candy_sweet.delete()
+		self.assertFalse(self.client.get(url + "?name=worm", **headers).data["results"])
+
+	def test_search_treats_query_syntax_as_plain_text(self) -> None:
+		url = reverse("sweets-list") + '?search=dark" OR "*'
+		response = self.client.get(url, **self.auth_headers(self.customer))
+
+		self.assertEqual(response.status_code, status.HTTP_200_OK)
+		self.assertEqual(len(response.data["results"]), 0)
+
+	def test_repeat_list_is_served_from_cache(self) -> None:
+		url = reverse("sweets-list")
+		headers = self.auth_headers(self.customer)
+
+		first = self.client.get(url, **headers)
+		with self.assertNumQueries(1):  # validator aggregate only
+			second = self.client.get(url, **headers)
+
+		self.assertEqual(first["X-Cache"], "MISS")
+		self.assertEqual(second["X-Cache"], "HIT")
+		self.assertEqual(first.data, second.data)
+
+	def test_purchase_invalidates_cached_catalogue(self) -> None:
+		detail = reverse("sweets-detail", args=[self.sample_sweet.pk])
+		headers = self.auth_headers(self.customer)
+		self.client.get(detail, **headers)
+
+		self.client.post(
+			reverse("sweets-purchase", args=[self.sample_sweet.pk]),
+			{"quantity": 4},
+			format="json",
+			**headers,
+		)
+		response = self.client.get(detail, **headers)
+
+		self.assertEqual(response["X-Cache"], "MISS")
+		self.assertEqual(response.data["quantity_in_stock"], 6)
+
+	def test_cache_entries_are_split_by_visibility(self) -> None:
+		Sweet.objects.create(
+			name="Sold Out Sherbet", price="1.00", created_by=self.admin, quantity_in_stock=0
+		)
+		url = reverse("sweets-list")
+		customer = self.client.get(url, **self.auth_headers(self.customer))
+		admin = self.client.get(url, **self.auth_headers(self.admin))
+
+		self.assertEqual(admin["X-Cache"], "MISS")
+		self.assertEqual(len(customer.data["results"]), 2)
+		self.assertEqual(len(admin.data["results"]), 3)
+
+	def test_admin_can_read_cache_stats(self) -> None:
+		url = reverse("sweets-cache-stats")
+		self.client.get(reverse("sweets-list"), **self.auth_headers(self.customer))
+
+		response = self.client.get(url, **self.auth_headers(self.admin))
+		forbidden = self.client.get(url, **self.auth_headers(self.customer))
+
+		self.assertEqual(response.status_code, status.HTTP_200_OK)
+		self.assertGreaterEqual(response.data["misses"], 1)
+		self.assertIn("hit_ratio", response.data)
+		self.assertEqual(forbidden.status_code, status.HTTP_403_FORBIDDEN)
+
+	def test_list_revalidates_with_etag_without_serializing(self) -> None:
+		url = reverse("sweets-list")
+		headers = self.auth_headers(self.customer)
+		first = self.client.get(url, **headers)
+		self.assertIn("ETag", first)
+		self.assertIn("Last-Modified", first)
+
+		with self.assertNumQueries(1):  # MAX/COUNT aggregate
+			response = self.client.get(url, HTTP_IF_NONE_MATCH=first["ETag"], **headers)
+		self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+		self.assertEqual(response["ETag"], first["ETag"])
+
+		self.candy_sweet.purchase(quantity=1)
+		response = self.client.get(url, HTTP_IF_NONE_MATCH=first["ETag"], **headers)
+		self.assertEqual(response.status_code, status.HTTP_200_OK)
+		self.assertNotEqual(response["ETag"], first["ETag"])
+
+	def test_detail_honours_if_modified_since(self) -> None:
+		url = reverse("sweets-detail", args=[self.sample_sweet.pk])
+		headers = self.auth_headers(self.customer)
+		first = self.client.get(url, **headers)
+
+		response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=first["Last-Modified"], **headers)
+
+		self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+		self.assertEqual(response.content, b"")
+
+	def test_search_etag_depends_on_query(self) -> None:
+		url = reverse("sweets-search")
+		headers = self.auth_headers(self.customer)
+		candy = self.client.get(url + "?category=candy", **headers)
+
+		response = self.client.get(
+			url + "?category=chocolate", HTTP_IF_NONE_MATCH=candy["ETag"], **headers
+		)
+
+		self.assertEqual(response.status_code, status.HTTP_200_OK)
+		self.assertEqual(response.data["results"][0]["name"], "Dark Chocolate")
+
+	def test_search_rejects_bad_price_bounds(self) -> None:
+		url = reverse("sweets-search") + "?min_price=cheap"
+		response = self.client.get(url, **self.auth_headers(self.customer))
+
+		self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+		self.assertEqual(
+			response.data, {"detail": "min_price and max_price must be valid numbers."}
+		)
+
+	@override_settings(SWEETS_CACHE_ENABLED=False)
+	def test_fast_read_path_is_byte_identical(self) -> None:
+		Sweet.objects.create(
+			name="Crème brûlée \u2028 \"Special\"",
+			description="Vanilla & caramel",
+			price="10.50",
+			created_by=self.admin,
+			quantity_in_stock=2,
+			category="bakery",
+		)
+		headers = self.auth_headers(self.admin)
+		urls = [
+			reverse("sweets-list") + "?page_size=2",
+			reverse("sweets-list") + "?search=vanilla",
+			reverse("sweets-list") + "?ordering=-price",
+			reverse("sweets-search") + "?max_price=5",
+		]
+
+		for url in urls:
+			with self.subTest(url=url):
+				slow = self.client.get(url, **headers)
+				with override_settings(SWEETS_FAST_READS=True):
+					fast = self.client.get(url, **headers)
+				self.assertEqual(fast.status_code, status.HTTP_200_OK)
+				self.assertTrue(fast.data["results"])
+				self.assertEqual(fast.content, slow.content)
+
+	@override_settings(SWEETS_CACHE_ENABLED=False)
+	def test_sparse_fields_trim_response_and_select(self) -> None:
+		url = reverse("sweets-list") + "?fields=name,price&page_size=1"
+		headers = self.auth_headers(self.customer)
+
+		for fast_reads in (False, True):
+			with self.subTest(fast_reads=fast_reads), override_settings(SWEETS_FAST_READS=fast_reads):
+				with CaptureQueriesContext(connection) as queries:
+					response = self.client.get(url, **headers)
+				self.assertEqual(response.status_code, status.HTTP_200_OK)
+				self.assertEqual(
+					response.data["results"], [{"id": self.sample_sweet.pk, "name": "Dark Chocolate", "price": "4.99"}]
+				)
+				self.assertIsNotNone(response.data["next"])
+				page_sql = queries.captured_queries[-1]["sql"]
+				self.assertNotIn('"description"', page_sql)
+				self.assertNotIn('"quantity_in_stock",', page_sql.split("FROM")[0])
+
+	def test_sparse_fields_on_detail_and_search(self) -> None:
+		headers = self.auth_headers(self.customer)
+		detail = self.client.get(
+			reverse("sweets-detail", args=[self.sample_sweet.pk]) + "?fields=quantity_in_stock", **headers
+		)
+		search = self.client.get(reverse("sweets-search") + "?category=candy&fields=category", **headers)
+
+		self.assertEqual(detail.data, {"id": self.sample_sweet.pk, "quantity_in_stock": 10})
+		self.assertIn("ETag", detail)
+		self.assertEqual(search.data["results"], [{"id": self.candy_sweet.pk, "category": "candy"}])
+
+	def test_sparse_fields_are_part_of_cache_key(self) -> None:
+		url = reverse("sweets-list")
+		headers = self.auth_headers(self.customer)
+		self.client.get(url, **headers)
+
+		response = self.client.get(url + "?fields=name", **headers)
+
+		self.assertEqual(response["X-Cache"], "MISS")
+		self.assertEqual(set(response.data["results"][0]), {"id", "name"})
+
+	def test_sparse_fields_reject_unknown_names(self) -> None:
+		url = reverse("sweets-list") + "?fields=name,created_by,secret"
+		response = self.client.get(url, **self.auth_headers(self.customer))
+
+		self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+		self.assertEqual(response.data, {"detail": "Unknown field(s): created_by, secret."})
+
+	def test_sparse_fields_are_ignored_by_writes(self) -> None:
+		detail = reverse("sweets-detail", args=[self.sample_sweet.pk]) + "?fields=bogus"
+		purchase = reverse("sweets-purchase", args=[self.sample_sweet.pk]) + "?fields=bogus"
+
+		edit = self.client.patch(detail, {"price": "3.00"}, format="json", **self.auth_headers(self.admin))
+		bought = self.client.post(purchase, {"quantity": 1}, format="json", **self.auth_headers(self.customer))
+
+		self.assertEqual((edit.status_code, bought.status_code), (status.HTTP_200_OK, status.HTTP_200_OK))
+
+	def test_async_reads_match_sync_endpoints(self) -> None:
+		headers = self.auth_headers(self.admin)
+		pairs = [
+			(reverse("sweets-list") + "?page_size=1", reverse("async-sweets-list") + "?page_size=1"),
+			(reverse("sweets-list") + "?search=fruity", reverse("async-sweets-list") + "?search=fruity"),
+			(reverse("sweets-list") + "?ordering=-price&fields=name", reverse("async-sweets-list") + "?ordering=-price&fields=name"),
+			(reverse("sweets-search") + "?max_price=2", reverse("async-sweets-search") + "?max_price=2"),
+			(
+				reverse("sweets-detail", args=[self.sample_sweet.pk]),
+				reverse("async-sweets-detail", args=[self.sample_sweet.pk]),
+			),
+		]
+
+		for sync_url, async_url in pairs:
+			with self.subTest(url=async_url):
+				expected = self.client.get(sync_url, **headers).json()
+				response = self.client.get(async_url, **headers)
+				self.assertEqual(response.status_code, status.HTTP_200_OK)
+				self.assertEqual(response["X-Cache"], "MISS")
+				self.assertIn("ETag", response)
+				body = response.json()
+				if "results" in expected:
+					self.assertEqual(body["results"], expected["results"])
+					self.assertEqual(body["next"] is None, expected["next"] is None)
+				else:
+					self.assertEqual(body, expected)
+
+	def test_async_list_follows_cursor_and_revalidates(self) -> None:
+		headers = self.auth_headers(self.customer)
+		first = self.client.get(reverse("async-sweets-list") + "?page_size=1", **headers)
+		second = self.client.get(first.json()["next"], **headers)
+		not_modified = self.client.get(
+			reverse("async-sweets-list") + "?page_size=1", HTTP_IF_NONE_MATCH=first["ETag"], **headers
+		)
+
+		self.assertEqual(second.json()["results"][0]["name"], "Gummy Bears")
+		self.assertEqual(not_modified.status_code, status.HTTP_304_NOT_MODIFIED)
+
+	def test_async_reads_enforce_auth_and_visibility(self) -> None:
+		self.sample_sweet.quantity_in_stock = 0
+		self.sample_sweet.save()
+		url = reverse("async-sweets-detail", args=[self.sample_sweet.pk])
+
+		anonymous = self.client.get(url)
+		customer = self.client.get(url, **self.auth_headers(self.customer))
+		bad_fields = self.client.get(
+			reverse("async-sweets-list") + "?fields=secret", **self.auth_headers(self.customer)
+		)
+
+		self.assertEqual(anonymous.status_code, status.HTTP_401_UNAUTHORIZED)
+		self.assertIn("WWW-Authenticate", anonymous)
+		self.assertEqual(customer.status_code, status.HTTP_404_NOT_FOUND)
+		self.assertEqual(bad_fields.status_code, status.HTTP_400_BAD_REQUEST)
+
+	def test_async_search_resolves_backend_off_the_event_loop(self) -> None:
+		headers = self.auth_headers(self.customer)
+		with mock.patch.dict("sweets.search._backends", clear=True):
+			by_name = self.client.get(reverse("async-sweets-search") + "?name=gummy", **headers)
+		with mock.patch.dict("sweets.search._backends", clear=True):
+			by_term = self.client.get(reverse("async-sweets-list") + "?search=chocolate", **headers)
+
+		self.assertEqual(by_name.status_code, status.HTTP_200_OK)
+		self.assertEqual([row["name"] for row in by_name.json()["results"]], ["Gummy Bears"])
+		self.assertEqual(by_term.status_code, status.HTTP_200_OK)
+		self.assertEqual([row["name"] for row in by_term.json()["results"]], ["Dark Chocolate"])
+
+	@override_settings(SWEETS_STREAM_COALESCE_SECONDS=0, SWEETS_STREAM_HEARTBEAT_SECONDS=5)
+	def test_stock_stream_pushes_coalesced_levels_after_commit(self) -> None:
+		response = self.client.get(
+			reverse("sweets-stream"), HTTP_ACCEPT="text/event-stream", **self.auth_headers(self.customer)
+		)
+		chunks = iter(response.streaming_content)
+
+		self.assertEqual(response.status_code, status.HTTP_200_OK)
+		self.assertEqual(response["Content-Type"], "text/event-stream")
+		self.assertEqual(next(chunks), b"retry: 3000\n\n")
+		self.assertEqual(get_hub().stats()["subscribers"], 1)
+
+		url = reverse("sweets-purchase", args=[self.sample_sweet.pk])
+		with self.captureOnCommitCallbacks(execute=True):
+			for _ in range(3):
+				self.client.post(url, {"quantity": 2}, format="json", **self.auth_headers(self.customer))
+		restock_url = reverse("sweets-restock", args=[self.candy_sweet.pk])
+		with self.captureOnCommitCallbacks(execute=True):
+			self.client.post(restock_url, {"quantity": 5}, format="json", **self.auth_headers(self.admin))
+
+		# Three purchases of one sweet collapse into its latest level.
+		self.assertEqual(
+			next(chunks).decode(),
+			f'event: stock\ndata: {{"id": {self.sample_sweet.pk}, "quantity_in_stock": 4}}\n\n'
+			f'event: stock\ndata: {{"id": {self.candy_sweet.pk}, "quantity_in_stock": 30}}\n\n',
+		)
+		response.close()
+		self.assertEqual(get_hub().stats()["subscribers"], 0)
+
+	def test_stock_stream_requires_authentication_and_skips_rollbacks(self) -> None:
+		anonymous = self.client.get(reverse("sweets-stream"), HTTP_ACCEPT="text/event-stream")
+		with self.captureOnCommitCallbacks() as callbacks:
+			self.client.post(
+				reverse("sweets-purchase", args=[self.sample_sweet.pk]),
+				{"quantity": 99},
+				format="json",
+				**self.auth_headers(self.customer),
+			)
+
+		self.assertEqual(anonymous.status_code, status.HTTP_401_UNAUTHORIZED)
+		self.assertEqual(callbacks, [])
+
+	def test_unix_socket_transport_reaches_other_processes_hubs(self) -> None:
+		with tempfile.TemporaryDirectory() as directory, override_settings(SWEETS_STREAM_SOCKET_DIR=directory):
+			local_hub, remote_hub = StockHub(), StockHub()
+			local = UnixSocketTransport(local_hub)
+			UnixSocketTransport(remote_hub)
+			subscriber = remote_hub.subscribe()
+
+			local.send({self.sample_sweet.pk: 3})
+
+			self.assertTrue(subscriber.wait(5))
+			self.assertEqual(subscriber.drain(), {self.sample_sweet.pk: 3})
+			self.assertEqual(local_hub.stats()["published"], 1)
 
 	def test_admin_can_create_sweet(self) -> None:
 		url = reverse("sweets-list")
@@ -179,6 +610,74 @@ class SweetAPITests(APITestCase):
 		self.assertEqual(events.count(), 1)
 		self.assertEqual(events.first().quantity, 2)
 
+	def test_idempotency_key_replays_purchase_without_repeating_it(self) -> None:
+		get_store().cache.clear()
+		url = reverse("sweets-purchase", args=[self.sample_sweet.pk])
+		headers = {**self.auth_headers(self.customer), "HTTP_IDEMPOTENCY_KEY": "order-1"}
+
+		first = self.client.post(url, {"quantity": 3}, format="json", **headers)
+		with self.assertNumQueries(1):  # the POST still loads the user
+			retry = self.client.post(url, {"quantity": 3}, format="json", **headers)
+		reused = self.client.post(url, {"quantity": 4}, format="json", **headers)
+		other_user = self.client.post(
+			url, {"quantity": 3}, format="json", HTTP_IDEMPOTENCY_KEY="order-1", **self.auth_headers(self.admin)
+		)
+
+		self.assertEqual(first.status_code, status.HTTP_200_OK)
+		self.assertEqual(retry.status_code, status.HTTP_200_OK)
+		self.assertEqual(retry.data, first.data)
+		self.assertEqual(retry["Idempotent-Replayed"], "true")
+		self.assertEqual(reused.status_code, status.HTTP_422_UNPROCESSABLE_ENTITY)
+		self.assertNotIn("Idempotent-Replayed", other_user)
+		self.sample_sweet.refresh_from_db()
+		self.assertEqual(self.sample_sweet.quantity_in_stock, 4)
+		self.assertEqual(InventoryEvent.objects.filter(sweet=self.sample_sweet).count(), 2)
+
+	def test_idempotency_key_waits_for_in_flight_attempt(self) -> None:
+		store = IdempotencyStore(LocMemCache("idempotency-wait", {}))
+		entry, owner = store.claim("1:k", "body")
+		duplicate, duplicate_owner = store.claim("1:k", "body")
+		timer = threading.Timer(0.05, store.finish, args=(entry, 200, {"ok": True}))
+		timer.start()
+
+		self.assertTrue(owner)
+		self.assertFalse(duplicate_owner)
+		duplicate = store.wait(duplicate, 5)
+		self.assertEqual((duplicate.status_code, duplicate.data), (200, {"ok": True}))
+		timer.join()
+
+	def test_idempotency_keys_are_shared_by_stores_on_one_backend(self) -> None:
+		# Two workers (or a worker and its restart) pointed at the same cache.
+		backend = LocMemCache("idempotency-shared", {})
+		first, second = IdempotencyStore(backend), IdempotencyStore(backend)
+		entry, owner = first.claim("1:order-1", "body")
+
+		self.assertTrue(owner)
+		self.assertFalse(second.claim("1:order-1", "body")[1])
+		with self.assertRaises(KeyReused):
+			second.claim("1:order-1", "other body")
+		first.finish(entry, 200, {"ok": True})
+		replay, replay_owner = IdempotencyStore(backend).claim("1:order-1", "body")
+		self.assertFalse(replay_owner)
+		self.assertEqual((replay.status_code, replay.data), (200, {"ok": True}))
+
+		failed, _ = second.claim("1:order-2", "body")
+		second.abandon(failed)
+		self.assertTrue(first.claim("1:order-2", "body")[1])
+		self.assertEqual(second.stats(), {"in_flight": 0, "executed": 1, "replayed": 0, "waited": 0, "conflicts": 1})
+
+	@override_settings(SWEETS_IDEMPOTENCY_TTL_SECONDS=60, SWEETS_IDEMPOTENCY_LEASE_SECONDS=5)
+	def test_idempotency_claims_lapse_with_their_lease(self) -> None:
+		store = IdempotencyStore(LocMemCache("idempotency-lease", {}))
+		store.claim("a", "body")  # its worker dies before answering
+		store.finish(store.claim("b", "body")[0], 200, {})
+
+		with mock.patch("django.core.cache.backends.locmem.time.time", return_value=time.time() + 6):
+			self.assertTrue(store.claim("a", "body")[1])
+			self.assertFalse(store.claim("b", "body")[1])
+		with mock.patch("django.core.cache.backends.locmem.time.time", return_value=time.time() + 61):
+			self.assertTrue(store.claim("b", "body")[1])
+
 	def test_customer_cannot_restock(self) -> None:
 		url = reverse("sweets-restock", args=[self.sample_sweet.pk])
 		payload = {"quantity": 5}
@@ -227,3 +726,805 @@ class SweetAPITests(APITestCase):
 		self.assertTrue(events.filter(event_type=InventoryEvent.EventType.RESTOCK).exists())
 		self.assertEqual(events.count(), 1)
 		self.assertEqual(events.first().quantity, 4)
+
+	def test_checkout_purchases_all_lines_with_constant_queries(self) -> None:
+		url = reverse("sweets-checkout")
+		payload = {
+			"items": [
+				{"sweet_id": self.sample_sweet.pk, "quantity": 2},
+				{"sweet_id": self.candy_sweet.pk, "quantity": 5},
+				{"sweet_id": self.sample_sweet.pk, "quantity": 1},
+			]
+		}
+		headers = self.auth_headers(self.customer)
+
+		# auth user load + savepoint pair + in_bulk + UPDATE + bulk INSERT + re-read
+		with self.assertNumQueries(7):
+			response = self.client.post(url, payload, format="json", **headers)
+
+		self.assertEqual(response.status_code, status.HTTP_200_OK)
+		self.sample_sweet.refresh_from_db()
+		self.candy_sweet.refresh_from_db()
+		self.assertEqual(self.sample_sweet.quantity_in_stock, 7)
+		self.assertEqual(self.candy_sweet.quantity_in_stock, 20)
+		self.assertEqual(
+			{s["name"]: s["quantity_in_stock"] for s in response.data},
+			{"Dark Chocolate": 7, "Gummy Bears": 20},
+		)
+		events = InventoryEvent.objects.filter(event_type=InventoryEvent.EventType.PURCHASE)
+		self.assertEqual(
+			dict(events.values_list("sweet_id", "quantity")),
+			{self.sample_sweet.pk: 3, self.candy_sweet.pk: 5},
+		)
+
+	def test_checkout_is_all_or_nothing(self) -> None:
+		url = reverse("sweets-checkout")
+		payload = {
+			"items": [
+				{"sweet_id": self.sample_sweet.pk, "quantity": 2},
+				{"sweet_id": self.candy_sweet.pk, "quantity": 99},
+			]
+		}
+
+		response = self.client.post(
+			url, payload, format="json", **self.auth_headers(self.customer)
+		)
+
+		self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+		self.assertIn("Gummy Bears", response.data["detail"])
+		self.sample_sweet.refresh_from_db()
+		self.assertEqual(self.sample_sweet.quantity_in_stock, 10)
+		self.assertFalse(InventoryEvent.objects.exists())
+
+	def test_checkout_rejects_unknown_sweets(self) -> None:
+		url = reverse("sweets-checkout")
+		payload = {"items": [{"sweet_id": 9999, "quantity": 1}]}
+
+		response = self.client.post(
+			url, payload, format="json", **self.auth_headers(self.customer)
+		)
+
+		self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+		self.assertIn("9999", response.data["detail"])
+
+	def test_reservation_holds_stock_until_confirmed(self) -> None:
+		headers = self.auth_headers(self.customer)
+		reserved = self.client.post(
+			reverse("sweets-reserve", args=[self.sample_sweet.pk]), {"quantity": 8}, format="json", **headers
+		)
+		blocked = self.client.post(
+			reverse("sweets-purchase", args=[self.sample_sweet.pk]), {"quantity": 3}, format="json", **headers
+		)
+		over_reserved = self.client.post(
+			reverse("sweets-reserve", args=[self.sample_sweet.pk]), {"quantity": 3}, format="json", **headers
+		)
+		with self.assertNumQueries(1):
+			held = self.sample_sweet.availability()
+		confirmed = self.client.post(
+			reverse("reservations-confirm", args=[reserved.data["id"]]), format="json", **headers
+		)
+		confirmed_again = self.client.post(
+			reverse("reservations-confirm", args=[reserved.data["id"]]), format="json", **headers
+		)
+
+		self.assertEqual(reserved.status_code, status.HTTP_201_CREATED)
+		self.assertEqual(reserved.data["status"], "active")
+		self.assertEqual(blocked.status_code, status.HTTP_400_BAD_REQUEST)
+		self.assertEqual(over_reserved.status_code, status.HTTP_400_BAD_REQUEST)
+		self.assertEqual(held, {"id": self.sample_sweet.pk, "quantity_in_stock": 10, "held": 8, "available": 2})
+		self.assertEqual(confirmed.status_code, status.HTTP_200_OK)
+		self.assertEqual(confirmed.data["status"], "confirmed")
+		self.assertEqual(confirmed_again.status_code, status.HTTP_400_BAD_REQUEST)
+		self.assertEqual(
+			self.client.get(reverse("sweets-availability", args=[self.sample_sweet.pk]), **headers).data,
+			{"id": self.sample_sweet.pk, "quantity_in_stock": 2, "held": 0, "available": 2},
+		)
+		events = InventoryEvent.objects.filter(sweet=self.sample_sweet)
+		self.assertEqual(list(events.values_list("event_type", "quantity")), [("purchase", 8)])
+
+	def test_customer_lists_and_retrieves_only_own_reservations(self) -> None:
+		mine = self.sample_sweet.reserve(2, self.customer)
+		self.candy_sweet.reserve(3, self.admin)
+		headers = self.auth_headers(self.customer)
+
+		listed = self.client.get(reverse("reservations-list"), **headers)
+		retrieved = self.client.get(reverse("reservations-detail", args=[mine.pk]), **headers)
+		foreign = self.client.get(
+			reverse("reservations-detail", args=[mine.pk]), **self.auth_headers(self.admin)
+		)
+
+		self.assertEqual(listed.status_code, status.HTTP_200_OK)
+		self.assertEqual([row["id"] for row in listed.data["results"]], [mine.pk])
+		self.assertEqual(retrieved.status_code, status.HTTP_200_OK)
+		self.assertEqual(retrieved.data["quantity"], 2)
+		self.assertEqual(foreign.status_code, status.HTTP_404_NOT_FOUND)
+
+	def test_released_and_expired_holds_free_stock(self) -> None:
+		released = self.sample_sweet.reserve(6, self.customer)
+		lapsed = [self.sample_sweet.reserve(2, self.customer), self.candy_sweet.reserve(25, self.customer)]
+		StockReservation.objects.filter(pk__in=[r.pk for r in lapsed]).update(
+			expires_at=timezone.now() - timedelta(seconds=1)
+		)
+		other_user = self.client.post(
+			reverse("reservations-release", args=[released.pk]), **self.auth_headers(self.admin)
+		)
+		release = self.client.post(
+			reverse("reservations-release", args=[released.pk]), **self.auth_headers(self.customer)
+		)
+		checkout = self.client.post(
+			reverse("sweets-checkout"),
+			{"items": [{"sweet_id": self.sample_sweet.pk, "quantity": 10}, {"sweet_id": self.candy_sweet.pk, "quantity": 1}]},
+			format="json",
+			**self.auth_headers(self.customer),
+		)
+		out = StringIO()
+		call_command("expire_reservations", "--batch-size", "1", stdout=out)
+		late_confirm = self.client.post(
+			reverse("reservations-confirm", args=[lapsed[0].pk]), **self.auth_headers(self.customer)
+		)
+
+		self.assertEqual(other_user.status_code, status.HTTP_404_NOT_FOUND)
+		self.assertEqual(release.data["status"], "released")
+		self.assertEqual(checkout.status_code, status.HTTP_200_OK)
+		self.assertIn("Expired 2 reservation(s)", out.getvalue())
+		self.assertEqual(late_confirm.status_code, status.HTTP_400_BAD_REQUEST)
+		self.assertEqual(
+			list(StockReservation.objects.order_by("id").values_list("status", flat=True)),
+			["released", "expired", "expired"],
+		)
+
+	def test_sharded_sweet_sells_from_shards_and_rebalances(self) -> None:
+		rebalanced = self.client.post(
+			reverse("sweets-rebalance", args=[self.sample_sweet.pk]), {"shards": 4}, format="json", **self.auth_headers(self.admin)
+		)
+		self.sample_sweet.refresh_from_db()
+		with CaptureQueriesContext(connection) as queries:
+			self.sample_sweet.purchase(2)
+		# The hot sweet row itself is never written by a sharded purchase.
+		self.assertFalse([q for q in queries.captured_queries if 'UPDATE "sweets_sweet"' in q["sql"]])
+		# 10 units over 4 shards is 3/3/2/2; 4 units cannot come from one shard.
+		self.sample_sweet.purchase(4)
+		restocked = self.client.post(
+			reverse("sweets-restock", args=[self.sample_sweet.pk]), {"quantity": 6}, format="json", **self.auth_headers(self.admin)
+		)
+		checkout = Sweet.checkout({self.sample_sweet.pk: 10, self.candy_sweet.pk: 5})
+
+		self.assertEqual(rebalanced.data["shard_count"], 4)
+		self.assertEqual(restocked.data["quantity_in_stock"], 10)
+		self.assertEqual({sweet.name: sweet.quantity_in_stock for sweet in checkout}, {"Dark Chocolate": 0, "Gummy Bears": 20})
+		self.assertEqual(self.sample_sweet.availability()["quantity_in_stock"], 0)
+		with self.assertRaisesMessage(ValueError, "Insufficient stock"):
+			self.sample_sweet.purchase(1)
+		with self.assertRaisesMessage(ValueError, "cannot be reserved"):
+			self.sample_sweet.reserve(1, self.customer)
+
+		self.sample_sweet.restock(7, user=self.admin)
+		self.sample_sweet.rebalance(0)
+		self.assertEqual((self.sample_sweet.shard_count, self.sample_sweet.quantity_in_stock), (0, 7))
+		self.assertFalse(StockShard.objects.exists())
+
+	def test_purchase_on_a_stale_instance_sells_from_shards_added_since(self) -> None:
+		stale, stale_line = Sweet.objects.get(pk=self.sample_sweet.pk), Sweet.objects.get(pk=self.sample_sweet.pk)
+		self.sample_sweet.rebalance(2)
+
+		stale.purchase(3)
+		with mock.patch.object(Sweet.objects, "in_bulk", return_value={self.sample_sweet.pk: stale_line}):
+			Sweet.checkout({self.sample_sweet.pk: 1})
+
+		self.assertEqual(Sweet.objects.get(pk=self.sample_sweet.pk).quantity_in_stock, 10)  # the snapshot
+		self.assertEqual(self.sample_sweet.shard_total(), 6)
+		self.assertEqual((stale.shard_count, stale.quantity_in_stock), (2, 7))
+
+	def test_sharded_stock_rejects_direct_edits_and_active_holds(self) -> None:
+		self.candy_sweet.reserve(1, self.customer)
+		blocked = self.client.post(
+			reverse("sweets-rebalance", args=[self.candy_sweet.pk]), {"shards": 2}, format="json", **self.auth_headers(self.admin)
+		)
+		self.sample_sweet.rebalance(2)
+		edit = self.client.patch(
+			reverse("sweets-detail", args=[self.sample_sweet.pk]),
+			{"quantity_in_stock": 50},
+			format="json",
+			**self.auth_headers(self.admin),
+		)
+		customer = self.client.post(
+			reverse("sweets-rebalance", args=[self.sample_sweet.pk]), {"shards": 2}, format="json", **self.auth_headers(self.customer)
+		)
+
+		self.assertEqual(blocked.status_code, status.HTTP_400_BAD_REQUEST)
+		self.assertEqual(edit.status_code, status.HTTP_400_BAD_REQUEST)
+		self.assertEqual(customer.status_code, status.HTTP_403_FORBIDDEN)
+
+	def test_write_behind_ledger_spools_then_flushes_in_batches(self) -> None:
+		with tempfile.TemporaryDirectory() as directory:
+			writer = LedgerWriter(directory, fsync=False)
+			url = reverse("sweets-purchase", args=[self.sample_sweet.pk])
+			with mock.patch("sweets.models.get_writer", return_value=writer):
+				with self.captureOnCommitCallbacks(execute=True):
+					self.client.post(url, {"quantity": 2}, format="json", **self.auth_headers(self.customer))
+				with self.captureOnCommitCallbacks(execute=True):
+					Sweet.checkout({self.sample_sweet.pk: 1, self.candy_sweet.pk: 1})
+			pending = writer.stats()
+			spooled = sum(len(path.read_text().splitlines()) for path in Path(directory).glob("*.jsonl"))
+			purchased_at = json.loads(next(Path(directory).glob("*.jsonl")).read_text().splitlines()[0])["occurred_at"]
+			written_inline = InventoryEvent.objects.count()
+
+			flushed = writer.flush()
+
+			self.assertEqual((pending["queue_depth"], spooled, written_inline), (3, 3, 0))
+			self.assertEqual(flushed, 3)
+			self.assertEqual(InventoryEvent.objects.count(), 3)
+			self.assertEqual(
+				InventoryEvent.objects.filter(sweet=self.sample_sweet, quantity=2).get().occurred_at.isoformat(),
+				purchased_at,
+			)
+			self.assertEqual(writer.stats()["queue_depth"], 0)
+			self.assertEqual(writer.stats()["flushes"], 1)
+			self.assertEqual([path.suffix for path in Path(directory).iterdir()], [".lock"])  # the live writer's
+
+	def test_write_behind_spools_before_commit_and_strikes_rollbacks(self) -> None:
+		with tempfile.TemporaryDirectory() as directory:
+			writer = LedgerWriter(directory, fsync=False)
+			with mock.patch("sweets.models.get_writer", return_value=writer):
+				# Held, not run: the sale committed but its worker died before the callbacks.
+				with self.captureOnCommitCallbacks() as callbacks:
+					self.sample_sweet.purchase(2)
+					with self.assertRaises(RuntimeError), transaction.atomic():
+						self.candy_sweet.purchase(1)
+						raise RuntimeError("payment declined")
+			self.assertEqual(recover(directory), 0)  # its writer still holds the lock
+			writer.close()
+
+			recovered = recover(directory)
+
+			self.assertTrue(callbacks)
+			self.assertEqual((writer.stats()["queue_depth"], recovered, writer.stats()["discarded"]), (0, 1, 1))
+			self.assertEqual(
+				list(InventoryEvent.objects.values_list("sweet_id", "quantity")), [(self.sample_sweet.pk, 2)]
+			)
+			self.assertEqual(list(Path(directory).iterdir()), [])
+
+	def test_write_behind_recovery_replays_dead_spools_once(self) -> None:
+		def row(key, sweet_id):
+			return json.dumps({
+				"ledger_key": key, "sweet_id": sweet_id, "event_type": "purchase", "quantity": 1,
+				"performed_by_id": self.customer.pk, "occurred_at": "2026-01-02T03:04:05+00:00",
+			})
+
+		key = "6f1c2f9e-0d8e-4a44-9d6f-3f3b9a1e0c11"
+		with tempfile.TemporaryDirectory() as directory:
+			# A worker that crashed mid-flush: one row already inserted, one for a deleted sweet.
+			Path(directory, "ledger-999999999.0123456789ab.lock").touch()
+			Path(directory, "ledger-999999999.0123456789ab-1.jsonl").write_text(
+				"\n".join([row(key, self.sample_sweet.pk), row(key, self.sample_sweet.pk), row(str(uuid.uuid4()), 424242)]) + "\n"
+			)
+			InventoryEvent.objects.create(
+				sweet=self.sample_sweet, event_type="purchase", quantity=1, ledger_key=key
+			)
+
+			recovered = recover(directory)
+
+			self.assertEqual(recovered, 3)
+			self.assertEqual(InventoryEvent.objects.count(), 1)
+			self.assertEqual(list(Path(directory).iterdir()), [])
+
+	def test_write_behind_restart_with_the_same_pid_keeps_the_dead_spool(self) -> None:
+		with tempfile.TemporaryDirectory() as directory:
+			crashed, restarted = LedgerWriter(directory, fsync=False), LedgerWriter(directory, fsync=False)
+			with mock.patch("sweets.models.get_writer", return_value=crashed):
+				with self.captureOnCommitCallbacks() as callbacks:
+					self.sample_sweet.purchase(2)
+			crashed.close()
+			with mock.patch("sweets.models.get_writer", return_value=restarted):
+				with self.captureOnCommitCallbacks(execute=True):
+					self.candy_sweet.purchase(1)
+			restarted.flush()
+
+			self.assertTrue(callbacks)
+			self.assertEqual(recover(directory), 1)
+			self.assertEqual(
+				sorted(InventoryEvent.objects.values_list("sweet_id", "quantity")),
+				sorted([(self.sample_sweet.pk, 2), (self.candy_sweet.pk, 1)]),
+			)
+
+	def test_events_settle_by_insertion_not_sale_time(self) -> None:
+		InventoryEvent.objects.create(sweet=self.sample_sweet, event_type="purchase", quantity=1)
+		# A replayed write-behind row: sold two hours ago, inserted just now.
+		late = InventoryEvent.objects.create(
+			sweet=self.sample_sweet, event_type="purchase", quantity=1, occurred_at=timezone.now() - timedelta(hours=2)
+		)
+
+		self.assertEqual(settled_event_id(), 0)
+		self.assertEqual(settled_event_id(timezone.now() + timedelta(seconds=61)), late.pk)
+
+	def test_check_ledger_detects_lost_events_against_baseline(self) -> None:
+		with tempfile.TemporaryDirectory() as directory, override_settings(SWEETS_LEDGER_SPOOL_DIR=directory):
+			baseline = str(Path(directory) / "baseline.json")
+			call_command("check_ledger", "--baseline", baseline, stdout=StringIO())
+			self.sample_sweet.purchase(3)
+			self.candy_sweet.restock(4, user=self.admin)
+			out = StringIO()
+			call_command("check_ledger", "--baseline", baseline, stdout=out)
+			InventoryEvent.objects.filter(sweet=self.candy_sweet).delete()
+
+			self.assertIn("agree", out.getvalue())
+			with self.assertRaisesMessage(CommandError, "disagree for 1 sweet(s)"):
+				call_command("check_ledger", "--baseline", baseline, stdout=StringIO(), stderr=StringIO())
+
+	@mock.patch("sweets.ledger.SETTLE_SECONDS", 0)
+	def test_archive_rolls_old_events_into_daily_summaries_and_files(self) -> None:
+		self.sample_sweet.purchase(2)
+		self.sample_sweet.purchase(1)
+		self.sample_sweet.restock(5, user=self.admin)
+		self.candy_sweet.purchase(4)
+		old = list(InventoryEvent.objects.order_by("id").values_list("pk", flat=True))
+		ten_days_ago = timezone.now() - timedelta(days=10)
+		InventoryEvent.objects.filter(pk__in=old[:3]).update(occurred_at=ten_days_ago)
+		InventoryEvent.objects.filter(pk=old[3]).update(occurred_at=ten_days_ago - timedelta(days=1))
+		self.candy_sweet.purchase(1)  # recent, stays live
+		drift = stock_drift()
+
+		with tempfile.TemporaryDirectory() as directory:
+			call_command("archive_inventory_events", "--days", "7", "--output-dir", directory, stdout=StringIO())
+			files = sorted(Path(directory).iterdir())
+			with gzip.open(files[1], "rt") as archive:
+				rows = [json.loads(line) for line in archive]
+			out = StringIO()
+			call_command("archive_inventory_events", "--days", "7", "--output-dir", directory, stdout=out)
+
+		self.assertEqual(len(files), 2)
+		self.assertEqual([row["id"] for row in rows], old[:3])
+		self.assertEqual(rows[0]["event_type"], "purchase")
+		self.assertEqual(list(InventoryEvent.objects.values_list("quantity", flat=True)), [1])
+		summaries = {
+			(summary.sweet_id, summary.event_type): (summary.quantity, summary.events)
+			for summary in InventoryDailySummary.objects.filter(day=ten_days_ago.date())
+		}
+		self.assertEqual(
+			summaries,
+			{(self.sample_sweet.pk, "purchase"): (3, 2), (self.sample_sweet.pk, "restock"): (5, 1)},
+		)
+		self.assertEqual(stock_drift(), drift)
+		self.assertIn("Archived 0 event(s)", out.getvalue())
+
+	def test_admin_reads_ledger_in_keyset_pages(self) -> None:
+		for quantity in (1, 2, 3):
+			self.sample_sweet.purchase(quantity)
+		self.candy_sweet.purchase(4)
+		url = reverse("inventory-events-list")
+		headers = self.auth_headers(self.admin)
+
+		with self.assertNumQueries(1):  # one indexed page, no COUNT
+			first = self.client.get(url, {"page_size": 3}, **headers)
+		second = self.client.get(first.data["next"], **headers)
+		one_sweet = self.client.get(url, {"sweet": self.sample_sweet.pk}, **headers)
+
+		self.assertEqual(first.status_code, status.HTTP_200_OK)
+		self.assertEqual([row["quantity"] for row in first.data["results"]], [4, 3, 2])
+		self.assertEqual([row["quantity"] for row in second.data["results"]], [1])
+		self.assertIsNone(second.data["next"])
+		self.assertEqual([row["quantity"] for row in one_sweet.data["results"]], [3, 2, 1])
+		self.assertEqual(
+			self.client.get(url, {"sweet": "x"}, **headers).status_code, status.HTTP_400_BAD_REQUEST
+		)
+		self.assertEqual(
+			self.client.get(url, **self.auth_headers(self.customer)).status_code, status.HTTP_403_FORBIDDEN
+		)
+
+	def test_admin_filters_ledger_and_streams_exports(self) -> None:
+		self.sample_sweet.purchase(2, user=self.customer)
+		self.candy_sweet.restock(5, user=self.admin)
+		self.sample_sweet.purchase(1)
+		url = reverse("inventory-events-list")
+		export_url = reverse("inventory-events-export")
+		headers = self.auth_headers(self.admin)
+
+		with self.assertNumQueries(1):  # names come from the JOINs, not one query per row
+			everything = self.client.get(url, **headers)
+		mine = self.client.get(url, {"event_type": "purchase", "performed_by": self.customer.pk}, **headers)
+		later = self.client.get(url, {"since": (timezone.now() + timedelta(minutes=1)).isoformat()}, **headers)
+		csv_response = self.client.get(export_url, {"format": "csv"}, **headers)
+		ndjson_response = self.client.get(
+			export_url, {"format": "ndjson", "sweet": self.sample_sweet.pk}, **headers
+		)
+
+		self.assertEqual(
+			[(row["sweet_name"], row["performed_by_username"]) for row in everything.data["results"]],
+			[("Dark Chocolate", None), ("Gummy Bears", "shop-admin"), ("Dark Chocolate", "choco-fan")],
+		)
+		self.assertEqual([row["quantity"] for row in mine.data["results"]], [2])
+		self.assertEqual(later.data["results"], [])
+		self.assertTrue(csv_response.streaming)
+		self.assertTrue(csv_response["Content-Type"].startswith("text/csv"))
+		lines = b"".join(csv_response.streaming_content).decode().splitlines()
+		self.assertEqual(lines[0].split(",")[:4], ["id", "occurred_at", "sweet_id", "sweet_name"])
+		self.assertEqual(len(lines), 4)
+		rows = [json.loads(line) for line in b"".join(ndjson_response.streaming_content).decode().splitlines()]
+		self.assertEqual(
+			[(row["quantity"], row["performed_by_username"]) for row in rows], [(1, None), (2, "choco-fan")]
+		)
+		for bad in ({"event_type": "refund"}, {"performed_by": "me"}, {"until": "yesterday"}):
+			self.assertEqual(self.client.get(url, bad, **headers).status_code, status.HTTP_400_BAD_REQUEST)
+		self.assertEqual(self.client.get(export_url, **headers).status_code, status.HTTP_400_BAD_REQUEST)
+
+	@mock.patch("sweets.ledger.SETTLE_SECONDS", 0)
+	def test_rollups_fold_sales_and_serve_analytics(self) -> None:
+		self.sample_sweet.purchase(2)
+		with CaptureQueriesContext(connection) as queries:
+			self.sample_sweet.purchase(1)
+		self.candy_sweet.restock(5, user=self.admin)
+		Sweet.checkout({self.sample_sweet.pk: 4, self.candy_sweet.pk: 3})
+		url = reverse("sweets-analytics")
+		headers = self.auth_headers(self.admin)
+
+		# Sales never touch the rollups; reads fold the new ledger ids in.
+		self.assertFalse([query for query in queries.captured_queries if "sweets_inventoryrollup" in query["sql"]])
+		self.assertFalse(InventoryRollup.objects.exists())
+		response = self.client.get(url, **headers)
+		day = InventoryRollup.objects.get(granularity="day", sweet=self.sample_sweet)
+		self.assertEqual((day.purchased_units, day.purchases, day.restocked_units), (7, 3, 0))
+		hour = InventoryRollup.objects.get(granularity="hour", sweet__isnull=True, category="candy")
+		self.assertEqual((hour.purchased_units, hour.restocked_units, hour.restocks), (3, 5, 1))
+		last = InventoryEvent.objects.order_by("-id").first().pk
+		self.assertEqual(LedgerCheckpoint.objects.get(name="rollups").last_event_id, last)
+
+		# Nothing new: settled tip + checkpoint + the bucket range scan.
+		with self.assertNumQueries(3):
+			response = self.client.get(url, **headers)
+		self.assertEqual(response.status_code, status.HTTP_200_OK)
+		self.assertEqual(
+			{row["category"]: row["purchased_units"] for row in response.data["results"]},
+			{"chocolate": 7, "candy": 3},
+		)
+		by_sweet = self.client.get(url, {"granularity": "hour", "sweet": self.candy_sweet.pk}, **headers)
+		self.assertEqual([row["restocked_units"] for row in by_sweet.data["results"]], [5])
+		for params in ({"granularity": "week"}, {"category": "nope"}, {"since": "2020-01-01T00:00:00"}):
+			self.assertEqual(self.client.get(url, params, **headers).status_code, status.HTTP_400_BAD_REQUEST)
+		self.assertEqual(
+			self.client.get(url, **self.auth_headers(self.customer)).status_code, status.HTTP_403_FORBIDDEN
+		)
+
+	@mock.patch("sweets.ledger.SETTLE_SECONDS", 0)
+	def test_fold_leaves_a_locked_checkpoint_to_the_fold_holding_it(self) -> None:
+		self.sample_sweet.purchase(2)
+		with mock.patch("sweets.rollups._lock_checkpoint", side_effect=OperationalError("database is locked")):
+			self.assertEqual(rollups.fold(), 0)
+		self.assertFalse(InventoryRollup.objects.exists())
+		self.assertEqual(rollups.fold(), 1)
+		self.assertEqual(InventoryRollup.objects.get(granularity="day", sweet=self.sample_sweet).purchased_units, 2)
+
+	@mock.patch("sweets.ledger.SETTLE_SECONDS", 0)
+	def test_rebuild_rollups_recomputes_from_ledger_and_archive(self) -> None:
+		self.sample_sweet.purchase(2)
+		self.candy_sweet.restock(5, user=self.admin)
+		self.sample_sweet.purchase(1)
+		call_command("rebuild_rollups", "--incremental", stdout=StringIO())
+		fields = ("granularity", "bucket", "sweet_id", "category", *InventoryRollup.counter_fields)
+		incremental = set(InventoryRollup.objects.values_list(*fields))
+		self.assertEqual(len(incremental), 8)
+		old = InventoryEvent.objects.filter(sweet=self.sample_sweet).order_by("id").first()
+		ten_days_ago = timezone.now() - timedelta(days=10)
+		InventoryEvent.objects.filter(pk=old.pk).update(occurred_at=ten_days_ago)
+		with tempfile.TemporaryDirectory() as directory:
+			call_command("archive_inventory_events", "--days", "7", "--output-dir", directory, stdout=StringIO())
+		InventoryRollup.objects.update(purchased_units=999)
+
+		out = StringIO()
+		call_command("rebuild_rollups", "--workers", "1", "--chunk-days", "3", stdout=out)
+
+		old_day = InventoryRollup.objects.get(granularity="day", bucket__date=ten_days_ago.date(), sweet__isnull=True)
+		self.assertEqual((old_day.category, old_day.purchased_units, old_day.purchases), ("chocolate", 2, 1))
+		today = {
+			row[:4]: row[4:]
+			for row in InventoryRollup.objects.filter(bucket__date=timezone.now().date()).values_list(*fields)
+		}
+		expected = {row[:4]: row[4:] for row in incremental}
+		for key in expected:
+			if self.sample_sweet.pk == key[2] or key[3] == "chocolate":
+				expected[key] = (1, 1, 0, 0)  # the 2-unit sale moved to the archived day
+		self.assertEqual(today, expected)
+		self.assertIn("over 11 day(s)", out.getvalue())
+
+	@mock.patch("sweets.ledger.SETTLE_SECONDS", 0)
+	def test_reconcile_stock_reports_and_repairs_drift(self) -> None:
+		# The fixtures were created straight through the ORM, without opening events.
+		self.assertEqual(
+			stock_drift(drifting=True), {self.sample_sweet.pk: (10, 0), self.candy_sweet.pk: (25, 0)}
+		)
+		with self.assertRaisesMessage(CommandError, "disagrees with the ledger for 2 sweet(s)"):
+			call_command("reconcile_stock", stdout=StringIO())
+		call_command("reconcile_stock", "--repair", "ledger", "--user", "shop-admin", stdout=StringIO())
+		adjustment = InventoryEvent.objects.get(sweet=self.candy_sweet)
+		self.assertEqual((adjustment.event_type, adjustment.quantity), ("adjustment_in", 25))
+		self.assertEqual(adjustment.performed_by, self.admin)
+
+		headers = self.auth_headers(self.admin)
+		payload = {"name": "Nougat Bar", "price": "2.50", "category": "candy", "quantity_in_stock": 5}
+		response = self.client.post(reverse("sweets-list"), payload, format="json", **headers)
+		nougat = Sweet.objects.get(pk=response.data["id"])
+		self.client.patch(
+			reverse("sweets-detail", args=[nougat.pk]), {"quantity_in_stock": 2}, format="json", **headers
+		)
+		self.assertEqual(
+			list(InventoryEvent.objects.filter(sweet=nougat).values_list("event_type", "quantity")),
+			[("adjustment_out", 3), ("opening", 5)],
+		)
+		self.assertEqual(stock_drift(drifting=True), {})
+
+		Sweet.objects.filter(pk=self.sample_sweet.pk).update(quantity_in_stock=7)
+		out = StringIO()
+		call_command("reconcile_stock", "--repair", "stock", stdout=out)
+
+		self.assertIn(f"sweet {self.sample_sweet.pk}: stock 7, ledger 10", out.getvalue())
+		self.sample_sweet.refresh_from_db()
+		self.assertEqual(self.sample_sweet.quantity_in_stock, 10)
+		self.assertEqual(stock_drift(drifting=True), {})
+
+	def test_reconcile_stock_replays_spools_and_skips_unsettled_sweets(self) -> None:
+		# Both fixtures were just created, so their latest events may still be in flight.
+		self.assertEqual(len(stock_drift(drifting=True)), 2)
+		self.assertEqual(stock_drift(drifting=True, settled=True), {})
+
+		with override_settings(SWEETS_LEDGER_WRITE_BEHIND=True), self.assertRaisesMessage(
+			CommandError, "disable SWEETS_LEDGER_WRITE_BEHIND"
+		):
+			call_command("reconcile_stock", "--repair", "stock", stdout=StringIO())
+
+		with mock.patch("sweets.ledger.SETTLE_SECONDS", 0), tempfile.TemporaryDirectory() as directory:
+			call_command("reconcile_stock", "--repair", "ledger", stdout=StringIO())
+			crashed = LedgerWriter(directory, fsync=False)
+			with mock.patch("sweets.models.get_writer", return_value=crashed):
+				with self.captureOnCommitCallbacks():
+					self.sample_sweet.purchase(2)
+			crashed.close()
+			out = StringIO()
+			with override_settings(SWEETS_LEDGER_SPOOL_DIR=directory):
+				call_command("reconcile_stock", "--repair", "stock", stdout=out)
+
+		self.assertIn("Replayed 1 spooled event(s).", out.getvalue())
+		self.assertIn("0 sweet(s) drifting.", out.getvalue())
+		self.sample_sweet.refresh_from_db()
+		self.assertEqual(self.sample_sweet.quantity_in_stock, 8)
+
+	def test_edit_without_stock_keeps_sales_made_since_the_sweet_was_read(self) -> None:
+		serializer = SweetWriteSerializer(self.sample_sweet, data={"price": "3.25"}, partial=True)
+		self.assertTrue(serializer.is_valid())
+		Sweet.objects.get(pk=self.sample_sweet.pk).purchase(4)  # lands while the edit is in flight
+
+		serializer.save()
+
+		self.sample_sweet.refresh_from_db()
+		self.assertEqual((str(self.sample_sweet.price), self.sample_sweet.quantity_in_stock), ("3.25", 6))
+
+	@mock.patch("sweets.ledger.SETTLE_SECONDS", 0)
+	def test_incremental_reconcile_scans_only_new_events(self) -> None:
+		call_command("reconcile_stock", "--repair", "ledger", stdout=StringIO())
+		self.sample_sweet.purchase(2)
+		out = StringIO()
+		call_command("reconcile_stock", "--incremental", stdout=out)
+		self.assertIn("Scanned 3 new event(s).", out.getvalue())
+		self.assertIn("0 sweet(s) drifting.", out.getvalue())
+		checkpoint = LedgerCheckpoint.objects.get(name="reconcile_stock")
+		self.assertEqual(checkpoint.last_event_id, InventoryEvent.objects.order_by("-id").first().pk)
+
+		self.candy_sweet.purchase(4)
+		old = InventoryEvent.objects.filter(sweet=self.sample_sweet).order_by("id").first()
+		InventoryEvent.objects.filter(pk=old.pk).update(occurred_at=timezone.now() - timedelta(days=10))
+		with tempfile.TemporaryDirectory() as directory:
+			call_command("archive_inventory_events", "--days", "7", "--output-dir", directory, stdout=StringIO())
+		Sweet.objects.filter(pk=self.candy_sweet.pk).update(quantity_in_stock=30)
+		out = StringIO()
+		with self.assertRaisesMessage(CommandError, "1 sweet(s)"):
+			call_command("reconcile_stock", "--incremental", stdout=out)
+
+		self.assertIn("Scanned 1 new event(s).", out.getvalue())
+		self.assertIn(f"sweet {self.candy_sweet.pk}: stock 30, ledger 21", out.getvalue())
+		self.assertEqual(
+			ReconciledStock.objects.get(sweet=self.sample_sweet).ledger_total, self.sample_sweet.quantity_in_stock
+		)
+
+		self.candy_sweet.purchase(1)
+		InventoryEvent.objects.filter(event_type="purchase", sweet=self.candy_sweet).update(
+			occurred_at=timezone.now() - timedelta(days=10)
+		)
+		with tempfile.TemporaryDirectory() as directory, self.assertRaisesMessage(
+			CommandError, "Run reconcile_stock --incremental"
+		):
+			call_command("archive_inventory_events", "--days", "7", "--output-dir", directory, stdout=StringIO())
+
+	def test_request_metrics_emit_server_timing_and_prometheus_text(self) -> None:
+		url = reverse("sweets-purchase", args=[self.sample_sweet.pk])
+		with mock.patch("sweetshop.metrics._registry", RequestMetrics()):
+			response = self.client.post(url, {"quantity": 1}, format="json", **self.auth_headers(self.customer))
+			async_list = self.client.get(reverse("async-sweets-list"), **self.auth_headers(self.customer))
+			forbidden = self.client.get(reverse("metrics"), **self.auth_headers(self.customer))
+			scraped = self.client.get(reverse("metrics"), **self.auth_headers(self.admin))
+
+		# get + conditional update + event insert + rollup upkeep, in savepoints
+		queries = int(re.search(r'desc="(\d+) queries"', response["Server-Timing"]).group(1))
+		self.assertGreaterEqual(queries, 3)
+		self.assertIn("serializer;dur=", response["Server-Timing"])
+		self.assertIn("total;dur=", async_list["Server-Timing"])
+		self.assertEqual(forbidden.status_code, status.HTTP_403_FORBIDDEN)
+		self.assertEqual(scraped.status_code, status.HTTP_200_OK)
+		self.assertTrue(scraped["Content-Type"].startswith("text/plain"))
+		body = scraped.content.decode()
+		labels = 'view="sweets-purchase",method="POST"'
+		self.assertIn(f"sweetshop_http_request_queries_sum{{{labels}}} {queries}", body)
+		self.assertIn(f'sweetshop_http_request_queries_bucket{{{labels},le="+Inf"}} 1', body)
+		self.assertIn(f'sweetshop_http_responses_total{{{labels},status="200"}} 1', body)
+		self.assertIn('sweetshop_http_responses_total{view="metrics",method="GET",status="403"} 1', body)
+		self.assertIn("sweetshop_catalogue_cache_hits ", body)
+		self.assertIn("sweetshop_hashing_pool_completed ", body)
+
+	def test_admin_bulk_restock_upserts_in_constant_queries(self) -> None:
+		url = reverse("sweets-bulk-restock")
+		payload = {
+			"items": [
+				{"name": "Dark Chocolate", "quantity": 5, "price": "5.25"},
+				{"name": "Gummy Bears", "quantity": 0, "description": "Sour mix"},
+				{"name": "Fudge", "quantity": 12, "price": "3.10", "category": "bakery"},
+				{"name": "Toffee", "quantity": 4, "price": "0.80", "category": "candy"},
+			]
+		}
+		headers = self.auth_headers(self.admin)
+
+		# auth + savepoint pair + lookup + insert sweets + update sweets + insert events
+		with self.assertNumQueries(7):
+			response = self.client.post(url, payload, format="json", **headers)
+
+		self.assertEqual(response.status_code, status.HTTP_200_OK)
+		self.assertEqual(response.data["rows"], 4)
+		self.assertEqual(response.data["created"], 2)
+		self.assertEqual(response.data["updated"], 2)
+		self.assertEqual(response.data["restocked_units"], 21)
+		self.assertIn("rows_per_second", response.data)
+		self.sample_sweet.refresh_from_db()
+		self.candy_sweet.refresh_from_db()
+		self.assertEqual(self.sample_sweet.quantity_in_stock, 15)
+		self.assertEqual(str(self.sample_sweet.price), "5.25")
+		self.assertEqual(self.candy_sweet.description, "Sour mix")
+		fudge = Sweet.objects.get(name="Fudge")
+		self.assertEqual((fudge.quantity_in_stock, fudge.category), (12, "bakery"))
+		self.assertEqual(fudge.created_by, self.admin)
+		self.assertEqual(
+			sorted(InventoryEvent.objects.values_list("sweet__name", "event_type", "quantity")),
+			[("Dark Chocolate", "restock", 5), ("Fudge", "opening", 12), ("Toffee", "opening", 4)],
+		)
+
+	def test_bulk_restock_matches_names_case_insensitively_and_rejects_bad_items(self) -> None:
+		url = reverse("sweets-bulk-restock")
+		headers = self.auth_headers(self.admin)
+		payload = {"items": [{"name": "dark chocolate", "quantity": 2}, {"name": "DARK CHOCOLATE", "quantity": 1}]}
+
+		response = self.client.post(url, payload, format="json", **headers)
+		bad = [self.client.post(url, body, format="json", **headers) for body in ({"items": 5}, {"items": "x"}, 5)]
+
+		self.assertEqual((response.data["created"], response.data["updated"]), (0, 1))
+		self.assertEqual(Sweet.objects.filter(name__iexact="dark chocolate").count(), 1)
+		self.sample_sweet.refresh_from_db()
+		self.assertEqual(self.sample_sweet.quantity_in_stock, 13)
+		self.assertEqual([reply.status_code for reply in bad], [status.HTTP_400_BAD_REQUEST] * 3)
+
+	def test_bulk_restock_accepts_csv_stream(self) -> None:
+		url = reverse("sweets-bulk-restock")
+		body = "name,quantity,price\nGummy Bears,7,\nLiquorice,3,1.20\n"
+
+		response = self.client.post(
+			url, body, content_type="text/csv", **self.auth_headers(self.admin)
+		)
+
+		self.assertEqual(response.status_code, status.HTTP_200_OK)
+		self.candy_sweet.refresh_from_db()
+		self.assertEqual(self.candy_sweet.quantity_in_stock, 32)
+		self.assertEqual(Sweet.objects.get(name="Liquorice").quantity_in_stock, 3)
+
+	def test_bulk_restock_rejects_new_sweet_without_price(self) -> None:
+		url = reverse("sweets-bulk-restock")
+		payload = [{"name": "Mystery", "quantity": 1}]
+
+		response = self.client.post(
+			url, payload, format="json", **self.auth_headers(self.admin)
+		)
+
+		self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+		self.assertIn("price is required", response.data["detail"])
+		self.assertFalse(Sweet.objects.filter(name="Mystery").exists())
+
+	def test_customer_cannot_bulk_restock(self) -> None:
+		url = reverse("sweets-bulk-restock")
+		payload = [{"name": "Dark Chocolate", "quantity": 5}]
+
+		response = self.client.post(
+			url, payload, format="json", **self.auth_headers(self.customer)
+		)
+
+		self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+	def test_import_sweets_command_reads_ndjson_feed(self) -> None:
+		with tempfile.NamedTemporaryFile("w", suffix=".json", delete=False) as feed:
+			feed.write('{"name": "Dark Chocolate", "quantity": 2}\n')
+			feed.write('{"name": "Marzipan", "quantity": 6, "price": "2.00"}\n')
+		out = StringIO()
+
+		call_command("import_sweets", feed.name, user="shop-admin", batch_size=1, stdout=out)
+
+		self.assertIn("rows/s", out.getvalue())
+		self.sample_sweet.refresh_from_db()
+		self.assertEqual(self.sample_sweet.quantity_in_stock, 12)
+		self.assertEqual(Sweet.objects.get(name="Marzipan").quantity_in_stock, 6)
+
+
+class PurchaseConcurrencyTests(TransactionTestCase):
+	"""Hammer a single hot sweet from many threads and prove it never oversells."""
+
+	threads = 8
+	attempts_per_thread = 25
+	initial_stock = 100
+
+	def setUp(self) -> None:
+		self.admin = get_user_model().objects.create_user(
+			username="stress-admin",
+			email="stress@sweets.test",
+			password="supersecret",
+			role="admin",
+		)
+		self.sweet = Sweet.objects.create(
+			name="Hot Seller",
+			price="1.00",
+			created_by=self.admin,
+			quantity_in_stock=self.initial_stock,
+		)
+
+	def _buyer(self, results, barrier):
+		sold = rejected = 0
+		sweet = Sweet.objects.get(pk=self.sweet.pk)
+		barrier.wait()
+		try:
+			for _ in range(self.attempts_per_thread):
+				while True:
+					try:
+						sweet.purchase(quantity=1)
+						sold += 1
+					except ValueError:
+						rejected += 1
+					except OperationalError:
+						# SQLite reports lock contention instead of blocking; retry.
+						time.sleep(0.001)
+						continue
+					break
+		finally:
+			connection.close()
+		results.append((sold, rejected))
+
+	def test_concurrent_purchases_never_oversell(self) -> None:
+		results = []
+		barrier = threading.Barrier(self.threads)
+		workers = [
+			threading.Thread(target=self._buyer, args=(results, barrier))
+			for _ in range(self.threads)
+		]
+		for worker in workers:
+			worker.start()
+		for worker in workers:
+			worker.join()
+
+		sold = sum(r[0] for r in results)
+		attempts = self.threads * self.attempts_per_thread
+		self.sweet.refresh_from_db()
+		# Demand (200) exceeds supply (100): exactly the stock must sell, no more.
+		self.assertEqual(len(results), self.threads)
+		self.assertEqual(sold, self.initial_stock)
+		self.assertEqual(sum(r[1] for r in results), attempts - sold)
+		self.assertEqual(self.sweet.availability()["quantity_in_stock"], 0)
+		self.assertEqual(
+			InventoryEvent.objects.filter(sweet=self.sweet).count(), self.initial_stock
+		)
+
+
+class ShardedPurchaseConcurrencyTests(PurchaseConcurrencyTests):
+	"""The same hammering against a sweet striped over four stock shards."""
+
+	def setUp(self) -> None:
+		super().setUp()
+		self.sweet.rebalance(4)
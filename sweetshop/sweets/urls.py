@@ -1,9 +1,26 @@
+from django.urls import path
 from rest_framework.routers import DefaultRouter
 
-from .views import SweetViewSet
+from .async_views import AsyncSweetReadView
+from .views import InventoryEventViewSet, StockReservationViewSet, SweetViewSet
 
 """URL routing for sweets app."""
 router = DefaultRouter()
 router.register("sweets", SweetViewSet, basename="sweets")
+router.register("reservations", StockReservationViewSet, basename="reservations")
+router.register("inventory-events", InventoryEventViewSet, basename="inventory-events")
 
-urlpatterns = router.urls
+urlpatterns = router.urls + [
+    # ASGI-native catalogue reads (same responses, served without thread hops).
+    path("async/sweets/", AsyncSweetReadView.as_view(action="list"), name="async-sweets-list"),
+    path(
+        "async/sweets/search/",
+        AsyncSweetReadView.as_view(action="search"),
+        name="async-sweets-search",
+    ),
+    path(
+        "async/sweets/<int:pk>/",
+        AsyncSweetReadView.as_view(action="retrieve"),
+        name="async-sweets-detail",
+    ),
+]
@@ -1,19 +1,45 @@
 """Unified DRF viewset exposing sweets CRUD, search, and inventory actions."""
 
+from collections.abc import Iterator
+from datetime import timedelta, timezone as dt_timezone
 from decimal import Decimal, InvalidOperation
 
-from django.db.models import Q
-from rest_framework import permissions, status, viewsets
+from django.conf import settings
+from django.http import StreamingHttpResponse
+from django.shortcuts import get_object_or_404
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from rest_framework import mixins, permissions, status, viewsets
 from rest_framework.decorators import action
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
 
-from .models import Sweet
+from . import cache as response_cache
+from . import ledger
+from . import rollups
+from . import conditional
+from . import exports
+from . import stream as stock_stream
+from .idempotency import idempotent
+from .importers import SweetImporter
+from .models import Category, InventoryEvent, InventoryRollup, StockReservation, Sweet
+from .pagination import KeysetPagination
+from .parsers import CSVParser, NDJSONParser
 from .permissions import IsAdminUserRole
+from .renderers import CSVRenderer, EventStreamRenderer, NDJSONRenderer
+from .search import get_search_backend
 from .serializers import (
+    CheckoutSerializer,
+    InventoryEventSerializer,
+    StockReservationSerializer,
+    SweetRebalanceSerializer,
     SweetPurchaseSerializer,
     SweetRestockSerializer,
     SweetSerializer,
     SweetWriteSerializer,
+    sweet_rows_to_representation,
 )
 
 
@@ -21,22 +47,30 @@ class SweetViewSet(viewsets.ModelViewSet):
     """Single entry point for sweets with role-aware branching."""
 
     queryset = Sweet.objects.all().order_by("name")
+    pagination_class = KeysetPagination
 
     def get_serializer_class(self):
         # Mutating endpoints should use the write serializer, while
         # inventory actions rely on their dedicated payload validators.
         if self.action in {"create", "update", "partial_update"}:
             return SweetWriteSerializer
-        if self.action == "purchase":
+        if self.action in {"purchase", "reserve"}:
             return SweetPurchaseSerializer
         if self.action == "restock":
             return SweetRestockSerializer
+        if self.action == "checkout":
+            return CheckoutSerializer
+        if self.action == "rebalance":
+            return SweetRebalanceSerializer
         return SweetSerializer
 
     def get_permissions(self):
         # Customers may list/retrieve/purchase, but any admin-only
         # management actions must include the custom role permission.
-        admin_actions = {"create", "update", "partial_update", "destroy", "restock"}
+        admin_actions = {
+            "create", "update", "partial_update", "destroy", "restock", "bulk_restock", "cache_stats",
+            "rebalance", "ledger_stats", "analytics",
+        }
         permission_classes = [permissions.IsAuthenticated]
         if self.action in admin_actions:
             permission_classes.append(IsAdminUserRole)
@@ -56,26 +90,135 @@ class SweetViewSet(viewsets.ModelViewSet):
         if category:
             queryset = queryset.filter(category__iexact=category)
         if search_term:
-            queryset = queryset.filter(
-                Q(name__icontains=search_term) | Q(description__icontains=search_term)
-            )
+            queryset = self._apply_search(queryset, search_term)
 
         if not self._is_admin(request.user):
             queryset = queryset.filter(quantity_in_stock__gt=0)
 
+        # ?fields= shapes read output only; writes and inventory actions ignore it.
+        fields = self._requested_fields(request) if self.action == "retrieve" else None
+        if fields is not None:
+            # updated_at feeds the ETag; everything else unrequested stays unread.
+            queryset = queryset.only(*fields, "updated_at")
+
         return queryset
 
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        return self._list_response(request, "list", queryset, lambda: self._page_response(queryset))
+
+    def retrieve(self, request, *args, **kwargs):
+        instance = self.get_object()
+        etag = conditional.make_etag(request, "retrieve", instance.pk, instance.updated_at)
+        not_modified = conditional.not_modified(request, etag, instance.updated_at)
+        if not_modified is not None:
+            return not_modified
+        fields = self._requested_fields(request)
+        response = self._cached_response(
+            request, "retrieve", lambda: Response(self.get_serializer(instance, fields=fields).data)
+        )
+        return conditional.set_validators(response, etag, instance.updated_at)
+
+    def _list_response(self, request, scope, queryset, build):
+        """Answer conditional GETs from validators before any row is serialized."""
+        visibility = self._visibility(request.user)
+        etag, last_modified = conditional.list_validators(request, queryset, scope, visibility)
+        not_modified = conditional.not_modified(request, etag, last_modified)
+        if not_modified is not None:
+            return not_modified
+        return conditional.set_validators(self._cached_response(request, scope, build), etag, last_modified)
+
+    def _page_response(self, queryset):
+        """Serialize one keyset page, selecting only the columns that get rendered."""
+        queryset, requested, fast = self._projected(queryset)
+        page = self.paginate_queryset(queryset)
+        return self.get_paginated_response(self._render_rows(page, requested, fast))
+
+    def _projected(self, queryset):
+        """Narrow ``queryset`` to the rendered columns; returns ``(queryset, requested, fast)``."""
+        requested = self._requested_fields(self.request)
+        fields = requested or SweetSerializer.Meta.fields
+        # The paginator needs its key columns (e.g. name, search_rank) in each row.
+        keys = [
+            field.lstrip("-")
+            for field in self.paginator.get_ordering(self.request, queryset, self)
+            if field.lstrip("-") not in fields
+        ]
+
+        if getattr(settings, "SWEETS_FAST_READS", False):
+            return queryset.values(*fields, *keys), requested, True
+        if requested is not None:
+            model_fields = {field.name for field in Sweet._meta.concrete_fields}
+            queryset = queryset.only(*fields, *(key for key in keys if key in model_fields))
+        return queryset, requested, False
+
+    @staticmethod
+    def _render_rows(rows, requested, fast):
+        if fast:
+            return sweet_rows_to_representation(rows, requested or SweetSerializer.Meta.fields)
+        return SweetSerializer(rows, many=True, fields=requested).data
+
+    def _requested_fields(self, request):
+        """Parse ``?fields=a,b`` into a subset of the serializer fields (``None`` = all).
+
+        ``id`` is always included so every row stays addressable.
+        """
+        raw = request.query_params.get("fields", "")
+        requested = {name.strip() for name in raw.split(",") if name.strip()}
+        if not requested:
+            return None
+        unknown = requested - set(SweetSerializer.Meta.fields)
+        if unknown:
+            raise ParseError(f"Unknown field(s): {', '.join(sorted(unknown))}.")
+        requested.add("id")
+        return tuple(name for name in SweetSerializer.Meta.fields if name in requested)
+
+    def _cached_response(self, request, scope, build):
+        """Serve catalogue reads from the versioned cache, filling it on a miss."""
+        if not response_cache.is_enabled():
+            return build()
+        key = response_cache.response_key(request, scope, self._visibility(request.user))
+        cached = response_cache.get_response(key)
+        if cached is not None:
+            status_code, data = cached
+            response = Response(data, status=status_code)
+            response["X-Cache"] = "HIT"
+            return response
+
+        response = build()
+        if response.status_code == status.HTTP_200_OK:
+            response_cache.set_response(key, response.status_code, response.data)
+        response["X-Cache"] = "MISS"
+        return response
+
     def perform_create(self, serializer):
         # Persist the user who created the product for auditing.
         serializer.save(created_by=self.request.user)
 
+    def _apply_search(self, queryset, term):
+        """Full-text filter via the configured backend, ordering by relevance if ranked."""
+        backend = get_search_backend(queryset.db)
+        if backend.ranks:
+            # Keyset pages then seek on (rank, id) instead of (name, id).
+            self.keyset_ordering = ("-search_rank", "id")
+        return backend.search(queryset, term)
+
     def _is_admin(self, user):
         """Small helper so multiple methods can reuse the role check."""
         return bool(user and user.is_authenticated and user.is_admin())
 
+    def _visibility(self, user):
+        # Admins also see out-of-stock sweets, so cached pages and validators
+        # are kept apart per role.
+        return "admin" if self._is_admin(user) else "customer"
+
     @action(detail=False, methods=["get"], url_path="search")
     def search(self, request):
         """Search sweets by name, category, or price range."""
+        queryset = self._search_queryset(request)
+        return self._list_response(request, "search", queryset, lambda: self._page_response(queryset))
+
+    def _search_queryset(self, request):
         queryset = Sweet.objects.all().order_by("name")
         queryset = queryset if self._is_admin(request.user) else queryset.filter(quantity_in_stock__gt=0)
 
@@ -85,9 +228,7 @@ class SweetViewSet(viewsets.ModelViewSet):
         max_price = request.query_params.get("max_price")
 
         if name_query:
-            queryset = queryset.filter(
-                Q(name__icontains=name_query) | Q(description__icontains=name_query)
-            )
+            queryset = self._apply_search(queryset, name_query)
         if category:
             queryset = queryset.filter(category__iexact=category)
 
@@ -98,20 +239,36 @@ class SweetViewSet(viewsets.ModelViewSet):
                 queryset = queryset.filter(price__lte=Decimal(max_price))
         except InvalidOperation:
             # Surface a helpful validation error instead of blowing up on bad decimals.
-            return Response(
-                {"detail": "min_price and max_price must be valid numbers."},
-                status=status.HTTP_400_BAD_REQUEST,
-            )
+            raise ParseError("min_price and max_price must be valid numbers.") from None
+        return queryset
 
-        serializer = SweetSerializer(queryset, many=True)
-        return Response(serializer.data)
+    @action(
+        detail=False,
+        methods=["get"],
+        url_path="stream",
+        renderer_classes=[JSONRenderer, EventStreamRenderer],
+    )
+    def stream(self, request):
+        """Server-sent ``stock`` events carrying ``{id, quantity_in_stock}`` after each commit."""
+        # ASGI requests carry a scope: stream from the event loop instead of a
+        # thread, so idle subscribers cost nothing but a socket.
+        if hasattr(request._request, "scope"):
+            events = stock_stream.astream_events()
+        else:
+            events = stock_stream.stream_events()
+        response = StreamingHttpResponse(events, content_type="text/event-stream")
+        response["Cache-Control"] = "no-cache"
+        # Stops nginx and similar proxies from buffering the stream.
+        response["X-Accel-Buffering"] = "no"
+        return response
 
     @action(detail=True, methods=["post"], url_path="purchase")
+    @idempotent
     def purchase(self, request, pk=None):
         """Allow authenticated customers to purchase sweets."""
         serializer = SweetPurchaseSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
-        sweet = Sweet.objects.get(pk=pk)
+        sweet = get_object_or_404(Sweet, pk=pk)
 
         try:
             sweet.purchase(quantity=serializer.validated_data["quantity"], user=request.user)
@@ -120,12 +277,48 @@ class SweetViewSet(viewsets.ModelViewSet):
 
         return Response(SweetSerializer(sweet).data, status=status.HTTP_200_OK)
 
+    @action(detail=True, methods=["post"], url_path="reserve")
+    @idempotent
+    def reserve(self, request, pk=None):
+        """Hold stock for a later checkout; confirm or release it via /reservations/."""
+        serializer = SweetPurchaseSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        sweet = get_object_or_404(Sweet, pk=pk)
+
+        try:
+            reservation = sweet.reserve(quantity=serializer.validated_data["quantity"], user=request.user)
+        except ValueError as exc:
+            return Response({"detail": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response(StockReservationSerializer(reservation).data, status=status.HTTP_201_CREATED)
+
+    @action(detail=True, methods=["get"], url_path="availability")
+    def availability(self, request, pk=None):
+        """Stock, units on hold and units still available to sell."""
+        sweet = get_object_or_404(self.get_queryset().only("pk"), pk=pk)
+        return Response(sweet.availability(), status=status.HTTP_200_OK)
+
+    @action(detail=False, methods=["post"], url_path="checkout")
+    @idempotent
+    def checkout(self, request):
+        """Purchase a whole cart in one transaction (all lines or none)."""
+        serializer = CheckoutSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        try:
+            sweets = Sweet.checkout(serializer.validated_data["items"], user=request.user)
+        except ValueError as exc:
+            return Response({"detail": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response(SweetSerializer(sweets, many=True).data, status=status.HTTP_200_OK)
+
     @action(detail=True, methods=["post"], url_path="restock")
+    @idempotent
     def restock(self, request, pk=None):
         """Admin-only restock endpoint."""
         serializer = SweetRestockSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
-        sweet = Sweet.objects.get(pk=pk)
+        sweet = get_object_or_404(Sweet, pk=pk)
 
         try:
             sweet.restock(quantity=serializer.validated_data["quantity"], user=request.user)
@@ -134,4 +327,228 @@ class SweetViewSet(viewsets.ModelViewSet):
         except ValueError as exc:
             return Response({"detail": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
 
-        return Response(SweetSerializer(sweet).data, status=status.HTTP_200_OK)
\ No newline at end of file
+        return Response(SweetSerializer(sweet).data, status=status.HTTP_200_OK)
+
+    @action(detail=True, methods=["post"], url_path="rebalance")
+    def rebalance(self, request, pk=None):
+        """Admin-only: stripe stock over ``shards`` rows, or even them out and refresh the total."""
+        serializer = SweetRebalanceSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        sweet = get_object_or_404(Sweet, pk=pk)
+
+        try:
+            sweet.rebalance(serializer.validated_data.get("shards"))
+        except ValueError as exc:
+            return Response({"detail": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response(
+            {**SweetSerializer(sweet).data, "shard_count": sweet.shard_count}, status=status.HTTP_200_OK
+        )
+
+    @action(
+        detail=False,
+        methods=["post"],
+        url_path="bulk-restock",
+        parser_classes=[JSONParser, CSVParser, NDJSONParser],
+    )
+    def bulk_restock(self, request):
+        """Admin-only batched upsert + restock from a JSON, NDJSON or CSV body."""
+        rows = request.data
+        if isinstance(rows, dict):
+            rows = rows.get("items")
+        # JSON gives a list; the CSV and NDJSON parsers yield their rows lazily.
+        if not isinstance(rows, (list, Iterator)):
+            return Response(
+                {"detail": "Expected a list of rows or an object with an 'items' list."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        importer = SweetImporter(request.user)
+        try:
+            importer.run(rows)
+        except PermissionError as exc:
+            return Response({"detail": str(exc)}, status=status.HTTP_403_FORBIDDEN)
+        except ValueError as exc:
+            # Earlier batches have already committed; report how far we got.
+            return Response(
+                {"detail": str(exc), **importer.summary()},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        return Response(importer.summary(), status=status.HTTP_200_OK)
+
+    @action(detail=False, methods=["get"], url_path="ledger-stats")
+    def ledger_stats(self, request):
+        """Admin-only queue depth and flush latency of the write-behind ledger writer."""
+        writer = ledger.get_writer()
+        if writer is None:
+            return Response({"write_behind": False}, status=status.HTTP_200_OK)
+        return Response({"write_behind": True, **writer.stats()}, status=status.HTTP_200_OK)
+
+    # Widest window per granularity, so one response stays a bounded number of buckets.
+    analytics_windows = {
+        InventoryRollup.Granularity.HOUR: (timedelta(hours=24), timedelta(days=31)),
+        InventoryRollup.Granularity.DAY: (timedelta(days=30), timedelta(days=366)),
+    }
+
+    @action(detail=False, methods=["get"], url_path="analytics")
+    def analytics(self, request):
+        """Admin-only purchase/restock totals per hour or day, read from the rollups.
+
+        Without ``?sweet=`` the rows are per category (all, or ``?category=``).
+        Settled ledger events not yet rolled up are folded in first; after
+        that, cost is one range scan over the requested buckets.
+        """
+        granularity = request.query_params.get("granularity", InventoryRollup.Granularity.DAY)
+        if granularity not in self.analytics_windows:
+            raise ParseError("granularity must be 'hour' or 'day'.")
+        default_window, max_window = self.analytics_windows[granularity]
+        until = _parse_moment(request, "until") or timezone.now()
+        since = _parse_moment(request, "since") or until - default_window
+        if since >= until or until - since > max_window:
+            raise ParseError(f"since must be before until and at most {max_window.days} day(s) earlier.")
+        # Widen to the start of the bucket that contains `since`.
+        since = dict(InventoryRollup.buckets(since))[granularity]
+        rollups.fold()
+
+        rows = InventoryRollup.objects.filter(granularity=granularity, bucket__gte=since, bucket__lt=until)
+        sweet = request.query_params.get("sweet")
+        category = request.query_params.get("category")
+        if sweet:
+            try:
+                rows = rows.filter(sweet_id=int(sweet))
+            except ValueError:
+                raise ParseError("sweet must be an integer id.") from None
+        else:
+            rows = rows.filter(sweet__isnull=True)
+            if category:
+                if category not in Category.values:
+                    raise ParseError(f"category must be one of: {', '.join(Category.values)}.")
+                rows = rows.filter(category=category)
+        results = list(
+            rows.order_by("bucket", "category").values(
+                "bucket", "sweet", "category", *InventoryRollup.counter_fields
+            )
+        )
+        return Response(
+            {"granularity": granularity, "since": since, "until": until, "results": results},
+            status=status.HTTP_200_OK,
+        )
+
+    @action(detail=False, methods=["get"], url_path="cache-stats")
+    def cache_stats(self, request):
+        """Admin-only hit/miss counters for the catalogue response cache."""
+        return Response(
+            {**response_cache.stats(), "version": response_cache.catalogue_version()},
+            status=status.HTTP_200_OK,
+        )
+
+
+class StockReservationViewSet(
+    mixins.ListModelMixin, mixins.RetrieveModelMixin, viewsets.GenericViewSet
+):
+    """The caller's stock holds, newest first, with confirm/release actions."""
+
+    serializer_class = StockReservationSerializer
+    pagination_class = KeysetPagination
+    keyset_ordering = ("-id",)
+    filter_backends = []
+
+    def get_queryset(self):
+        # Reads authenticate as a ClaimsTokenUser, not a User instance; filter on the id.
+        return StockReservation.objects.filter(user_id=self.request.user.pk).order_by("-id")
+
+    @action(detail=True, methods=["post"], url_path="confirm")
+    @idempotent
+    def confirm(self, request, pk=None):
+        """Sell the held units (one purchase event) while the hold is active."""
+        reservation = self.get_object()
+        try:
+            reservation.confirm(user=request.user)
+        except ValueError as exc:
+            return Response({"detail": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(self.get_serializer(reservation).data, status=status.HTTP_200_OK)
+
+    @action(detail=True, methods=["post"], url_path="release")
+    def release(self, request, pk=None):
+        """Drop an active hold early so the units can be sold again."""
+        reservation = self.get_object()
+        try:
+            reservation.release()
+        except ValueError as exc:
+            return Response({"detail": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(self.get_serializer(reservation).data, status=status.HTTP_200_OK)
+
+
+class InventoryEventViewSet(
+    mixins.ListModelMixin, mixins.RetrieveModelMixin, viewsets.GenericViewSet
+):
+    """Admin-only ledger reads, newest first, with a streaming CSV/NDJSON export.
+
+    Filters: ``?sweet=``, ``?event_type=``, ``?performed_by=``, ``?since=`` and
+    ``?until=`` (ISO 8601, ``since <= occurred_at < until``). Pages seek on
+    ``(occurred_at, id)`` through the ledger's composite indexes, so any page
+    costs one index range scan however large the table grows.
+    """
+
+    serializer_class = InventoryEventSerializer
+    permission_classes = [permissions.IsAuthenticated, IsAdminUserRole]
+    pagination_class = KeysetPagination
+    keyset_ordering = ("-occurred_at", "-id")
+    filter_backends = []
+
+    def get_queryset(self):
+        queryset = InventoryEvent.objects.select_related("sweet", "performed_by").order_by("-occurred_at", "-id")
+        params = self.request.query_params
+        for name in ("sweet", "performed_by"):
+            if params.get(name):
+                try:
+                    queryset = queryset.filter(**{f"{name}_id": int(params[name])})
+                except ValueError:
+                    raise ParseError(f"{name} must be an integer id.") from None
+        event_type = params.get("event_type")
+        if event_type:
+            if event_type not in InventoryEvent.EventType.values:
+                raise ParseError(f"event_type must be one of: {', '.join(InventoryEvent.EventType.values)}.")
+            queryset = queryset.filter(event_type=event_type)
+        since, until = _parse_moment(self.request, "since"), _parse_moment(self.request, "until")
+        if since:
+            queryset = queryset.filter(occurred_at__gte=since)
+        if until:
+            queryset = queryset.filter(occurred_at__lt=until)
+        return queryset
+
+    @action(
+        detail=False,
+        methods=["get"],
+        url_path="export",
+        renderer_classes=[JSONRenderer, CSVRenderer, NDJSONRenderer],
+    )
+    def export(self, request):
+        """Stream every matching event as CSV (``?format=csv``) or NDJSON (``?format=ndjson``)."""
+        renderer = request.accepted_renderer
+        if isinstance(renderer, NDJSONRenderer):
+            lines, extension = exports.ndjson_lines(self.get_queryset()), "ndjson"
+        elif isinstance(renderer, CSVRenderer):
+            lines, extension = exports.csv_lines(self.get_queryset()), "csv"
+        else:
+            raise ParseError("Choose an export format with ?format=csv or ?format=ndjson.")
+        response = StreamingHttpResponse(lines, content_type=f"{renderer.media_type}; charset=utf-8")
+        response["Content-Disposition"] = f'attachment; filename="inventory-events.{extension}"'
+        return response
+
+
+def _parse_moment(request, name):
+    """Read an ISO 8601 ``?name=`` date-time (naive means UTC), or ``None``."""
+    raw = request.query_params.get(name)
+    if not raw:
+        return None
+    try:
+        moment = parse_datetime(raw)
+    except ValueError:
+        moment = None
+    if moment is None:
+        raise ParseError(f"{name} must be an ISO 8601 date-time.")
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment, dt_timezone.utc)
+    return moment
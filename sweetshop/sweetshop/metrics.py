@@ -0,0 +1,259 @@
+"""Per-request query count, DB time, serializer time and latency.
+
+``RequestMetricsMiddleware`` wraps each request in
+``connection.execute_wrapper`` to count queries and time them, and reports
+the figures to the client in a ``Server-Timing`` header. Each request is also
+added to in-process histograms per view (the URL name) and method. Admins
+scrape them at ``GET /api/metrics/`` in the Prometheus text format, together
+with the counters of the catalogue cache, idempotency store, stock stream,
+hashing pool and write-behind ledger.
+
+The work per request is a handful of ``perf_counter`` calls, one lock and a
+few bisects, so it can stay on in production. Every worker process keeps its
+own histograms; scrape each one. Streaming responses (exports, the stock
+stream) are measured up to their first byte.
+"""
+
+import threading
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from time import perf_counter
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connection
+from rest_framework.renderers import BaseRenderer
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from sweets.permissions import IsAdminUserRole
+
+SECONDS_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89)
+# Anything else is folded into "other" so a scanner cannot grow the label set.
+METHODS = {"GET", "HEAD", "OPTIONS", "POST", "PUT", "PATCH", "DELETE"}
+
+_current = ContextVar("sweetshop_request_metrics", default=None)
+
+
+class RequestRecord:
+    """What one request has spent so far."""
+
+    __slots__ = ("queries", "db_seconds", "serializer_seconds", "_serializing")
+
+    def __init__(self):
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.serializer_seconds = 0.0
+        self._serializing = False
+
+    def __call__(self, execute, sql, params, many, context):
+        # An execute_wrapper; also runs in sync_to_async threads of async views.
+        started = perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.db_seconds += perf_counter() - started
+
+
+@contextmanager
+def serializer_timer():
+    """Count the enclosed block as serializer time; nested blocks count once."""
+    record = _current.get()
+    if record is None or record._serializing:
+        yield
+        return
+    record._serializing = True
+    started = perf_counter()
+    try:
+        yield
+    finally:
+        record.serializer_seconds += perf_counter() - started
+        record._serializing = False
+
+
+class TimedSerializerMixin:
+    """Add a serializer's ``to_representation`` to the request's serializer time."""
+
+    def to_representation(self, instance):
+        with serializer_timer():
+            return super().to_representation(instance)
+
+
+class Histogram:
+    __slots__ = ("bounds", "counts", "total")
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.total = 0.0
+
+    def observe(self, value) -> None:
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.total += value
+
+
+class RequestMetrics:
+    """Histograms per ``(view, method)`` and response counts per status."""
+
+    histograms = (
+        ("request_duration_seconds", SECONDS_BUCKETS, "Time from the first middleware to the response."),
+        ("request_db_seconds", SECONDS_BUCKETS, "Time spent executing SQL."),
+        ("request_serializer_seconds", SECONDS_BUCKETS, "Time spent in serializer to_representation."),
+        ("request_queries", QUERY_BUCKETS, "SQL queries executed."),
+    )
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._series = {}
+        self._responses = {}
+
+    def observe(self, view, method, status_code, record, seconds) -> None:
+        values = (seconds, record.db_seconds, record.serializer_seconds, record.queries)
+        with self._lock:
+            series = self._series.get((view, method))
+            if series is None:
+                series = self._series[(view, method)] = [Histogram(bounds) for _, bounds, _ in self.histograms]
+            for histogram, value in zip(series, values):
+                histogram.observe(value)
+            key = (view, method, status_code)
+            self._responses[key] = self._responses.get(key, 0) + 1
+
+    def exposition(self) -> list:
+        """Prometheus text format lines for every series seen so far."""
+        with self._lock:
+            series = {key: [(list(h.counts), h.total) for h in hs] for key, hs in sorted(self._series.items())}
+            responses = sorted(self._responses.items())
+        lines = []
+        for index, (name, bounds, help_text) in enumerate(self.histograms):
+            name = f"sweetshop_http_{name}"
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} histogram"]
+            for (view, method), histograms in series.items():
+                counts, total = histograms[index]
+                labels = f'view="{_escape(view)}",method="{method}"'
+                cumulative = 0
+                for bound, count in zip((*bounds, "+Inf"), counts):
+                    cumulative += count
+                    le = bound if isinstance(bound, str) else format(bound, "g")
+                    lines.append(f'{name}_bucket{{{labels},le="{le}"}} {cumulative}')
+                lines.append(f"{name}_sum{{{labels}}} {format(total, '.6g')}")
+                lines.append(f"{name}_count{{{labels}}} {cumulative}")
+        name = "sweetshop_http_responses_total"
+        lines += [f"# HELP {name} Responses by view, method and status.", f"# TYPE {name} counter"]
+        for (view, method, status_code), count in responses:
+            lines.append(f'{name}{{view="{_escape(view)}",method="{method}",status="{status_code}"}} {count}')
+        return lines
+
+
+_registry = RequestMetrics()
+
+
+def get_registry() -> RequestMetrics:
+    return _registry
+
+
+class RequestMetricsMiddleware:
+    """Measure each request; put it first in ``MIDDLEWARE`` so it times the rest."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.server_timing = getattr(settings, "SWEETSHOP_METRICS_SERVER_TIMING", True)
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        record, started = RequestRecord(), perf_counter()
+        token = _current.set(record)
+        try:
+            with connection.execute_wrapper(record):
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self._finish(request, response, record, started)
+
+    async def __acall__(self, request):
+        record, started = RequestRecord(), perf_counter()
+        token = _current.set(record)
+        # Connections are per thread, and the ORM calls of this request (sync
+        # views included) run in its thread-sensitive worker, so the wrapper
+        # is entered and left on that thread's connection.
+        wrapping = await sync_to_async(_enter_wrapper)(record)
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(wrapping.__exit__)(None, None, None)
+            _current.reset(token)
+        return self._finish(request, response, record, started)
+
+    def _finish(self, request, response, record, started):
+        seconds = perf_counter() - started
+        match = getattr(request, "resolver_match", None)
+        view = match.view_name if match is not None else "unmatched"
+        method = request.method if request.method in METHODS else "other"
+        get_registry().observe(view, method, response.status_code, record, seconds)
+        if self.server_timing:
+            response["Server-Timing"] = (
+                f'db;dur={record.db_seconds * 1000:.2f};desc="{record.queries} queries", '
+                f"serializer;dur={record.serializer_seconds * 1000:.2f}, "
+                f"total;dur={seconds * 1000:.2f}"
+            )
+        return response
+
+
+class PrometheusRenderer(BaseRenderer):
+    media_type = "text/plain"
+    format = "txt"
+    charset = "utf-8"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if not isinstance(data, str):
+            # Errors arrive as {"detail": ...}; a comment keeps the body valid.
+            data = f"# {data.get('detail', data) if isinstance(data, dict) else data}\n"
+        return data.encode(self.charset)
+
+
+class MetricsView(APIView):
+    """Admin-only request histograms and component counters, as Prometheus text."""
+
+    permission_classes = [IsAdminUserRole]
+    renderer_classes = [PrometheusRenderer]
+
+    def get(self, request):
+        lines = get_registry().exposition()
+        for component, stats in _component_stats():
+            for key, value in stats.items():
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    lines += [f"# TYPE sweetshop_{component}_{key} gauge", f"sweetshop_{component}_{key} {value}"]
+        return Response("\n".join(lines) + "\n")
+
+
+def _enter_wrapper(record):
+    wrapping = connection.execute_wrapper(record)
+    wrapping.__enter__()
+    return wrapping
+
+
+def _component_stats():
+    from accounts.hashing_pool import get_pool
+    from sweets import cache, ledger
+    from sweets.idempotency import get_store
+    from sweets.stream import get_hub
+
+    yield "catalogue_cache", cache.stats()
+    yield "idempotency", get_store().stats()
+    yield "stock_stream", get_hub().stats()
+    yield "hashing_pool", get_pool().stats()
+    writer = ledger.get_writer()
+    if writer is not None:
+        yield "ledger_writer", writer.stats()
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
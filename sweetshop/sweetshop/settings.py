@@ -46,6 +46,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'sweetshop.metrics.RequestMetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -106,6 +107,28 @@ AUTH_PASSWORD_VALIDATORS = [
 ]
 
 
+# Password hashing. PASSWORD_HASHING_PROFILE picks the hasher for new hashes
+# ("argon2" needs argon2-cffi); the others stay listed so older hashes verify,
+# and users are re-hashed with the profile's current cost on their next login.
+# Size the auth tier with `python manage.py bench_hashers`.
+PASSWORD_HASHING_PROFILES = {
+    "scrypt": "accounts.hashers.TunedScryptPasswordHasher",
+    "argon2": "accounts.hashers.TunedArgon2PasswordHasher",
+    "pbkdf2": "accounts.hashers.TunedPBKDF2PasswordHasher",
+}
+PASSWORD_HASHING_PROFILE = "scrypt"
+PASSWORD_HASHING_COSTS = {
+    "scrypt": {"work_factor": 2**16, "block_size": 8, "parallelism": 1},
+    "argon2": {"time_cost": 2, "memory_cost": 19 * 1024, "parallelism": 1},
+    "pbkdf2": {"iterations": 600_000},
+}
+PASSWORD_HASHERS = [
+    PASSWORD_HASHING_PROFILES[PASSWORD_HASHING_PROFILE],
+    *(path for name, path in PASSWORD_HASHING_PROFILES.items() if name != PASSWORD_HASHING_PROFILE),
+    "django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher",
+]
+
+
 # Internationalization
 # https://docs.djangoproject.com/en/5.2/topics/i18n/
 
@@ -132,7 +155,7 @@ AUTH_USER_MODEL = 'accounts.User'
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'accounts.authentication.ClaimsJWTAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.IsAuthenticated',
@@ -150,15 +173,101 @@ SIMPLE_JWT = {
     'REFRESH_TOKEN_LIFETIME': timedelta(days=1),
     'ROTATE_REFRESH_TOKENS': False,
     'BLACKLIST_AFTER_ROTATION': False,
+    # Re-reads role/is_staff/is_superuser so refreshed access tokens follow role changes.
+    'TOKEN_REFRESH_SERIALIZER': 'accounts.serializers.RoleTokenRefreshSerializer',
 }
 
 
+# Seconds a DB-loaded user is reused for mutating requests (0 = always load).
+# Read-only requests authenticate from token claims and never load the user.
+ACCOUNTS_USER_CACHE_TIMEOUT = 0
+
+
+# Worker pool that hashes passwords for the async auth endpoints, so slow
+# logins never block the ASGI event loop. "thread" suits scrypt/PBKDF2/argon2,
+# which release the GIL. Requests beyond MAX_QUEUE waiting jobs get a 503.
+ACCOUNTS_HASHING_POOL_KIND = "thread"
+ACCOUNTS_HASHING_POOL_SIZE = 4
+ACCOUNTS_HASHING_POOL_MAX_QUEUE = 64
+
+
 AUTHENTICATION_BACKENDS = [
     "accounts.auth_backends.EmailBackend",
     "django.contrib.auth.backends.ModelBackend",  # keep default as fallback
 ]
 
 
+# Catalogue responses are cached per catalogue version; point SWEETS_CACHE_ALIAS
+# at a shared backend (e.g. Redis/Memcached) when running several processes.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+}
+SWEETS_CACHE_ALIAS = "default"
+SWEETS_CACHE_TIMEOUT = 300
+
+# Render list/search pages from .values() rows instead of SweetSerializer
+# (byte-identical JSON, no model instances or field objects per row).
+SWEETS_FAST_READS = False
+
+
+# Retried purchase/checkout/restock POSTs carrying the same Idempotency-Key
+# replay the first response. Keys are per user, kept in the CACHE_ALIAS cache
+# for TTL_SECONDS; point it at a shared backend when running several processes.
+# A retry of a still-running request waits up to WAIT_SECONDS for it before
+# answering 409; a claim whose worker died is freed after LEASE_SECONDS.
+SWEETS_IDEMPOTENCY_CACHE_ALIAS = "default"
+SWEETS_IDEMPOTENCY_TTL_SECONDS = 24 * 60 * 60
+SWEETS_IDEMPOTENCY_WAIT_SECONDS = 10
+SWEETS_IDEMPOTENCY_LEASE_SECONDS = 60
+
+
+# Seconds a stock reservation holds units before lapsing (see
+# `python manage.py expire_reservations`).
+SWEETS_RESERVATION_TTL_SECONDS = 600
+
+
+# Write-behind ledger: purchases/restocks spool their InventoryEvent to a local
+# file after commit and a background thread inserts them in batches of
+# BATCH_SIZE or every FLUSH_SECONDS. Spools of crashed workers are replayed on
+# start-up (and by `python manage.py check_ledger`). Off by default.
+SWEETS_LEDGER_WRITE_BEHIND = False
+SWEETS_LEDGER_SPOOL_DIR = "/tmp/sweetshop-ledger"
+SWEETS_LEDGER_BATCH_SIZE = 500
+SWEETS_LEDGER_FLUSH_SECONDS = 1.0
+SWEETS_LEDGER_FSYNC = True
+
+# Ledger archival (`python manage.py archive_inventory_events`): events older
+# than RETENTION_DAYS are rolled into per-sweet daily summaries and written to
+# gzipped NDJSON files in ARCHIVE_DIR, then deleted from the live table.
+SWEETS_LEDGER_RETENTION_DAYS = 90
+SWEETS_LEDGER_ARCHIVE_DIR = BASE_DIR / "ledger-archive"
+
+
+# Live stock stream (GET /api/sweets/stream/). The default transport only
+# reaches subscribers in the publishing process; with several workers on one
+# host use "sweets.stream.UnixSocketTransport", which broadcasts through
+# datagram sockets in SWEETS_STREAM_SOCKET_DIR. Updates to one sweet within
+# COALESCE_SECONDS reach each subscriber as a single event.
+SWEETS_STREAM_TRANSPORT = "sweets.stream.LocalTransport"
+SWEETS_STREAM_SOCKET_DIR = "/tmp/sweetshop-stream"
+SWEETS_STREAM_HEARTBEAT_SECONDS = 15
+SWEETS_STREAM_COALESCE_SECONDS = 0.25
+
+
+# Full-text search for the sweets catalogue: "auto" uses SQLite FTS5 or Postgres
+# tsvector depending on the engine, or give a dotted path to a backend class.
+SWEETS_SEARCH_BACKEND = "auto"
+
+
+# Per-request query count, DB/serializer time and latency (sweetshop.metrics),
+# kept as in-process histograms per view and served to admins at
+# GET /api/metrics/ in Prometheus text format. SERVER_TIMING also returns the
+# request's own figures in a Server-Timing header.
+SWEETSHOP_METRICS_SERVER_TIMING = True
+
+
 CORS_ALLOWED_ORIGINS = [
     "http://localhost:5173",    # change this to your frontend URL
 ]